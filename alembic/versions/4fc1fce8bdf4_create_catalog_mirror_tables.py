@@ -0,0 +1,165 @@
+"""create catalog mirror tables
+
+Revision ID: 4fc1fce8bdf4
+Revises: c92835680819
+Create Date: 2026-10-18 09:12:44.518203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4fc1fce8bdf4'
+down_revision: Union[str, Sequence[str], None] = 'c92835680819'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('catalog_items',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('clover_merchant_id', sa.String(length=64), nullable=False),
+        sa.Column('clover_item_id', sa.String(length=64), nullable=False),
+        sa.Column('name', sa.String(length=255), nullable=False),
+        sa.Column('price', sa.BigInteger(), nullable=True),
+        sa.Column('price_type', sa.String(length=32), nullable=True),
+        sa.Column('sku', sa.String(length=128), nullable=True),
+        sa.Column('hidden', sa.Boolean(), nullable=True),
+        sa.Column('available', sa.Boolean(), nullable=True),
+        sa.Column('modified_time', sa.BigInteger(), nullable=True),
+        sa.Column('synced_at', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('clover_merchant_id', 'clover_item_id', name='uq_catalog_items_merchant_item')
+    )
+    op.create_index(op.f('ix_catalog_items_id'), 'catalog_items', ['id'], unique=False)
+    op.create_index(op.f('ix_catalog_items_clover_merchant_id'), 'catalog_items', ['clover_merchant_id'], unique=False)
+
+    op.create_table('catalog_item_variants',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('item_id', sa.Integer(), nullable=False),
+        sa.Column('clover_variant_id', sa.String(length=64), nullable=False),
+        sa.Column('name', sa.String(length=255), nullable=True),
+        sa.Column('price', sa.BigInteger(), nullable=True),
+        sa.ForeignKeyConstraint(['item_id'], ['catalog_items.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('item_id', 'clover_variant_id', name='uq_catalog_variants_item_variant')
+    )
+    op.create_index(op.f('ix_catalog_item_variants_id'), 'catalog_item_variants', ['id'], unique=False)
+    op.create_index(op.f('ix_catalog_item_variants_item_id'), 'catalog_item_variants', ['item_id'], unique=False)
+
+    op.create_table('catalog_categories',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('clover_merchant_id', sa.String(length=64), nullable=False),
+        sa.Column('clover_category_id', sa.String(length=64), nullable=False),
+        sa.Column('name', sa.String(length=255), nullable=False),
+        sa.Column('sort_order', sa.Integer(), nullable=True),
+        sa.Column('modified_time', sa.BigInteger(), nullable=True),
+        sa.Column('synced_at', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('clover_merchant_id', 'clover_category_id', name='uq_catalog_categories_merchant_category')
+    )
+    op.create_index(op.f('ix_catalog_categories_id'), 'catalog_categories', ['id'], unique=False)
+    op.create_index(op.f('ix_catalog_categories_clover_merchant_id'), 'catalog_categories', ['clover_merchant_id'], unique=False)
+
+    op.create_table('catalog_item_categories',
+        sa.Column('item_id', sa.Integer(), nullable=False),
+        sa.Column('clover_category_id', sa.String(length=64), nullable=False),
+        sa.Column('clover_merchant_id', sa.String(length=64), nullable=False),
+        sa.ForeignKeyConstraint(['item_id'], ['catalog_items.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('item_id', 'clover_category_id')
+    )
+    op.create_index('ix_catalog_item_categories_merchant_category', 'catalog_item_categories', ['clover_merchant_id', 'clover_category_id'], unique=False)
+
+    op.create_table('catalog_modifier_groups',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('clover_merchant_id', sa.String(length=64), nullable=False),
+        sa.Column('clover_modifier_group_id', sa.String(length=64), nullable=False),
+        sa.Column('name', sa.String(length=255), nullable=False),
+        sa.Column('min_required', sa.Integer(), nullable=True),
+        sa.Column('max_allowed', sa.Integer(), nullable=True),
+        sa.Column('show_by_default', sa.Boolean(), nullable=True),
+        sa.Column('modified_time', sa.BigInteger(), nullable=True),
+        sa.Column('synced_at', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('clover_merchant_id', 'clover_modifier_group_id', name='uq_catalog_modifier_groups_merchant_group')
+    )
+    op.create_index(op.f('ix_catalog_modifier_groups_id'), 'catalog_modifier_groups', ['id'], unique=False)
+    op.create_index(op.f('ix_catalog_modifier_groups_clover_merchant_id'), 'catalog_modifier_groups', ['clover_merchant_id'], unique=False)
+
+    op.create_table('catalog_modifiers',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('group_id', sa.Integer(), nullable=False),
+        sa.Column('clover_modifier_id', sa.String(length=64), nullable=False),
+        sa.Column('name', sa.String(length=255), nullable=False),
+        sa.Column('price', sa.BigInteger(), nullable=True),
+        sa.Column('available', sa.Boolean(), nullable=True),
+        sa.ForeignKeyConstraint(['group_id'], ['catalog_modifier_groups.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('group_id', 'clover_modifier_id', name='uq_catalog_modifiers_group_modifier')
+    )
+    op.create_index(op.f('ix_catalog_modifiers_id'), 'catalog_modifiers', ['id'], unique=False)
+    op.create_index(op.f('ix_catalog_modifiers_group_id'), 'catalog_modifiers', ['group_id'], unique=False)
+
+    op.create_table('catalog_item_stocks',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('clover_merchant_id', sa.String(length=64), nullable=False),
+        sa.Column('clover_item_id', sa.String(length=64), nullable=False),
+        sa.Column('quantity', sa.Integer(), nullable=True),
+        sa.Column('stock_count', sa.BigInteger(), nullable=True),
+        sa.Column('modified_time', sa.BigInteger(), nullable=True),
+        sa.Column('synced_at', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('clover_merchant_id', 'clover_item_id', name='uq_catalog_item_stocks_merchant_item')
+    )
+    op.create_index(op.f('ix_catalog_item_stocks_id'), 'catalog_item_stocks', ['id'], unique=False)
+    op.create_index(op.f('ix_catalog_item_stocks_clover_merchant_id'), 'catalog_item_stocks', ['clover_merchant_id'], unique=False)
+
+    op.create_table('catalog_sync_state',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('clover_merchant_id', sa.String(length=64), nullable=False),
+        sa.Column('entity', sa.String(length=32), nullable=False),
+        sa.Column('last_modified_time', sa.BigInteger(), nullable=True),
+        sa.Column('last_synced_at', sa.DateTime(), nullable=True),
+        sa.Column('last_full_sync_at', sa.DateTime(), nullable=True),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('clover_merchant_id', 'entity', name='uq_catalog_sync_state_merchant_entity')
+    )
+    op.create_index(op.f('ix_catalog_sync_state_id'), 'catalog_sync_state', ['id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_catalog_sync_state_id'), table_name='catalog_sync_state')
+    op.drop_table('catalog_sync_state')
+
+    op.drop_index(op.f('ix_catalog_item_stocks_clover_merchant_id'), table_name='catalog_item_stocks')
+    op.drop_index(op.f('ix_catalog_item_stocks_id'), table_name='catalog_item_stocks')
+    op.drop_table('catalog_item_stocks')
+
+    op.drop_index(op.f('ix_catalog_modifiers_group_id'), table_name='catalog_modifiers')
+    op.drop_index(op.f('ix_catalog_modifiers_id'), table_name='catalog_modifiers')
+    op.drop_table('catalog_modifiers')
+
+    op.drop_index(op.f('ix_catalog_modifier_groups_clover_merchant_id'), table_name='catalog_modifier_groups')
+    op.drop_index(op.f('ix_catalog_modifier_groups_id'), table_name='catalog_modifier_groups')
+    op.drop_table('catalog_modifier_groups')
+
+    op.drop_index('ix_catalog_item_categories_merchant_category', table_name='catalog_item_categories')
+    op.drop_table('catalog_item_categories')
+
+    op.drop_index(op.f('ix_catalog_categories_clover_merchant_id'), table_name='catalog_categories')
+    op.drop_index(op.f('ix_catalog_categories_id'), table_name='catalog_categories')
+    op.drop_table('catalog_categories')
+
+    op.drop_index(op.f('ix_catalog_item_variants_item_id'), table_name='catalog_item_variants')
+    op.drop_index(op.f('ix_catalog_item_variants_id'), table_name='catalog_item_variants')
+    op.drop_table('catalog_item_variants')
+
+    op.drop_index(op.f('ix_catalog_items_clover_merchant_id'), table_name='catalog_items')
+    op.drop_index(op.f('ix_catalog_items_id'), table_name='catalog_items')
+    op.drop_table('catalog_items')
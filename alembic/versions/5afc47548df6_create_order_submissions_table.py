@@ -0,0 +1,48 @@
+"""create order submissions table
+
+Revision ID: 5afc47548df6
+Revises: 944728c0325a
+Create Date: 2026-10-18 10:41:53.208137
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5afc47548df6'
+down_revision: Union[str, Sequence[str], None] = '944728c0325a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('order_submissions',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('cart_id', sa.Integer(), nullable=False),
+        sa.Column('clover_merchant_id', sa.String(length=64), nullable=False),
+        sa.Column('idempotency_key', sa.String(length=64), nullable=False),
+        sa.Column('step', sa.String(length=32), nullable=True),
+        sa.Column('clover_order_id', sa.String(length=64), nullable=True),
+        sa.Column('line_item_ids', sa.Text(), nullable=True),
+        sa.Column('modification_ids', sa.Text(), nullable=True),
+        sa.Column('attempts', sa.Integer(), nullable=True),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.Column('completed_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['cart_id'], ['carts.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('cart_id'),
+        sa.UniqueConstraint('idempotency_key')
+    )
+    op.create_index(op.f('ix_order_submissions_id'), 'order_submissions', ['id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_order_submissions_id'), table_name='order_submissions')
+    op.drop_table('order_submissions')
@@ -0,0 +1,46 @@
+"""create clover webhook events table
+
+Revision ID: 944728c0325a
+Revises: 4fc1fce8bdf4
+Create Date: 2026-10-18 10:02:17.730415
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '944728c0325a'
+down_revision: Union[str, Sequence[str], None] = '4fc1fce8bdf4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('clover_webhook_events',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('clover_merchant_id', sa.String(length=64), nullable=False),
+        sa.Column('object_type', sa.String(length=8), nullable=False),
+        sa.Column('object_id', sa.String(length=128), nullable=False),
+        sa.Column('event_type', sa.String(length=16), nullable=False),
+        sa.Column('ts', sa.BigInteger(), nullable=True),
+        sa.Column('payload', sa.Text(), nullable=True),
+        sa.Column('received_at', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+        sa.Column('processed_at', sa.DateTime(), nullable=True),
+        sa.Column('attempts', sa.Integer(), nullable=True),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('clover_merchant_id', 'object_id', 'event_type', 'ts', name='uq_clover_webhook_events_delivery')
+    )
+    op.create_index(op.f('ix_clover_webhook_events_id'), 'clover_webhook_events', ['id'], unique=False)
+    op.create_index('ix_clover_webhook_events_merchant_received', 'clover_webhook_events', ['clover_merchant_id', 'received_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_clover_webhook_events_merchant_received', table_name='clover_webhook_events')
+    op.drop_index(op.f('ix_clover_webhook_events_id'), table_name='clover_webhook_events')
+    op.drop_table('clover_webhook_events')
@@ -0,0 +1,36 @@
+"""add expiry and refresh token to merchant tokens
+
+Revision ID: b3e8d21f7c4a
+Revises: 5afc47548df6
+Create Date: 2026-10-18 12:06:41.517203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b3e8d21f7c4a'
+down_revision: Union[str, Sequence[str], None] = '5afc47548df6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('merchant_tokens', sa.Column('refresh_token', sa.Text(), nullable=True))
+    op.add_column('merchant_tokens', sa.Column('expires_at', sa.DateTime(), nullable=True))
+    op.add_column('merchant_tokens', sa.Column('refresh_expires_at', sa.DateTime(), nullable=True))
+    op.add_column('merchant_tokens', sa.Column('refreshed_at', sa.DateTime(), nullable=True))
+    op.create_index(op.f('ix_merchant_tokens_expires_at'), 'merchant_tokens', ['expires_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_merchant_tokens_expires_at'), table_name='merchant_tokens')
+    op.drop_column('merchant_tokens', 'refreshed_at')
+    op.drop_column('merchant_tokens', 'refresh_expires_at')
+    op.drop_column('merchant_tokens', 'expires_at')
+    op.drop_column('merchant_tokens', 'refresh_token')
@@ -0,0 +1,30 @@
+"""index carts for session lookup and expiry
+
+Revision ID: d41f6a9c2e83
+Revises: b3e8d21f7c4a
+Create Date: 2026-10-18 15:42:09.318224
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd41f6a9c2e83'
+down_revision: Union[str, Sequence[str], None] = 'b3e8d21f7c4a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_carts_session_id_status', 'carts', ['session_id', 'status'], unique=False)
+    op.create_index('ix_carts_status_expires_at', 'carts', ['status', 'expires_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_carts_status_expires_at', table_name='carts')
+    op.drop_index('ix_carts_session_id_status', table_name='carts')
@@ -0,0 +1,28 @@
+"""add version to carts
+
+Revision ID: e7a2c5f18b06
+Revises: d41f6a9c2e83
+Create Date: 2026-10-18 16:27:53.904117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7a2c5f18b06'
+down_revision: Union[str, Sequence[str], None] = 'd41f6a9c2e83'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('carts', sa.Column('version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('carts', 'version')
@@ -1,11 +1,15 @@
 # app/routes/cart.py
-from fastapi import APIRouter, HTTPException, Query, Depends, Body
-from sqlalchemy.orm import Session
-from database.database import get_db
+from fastapi import APIRouter, HTTPException, Query, Depends, Body, Header, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from database.database import get_async_db
 from helpers.cart_helper import CartHelper
 from helpers.merchant_helper import MerchantHelper
-from pydantic import BaseModel
-from typing import Optional, List
+from services.active_carts import CartOps, active_carts, cart_etag, parse_if_match
+from services.cart_events import CartEventStream
+from services.order_submission import OrderSubmissionPipeline
+from pydantic import BaseModel, Field
+from typing import Annotated, Literal, Optional, List, Union
 from datetime import datetime
 import httpx
 import os
@@ -13,32 +17,82 @@ import os
 router = APIRouter(prefix="/cart", tags=["Cart Management"])
 
 CLOVER_BASE_URL = os.getenv("CLOVER_BASE_URL", "https://apisandbox.dev.clover.com")
+CART_BATCH_MAX_OPERATIONS = int(os.getenv("CART_BATCH_MAX_OPERATIONS", "50"))
+# Edits are accepted by the cart store before they reach the database, so
+# anything the carts tables would refuse is rejected here
+CART_MAX_ITEM_QUANTITY = int(os.getenv("CART_MAX_ITEM_QUANTITY", "999"))
+CART_MAX_PRICE = float(os.getenv("CART_MAX_PRICE", "100000"))
+
+CloverId = Annotated[str, Field(min_length=1, max_length=64)]
+Name = Annotated[str, Field(min_length=1, max_length=255)]
+Price = Annotated[float, Field(ge=0, le=CART_MAX_PRICE)]
+Quantity = Annotated[int, Field(ge=1, le=CART_MAX_ITEM_QUANTITY)]
 
 
 # Pydantic models for request/response
 class CreateCartRequest(BaseModel):
-    merchant_id: str
+    merchant_id: CloverId
     customer_id: Optional[str] = None  # Optional: for logged-in users
-    session_id: Optional[str] = None   # Required: for guest users, optional for logged-in users
+    session_id: Optional[str] = Field(None, max_length=128)  # Required: for guest users, optional for logged-in users
 
 
 class AddItemRequest(BaseModel):
-    clover_item_id: str
-    name: str
-    price: float
-    quantity: int = 1
-    notes: Optional[str] = None
+    clover_item_id: CloverId
+    name: Name
+    price: Price
+    quantity: Quantity = 1
+    notes: Optional[str] = Field(None, max_length=2000)
 
 
 class UpdateQuantityRequest(BaseModel):
-    quantity: int
+    # 0 removes the item
+    quantity: int = Field(..., ge=0, le=CART_MAX_ITEM_QUANTITY)
 
 
 class AddModifierRequest(BaseModel):
-    clover_modifier_id: str
-    clover_modifier_group_id: str
-    name: str
-    price: float = 0.0
+    clover_modifier_id: CloverId
+    clover_modifier_group_id: CloverId
+    name: Name
+    price: Price = 0.0
+
+
+class BatchItemTarget(BaseModel):
+    # An item already in the cart, by row id or by Clover item id (which
+    # also reaches items added earlier in the same batch)
+    cart_item_id: Optional[int] = None
+    clover_item_id: Optional[CloverId] = None
+
+
+class BatchAddItem(AddItemRequest):
+    op: Literal["add_item"]
+
+
+class BatchUpdateQuantity(BatchItemTarget):
+    op: Literal["update_quantity"]
+    # 0 removes the item
+    quantity: int = Field(..., ge=0, le=CART_MAX_ITEM_QUANTITY)
+
+
+class BatchRemoveItem(BatchItemTarget):
+    op: Literal["remove_item"]
+
+
+class BatchAddModifier(BatchItemTarget):
+    op: Literal["add_modifier"]
+    clover_modifier_id: CloverId
+    clover_modifier_group_id: CloverId
+    name: Name
+    price: Price = 0.0
+
+
+BatchOperation = Annotated[
+    Union[BatchAddItem, BatchUpdateQuantity, BatchRemoveItem, BatchAddModifier],
+    Field(discriminator="op")
+]
+
+
+class CartBatchRequest(BaseModel):
+    operations: List[BatchOperation] = Field(..., min_length=1, max_length=CART_BATCH_MAX_OPERATIONS)
 
 
 def _build_headers(access_token: str):
@@ -51,7 +105,7 @@ def _build_headers(access_token: str):
 @router.post("/create")
 async def create_cart(
     request: CreateCartRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Create a new empty cart for guest or logged-in user"""
     try:
@@ -65,12 +119,13 @@ async def create_cart(
         # For logged-in users, session_id is optional but recommended
         # For guest users, session_id is required
 
-        cart = CartHelper.create_cart(
+        cart = await CartHelper.create_cart(
             db=db,
             merchant_id=request.merchant_id,
             # customer_id=request.customer_id,  # Can be None for guests
             session_id=request.session_id
         )
+        await active_carts.adopt(cart)
 
         return {
             "success": True,
@@ -80,6 +135,7 @@ async def create_cart(
             # "customer_id": cart.customer_id,
             "session_id": cart.session_id,
             "status": cart.status,
+            "version": cart.version,
             # "user_type": "logged_in" if cart.customer_id else "guest"
             "user_type": "logged_in" if cart.session_id else "guest"
         }
@@ -90,12 +146,18 @@ async def create_cart(
 @router.get("/{cart_id}")
 async def get_cart(
     cart_id: int,
-    db: Session = Depends(get_db)
+    response: Response,
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get cart details with all items and modifiers"""
-    cart_summary = CartHelper.get_cart_summary(db, cart_id)
+    """
+    Get cart details with all items and modifiers. The ETag is the cart's
+    version; send it back as If-Match on a change to make the change
+    conditional on nobody else having changed the cart in between.
+    """
+    cart_summary = await active_carts.get_summary(cart_id)
     if not cart_summary:
         raise HTTPException(status_code=404, detail="Cart not found")
+    response.headers["ETag"] = cart_etag(cart_summary)
 
     return {
         "success": True,
@@ -103,74 +165,198 @@ async def get_cart(
     }
 
 
+@router.get("/{cart_id}/events")
+async def stream_cart_events(
+    cart_id: int,
+    request: Request
+):
+    """
+    Server-sent events for the cart, instead of polling it and its Clover
+    order status:
+
+    - `cart`: the whole cart, first and whenever the stream has to resync
+    - `cart.diff`: changed fields, added or changed lines, removed line ids
+    - `order`: order submission progress and Clover order updates
+    """
+    stream = CartEventStream(
+        cart_id,
+        active_carts.get_summary,
+        OrderSubmissionPipeline.load_progress,
+        shared_store=active_carts.store.backend == "redis"
+    )
+    if not stream.open():
+        raise HTTPException(status_code=503, detail="Too many open cart streams, try again later")
+
+    # Checked before the response starts so an unknown cart is still a 404
+    if await active_carts.get_summary(cart_id) is None:
+        stream.close()
+        raise HTTPException(status_code=404, detail="Cart not found")
+
+    return StreamingResponse(
+        stream.events(request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @router.post("/{cart_id}/items")
 async def add_item_to_cart(
     cart_id: int,
     request: AddItemRequest,
-    db: Session = Depends(get_db)
+    response: Response,
+    if_match: Optional[str] = Header(None, alias="If-Match")
 ):
-    """Add an item to the cart"""
+    """
+    Add an item to the cart. Lines added since the cart was last saved have
+    negative ids; they keep working after saving gives them database ids.
+    """
     try:
-        # Check if cart exists
-        cart = CartHelper.get_cart_by_id(db, cart_id)
-        if not cart:
-            raise HTTPException(status_code=404, detail="Cart not found")
-
-        if cart.status != "active":
-            raise HTTPException(status_code=400, detail="Cannot modify inactive cart")
-
-        cart_item = CartHelper.add_item_to_cart(
-            db=db,
-            cart_id=cart_id,
+        cart_item, cart_summary = await active_carts.mutate(cart_id, lambda doc: CartOps.add_item(
+            doc,
             clover_item_id=request.clover_item_id,
             name=request.name,
             price=request.price,
             quantity=request.quantity,
             notes=request.notes
-        )
+        ), expected_version=parse_if_match(if_match))
+        response.headers["ETag"] = cart_etag(cart_summary)
 
         return {
             "success": True,
             "message": "Item added to cart",
-            "cart_item_id": cart_item.id,
-            "quantity": cart_item.quantity,
-            "line_total": cart_item.line_total
+            "cart_item_id": cart_item["id"],
+            "quantity": cart_item["quantity"],
+            "line_total": cart_item["line_total"],
+            "version": cart_summary["version"]
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to add item: {str(e)}")
 
 
+def _batch_target(doc: dict, index: int, operation: BatchItemTarget) -> int:
+    """The cart_item_id an operation refers to"""
+    if operation.cart_item_id is not None:
+        cart_item = CartOps.find_item(doc, operation.cart_item_id)
+    elif operation.clover_item_id:
+        cart_item = CartOps.find_item_by_clover_id(doc, operation.clover_item_id)
+    else:
+        raise HTTPException(status_code=422, detail=f"Operation {index}: cart_item_id or clover_item_id is required")
+
+    if not cart_item:
+        raise HTTPException(status_code=404, detail=f"Operation {index}: cart item not found")
+    return cart_item["id"]
+
+
+def _apply_batch_operation(doc: dict, index: int, operation) -> dict:
+    """Apply one batch operation to the cart document; returns its result entry"""
+    try:
+        if operation.op == "add_item":
+            cart_item = CartOps.add_item(
+                doc,
+                clover_item_id=operation.clover_item_id,
+                name=operation.name,
+                price=operation.price,
+                quantity=operation.quantity,
+                notes=operation.notes
+            )
+            return {"op": operation.op, "cart_item_id": cart_item["id"], "quantity": cart_item["quantity"]}
+
+        cart_item_id = _batch_target(doc, index, operation)
+
+        if operation.op == "update_quantity":
+            updated = CartOps.update_quantity(doc, cart_item_id, operation.quantity)
+            return {
+                "op": operation.op,
+                "cart_item_id": cart_item_id,
+                "quantity": updated["quantity"] if updated else 0,
+                "removed": updated is None
+            }
+
+        if operation.op == "remove_item":
+            CartOps.remove_item(doc, cart_item_id)
+            return {"op": operation.op, "cart_item_id": cart_item_id, "removed": True}
+
+        modifier = CartOps.add_modifier(
+            doc,
+            cart_item_id=cart_item_id,
+            clover_modifier_id=operation.clover_modifier_id,
+            clover_modifier_group_id=operation.clover_modifier_group_id,
+            name=operation.name,
+            price=operation.price
+        )
+        return {"op": operation.op, "cart_item_id": cart_item_id, "modifier_id": modifier["id"]}
+    except HTTPException as e:
+        if str(e.detail).startswith("Operation "):
+            raise
+        raise HTTPException(status_code=e.status_code, detail=f"Operation {index}: {e.detail}")
+
+
+@router.post("/{cart_id}/batch")
+async def apply_cart_batch(
+    cart_id: int,
+    request: CartBatchRequest,
+    response: Response,
+    if_match: Optional[str] = Header(None, alias="If-Match")
+):
+    """
+    Apply add_item / update_quantity / remove_item / add_modifier operations
+    in order and atomically: all of them take effect or none do.
+    Totals are recomputed once at the end and the updated cart is returned.
+    """
+    try:
+        results, cart_summary = await active_carts.mutate(cart_id, lambda doc: [
+            _apply_batch_operation(doc, index, operation)
+            for index, operation in enumerate(request.operations)
+        ], expected_version=parse_if_match(if_match))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to apply cart batch: {str(e)}")
+
+    response.headers["ETag"] = cart_etag(cart_summary)
+    return {
+        "success": True,
+        "results": results,
+        "cart": cart_summary
+    }
+
+
 @router.put("/{cart_id}/items/{cart_item_id}/quantity")
 async def update_item_quantity(
     cart_id: int,
     cart_item_id: int,
     request: UpdateQuantityRequest,
-    db: Session = Depends(get_db)
+    response: Response,
+    if_match: Optional[str] = Header(None, alias="If-Match")
 ):
     """Update quantity of a cart item"""
     try:
-        cart_item = CartHelper.update_item_quantity(
-            db=db,
-            cart_item_id=cart_item_id,
-            quantity=request.quantity
+        cart_item, cart_summary = await active_carts.mutate(
+            cart_id, lambda doc: CartOps.update_quantity(doc, cart_item_id, request.quantity),
+            expected_version=parse_if_match(if_match)
         )
+        response.headers["ETag"] = cart_etag(cart_summary)
 
-        if cart_item is None and request.quantity <= 0:
+        if cart_item is None:
             return {
                 "success": True,
                 "message": "Item removed from cart",
-                "cart_item_id": cart_item_id
+                "cart_item_id": cart_item_id,
+                "version": cart_summary["version"]
             }
-        elif cart_item is None:
-            raise HTTPException(status_code=404, detail="Cart item not found")
 
         return {
             "success": True,
             "message": "Item quantity updated",
-            "cart_item_id": cart_item.id,
-            "quantity": cart_item.quantity,
-            "line_total": cart_item.line_total
+            "cart_item_id": cart_item["id"],
+            "quantity": cart_item["quantity"],
+            "line_total": cart_item["line_total"],
+            "version": cart_summary["version"]
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to update quantity: {str(e)}")
 
@@ -179,17 +365,21 @@ async def update_item_quantity(
 async def remove_item_from_cart(
     cart_id: int,
     cart_item_id: int,
-    db: Session = Depends(get_db)
+    response: Response,
+    if_match: Optional[str] = Header(None, alias="If-Match")
 ):
     """Remove an item from the cart"""
-    success = CartHelper.remove_item_from_cart(db, cart_item_id)
-    if not success:
-        raise HTTPException(status_code=404, detail="Cart item not found")
+    _, cart_summary = await active_carts.mutate(
+        cart_id, lambda doc: CartOps.remove_item(doc, cart_item_id),
+        expected_version=parse_if_match(if_match)
+    )
+    response.headers["ETag"] = cart_etag(cart_summary)
 
     return {
         "success": True,
         "message": "Item removed from cart",
-        "cart_item_id": cart_item_id
+        "cart_item_id": cart_item_id,
+        "version": cart_summary["version"]
     }
 
 
@@ -198,26 +388,31 @@ async def add_modifier_to_item(
     cart_id: int,
     cart_item_id: int,
     request: AddModifierRequest,
-    db: Session = Depends(get_db)
+    response: Response,
+    if_match: Optional[str] = Header(None, alias="If-Match")
 ):
     """Add a modifier to a cart item"""
     try:
-        modifier = CartHelper.add_modifier_to_item(
-            db=db,
+        modifier, cart_summary = await active_carts.mutate(cart_id, lambda doc: CartOps.add_modifier(
+            doc,
             cart_item_id=cart_item_id,
             clover_modifier_id=request.clover_modifier_id,
             clover_modifier_group_id=request.clover_modifier_group_id,
             name=request.name,
             price=request.price
-        )
+        ), expected_version=parse_if_match(if_match))
+        response.headers["ETag"] = cart_etag(cart_summary)
 
         return {
             "success": True,
             "message": "Modifier added to item",
-            "modifier_id": modifier.id,
-            "name": modifier.name,
-            "price": modifier.price
+            "modifier_id": modifier["id"],
+            "name": modifier["name"],
+            "price": modifier["price"],
+            "version": cart_summary["version"]
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to add modifier: {str(e)}")
 
@@ -225,31 +420,55 @@ async def add_modifier_to_item(
 @router.delete("/{cart_id}/clear")
 async def clear_cart(
     cart_id: int,
-    db: Session = Depends(get_db)
+    response: Response,
+    if_match: Optional[str] = Header(None, alias="If-Match")
 ):
     """Clear all items from the cart"""
-    success = CartHelper.clear_cart(db, cart_id)
-    if not success:
-        raise HTTPException(status_code=404, detail="Cart not found")
+    _, cart_summary = await active_carts.mutate(cart_id, CartOps.clear, expected_version=parse_if_match(if_match))
+    response.headers["ETag"] = cart_etag(cart_summary)
 
     return {
         "success": True,
         "message": "Cart cleared successfully",
-        "cart_id": cart_id
+        "cart_id": cart_id,
+        "version": cart_summary["version"]
+    }
+
+
+@router.post("/{cart_id}/totals/verify")
+async def verify_cart_totals(
+    cart_id: int,
+    fix: bool = Query(True, description="Correct the stored totals if they drifted"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Recompute the cart's totals from its items and modifiers and compare them with the stored ones"""
+    await active_carts.flush(cart_id)
+    cart = await CartHelper.get_cart_by_id(db, cart_id)
+    if not cart:
+        raise HTTPException(status_code=404, detail="Cart not found")
+
+    report = await CartHelper.verify_cart_totals(db, [cart_id], fix=fix)
+    return {
+        "success": True,
+        "cart_id": cart_id,
+        "drifted": bool(report),
+        "fixed": bool(report) and fix,
+        "drift": report[0] if report else None
     }
 
 
 @router.get("/session/{session_id}")
 async def get_cart_by_session(
     session_id: str,
-    db: Session = Depends(get_db)
+    response: Response,
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get active cart by session ID (for guest users)"""
-    cart = CartHelper.get_active_cart_by_session(db, session_id)
-    if not cart:
+    cart_summary = await active_carts.get_by_session(session_id)
+    if not cart_summary:
         raise HTTPException(status_code=404, detail="No active cart found for this session")
+    response.headers["ETag"] = cart_etag(cart_summary)
 
-    cart_summary = CartHelper.get_cart_summary(db, cart.id)
     return {
         "success": True,
         "cart": cart_summary
@@ -260,12 +479,15 @@ async def get_cart_by_session(
 async def assign_customer_to_cart(
     cart_id: int,
     # customer_id: str = Query(..., description="Customer ID to assign to cart"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Assign a logged-in customer to a guest cart (when user logs in during checkout)"""
     try:
+        # Written to the database directly, so pending edits go first
+        await active_carts.flush(cart_id, evict=True)
+
         # Check if cart exists and is active
-        cart = CartHelper.get_cart_by_id(db, cart_id)
+        cart = await CartHelper.get_cart_by_id(db, cart_id)
         if not cart:
             raise HTTPException(status_code=404, detail="Cart not found")
 
@@ -278,7 +500,7 @@ async def assign_customer_to_cart(
         # Update cart with customer ID
         # cart.customer_id = customer_id
         cart.updated_at = datetime.now()
-        db.commit()
+        await db.commit()
 
         return {
             "success": True,
@@ -288,19 +510,25 @@ async def assign_customer_to_cart(
             "session_id": cart.session_id,
             "user_type": "logged_in"
         }
+    except HTTPException:
+        raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to assign customer: {str(e)}")
 
 
 @router.get("/customer/{customer_id}")
 async def get_customer_carts(
     customer_id: str,
-    db: Session = Depends(get_db)
+    limit: int = Query(50, ge=1, le=200, description="Carts per page, newest first"),
+    offset: int = Query(0, ge=0),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get all carts for a specific customer (logged-in user)"""
     try:
-        carts = CartHelper.get_carts_by_customer(db, customer_id)
+        carts = await active_carts.overlay(
+            await CartHelper.get_carts_by_customer(db, customer_id, limit=limit, offset=offset)
+        )
         return {
             "success": True,
             "customer_id": customer_id,
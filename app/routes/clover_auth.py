@@ -1,6 +1,7 @@
 from fastapi import APIRouter, Depends, Request
-import httpx
 import os
+from services.clover_client import clover_client
+from services.token_refresh import request_token_refresh
 
 router = APIRouter(prefix="/clover", tags=["Clover Auth"])
 
@@ -22,52 +23,40 @@ def clover_login():
 # @router.get("/callback")
 async def clover_callback(request: Request, code: str):
     """OAuth2 callback to exchange code for access + refresh tokens"""
-    async with httpx.AsyncClient() as client:
-        resp = await client.post(
-            TOKEN_URL,
-            data={
-                "client_id": CLIENT_ID,
-                "client_secret": CLIENT_SECRET,
-                "code": code,
-                "grant_type": "authorization_code",
-            },
-            headers={"Content-Type": "application/x-www-form-urlencoded"},
-        )
-        data = resp.json()
-        # store tokens securely (DB/Redis)
-        return data
+    resp = await clover_client.post(
+        TOKEN_URL,
+        data={
+            "client_id": CLIENT_ID,
+            "client_secret": CLIENT_SECRET,
+            "code": code,
+            "grant_type": "authorization_code",
+        },
+        headers={"Content-Type": "application/x-www-form-urlencoded"},
+    )
+    data = resp.json()
+    # store tokens securely (DB/Redis)
+    return data
 
 
 # @router.post("/token")
 async def clover_token(code: str):
     """Directly exchange authorization code for tokens (no redirect flow)."""
-    async with httpx.AsyncClient() as client:
-        resp = await client.post(
-            TOKEN_URL,
-            data={
-                "client_id": CLIENT_ID,
-                "client_secret": CLIENT_SECRET,
-                "code": code,
-                "grant_type": "authorization_code",
-                "redirect_uri": REDIRECT_URI,
-            },
-            headers={"Content-Type": "application/x-www-form-urlencoded"},
-        )
-        return resp.json()
+    resp = await clover_client.post(
+        TOKEN_URL,
+        data={
+            "client_id": CLIENT_ID,
+            "client_secret": CLIENT_SECRET,
+            "code": code,
+            "grant_type": "authorization_code",
+            "redirect_uri": REDIRECT_URI,
+        },
+        headers={"Content-Type": "application/x-www-form-urlencoded"},
+    )
+    return resp.json()
 
 
 # @router.post("/refresh")
 async def clover_refresh(refresh_token: str):
     """Refresh expired access token"""
-    async with httpx.AsyncClient() as client:
-        resp = await client.post(
-            TOKEN_URL,
-            data={
-                "client_id": CLIENT_ID,
-                "client_secret": CLIENT_SECRET,
-                "refresh_token": refresh_token,
-                "grant_type": "refresh_token",
-            },
-            headers={"Content-Type": "application/x-www-form-urlencoded"},
-        )
-        return resp.json()
+    resp = await request_token_refresh(refresh_token)
+    return resp.json()
@@ -1,20 +1,21 @@
 # app/routes/clover_cart.py
-from fastapi import APIRouter, HTTPException, Query, Depends, Body
-from sqlalchemy.orm import Session
-from database.database import get_db
+from fastapi import APIRouter, HTTPException, Query, Depends, Body, Header
+from sqlalchemy.ext.asyncio import AsyncSession
+from database.database import get_async_db
 from helpers.cart_helper import CartHelper
 from helpers.merchant_helper import MerchantHelper
-from models.cart import Cart
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
-import httpx
-import os
-from datetime import datetime
+import json
+from services.clover_client import clover_client
+from services.clover_scheduler import CloverPriority
+from services.clover_order_sync import push_line_items, push_modifiers, failed_results, idempotency_headers
+from services.order_submission import OrderSubmissionPipeline, load_ids
+from services.active_carts import active_carts
+from services.cart_events import cart_events
 
 router = APIRouter(prefix="/clover-cart", tags=["Clover Cart Integration"])
 
-CLOVER_BASE_URL = os.getenv("CLOVER_BASE_URL", "https://apisandbox.dev.clover.com")
-
 
 class SyncCartRequest(BaseModel):
     cart_id: int
@@ -25,33 +26,43 @@ class CreateCloverOrderRequest(BaseModel):
     order_type: Optional[str] = "first_party_delivery"  # or "pickup", "delivery", etc.
 
 
-def _build_headers(access_token: str):
-    return {
-        "Authorization": f"Bearer {access_token}",
-        "Content-Type": "application/json",
-    }
-
-
 @router.post("/sync-to-clover")
 async def sync_cart_to_clover_order(
     request: SyncCartRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Step 1: Create empty Clover order from cart
     POST /v3/merchants/{mId}/orders
+
+    The Clover order id is kept on the cart's order submission, which the
+    later steps and POST /complete-order continue from.
     """
     try:
+        # Pending edits go to the database first; the cart leaves the store while it syncs
+        await active_carts.flush(request.cart_id, evict=True)
+
         # Get cart details
-        cart = CartHelper.get_cart_by_id(db, request.cart_id)
+        cart = await CartHelper.get_cart_with_items(db, request.cart_id)
         if not cart:
             raise HTTPException(status_code=404, detail="Cart not found")
 
+        submission = await CartHelper.get_order_submission(db, cart.id)
+        if submission and submission.clover_order_id:
+            return {
+                "success": True,
+                "message": "Cart already synced to Clover order",
+                "cart_id": cart.id,
+                "clover_order_id": submission.clover_order_id
+            }
+
         if cart.status != "active":
             raise HTTPException(status_code=400, detail="Can only sync active carts")
+        if not submission:
+            submission = await OrderSubmissionPipeline.start(db, cart)
 
         # Get merchant token
-        access_token = MerchantHelper.get_merchant_token(db, cart.clover_merchant_id)
+        access_token = await MerchantHelper.get_merchant_token(db, cart.clover_merchant_id)
         if not access_token:
             raise HTTPException(status_code=404, detail="Merchant token not found")
 
@@ -64,29 +75,31 @@ async def sync_cart_to_clover_order(
             "note": f"Order created from cart {cart.id}"
         }
 
-        url = f"{CLOVER_BASE_URL}/v3/merchants/{cart.clover_merchant_id}/orders"
+        url = f"/v3/merchants/{cart.clover_merchant_id}/orders"
 
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                url,
-                headers=_build_headers(access_token),
-                json=clover_order_data
-            )
+        response = await clover_client.post(
+            url,
+            access_token=access_token,
+            json=clover_order_data,
+            headers=idempotency_headers(submission.idempotency_key, "order"),
+            priority=CloverPriority.ORDER_WRITE
+        )
 
-            if response.status_code >= 400:
-                raise HTTPException(
-                    status_code=response.status_code,
-                    detail=f"Clover API error: {response.text}"
-                )
+        if response.status_code >= 400:
+            raise HTTPException(
+                status_code=response.status_code,
+                detail=f"Clover API error: {response.text}"
+            )
 
-            clover_order = response.json()
-            clover_order_id = clover_order.get("id")
+        clover_order = response.json()
+        clover_order_id = clover_order.get("id")
 
-        # Update cart with Clover order ID
-        cart.clover_order_id = clover_order_id
+        # Record the Clover order ID on the cart's submission
+        submission.clover_order_id = clover_order_id
+        submission.step = "order_created"
         cart.status = "synced"
-        cart.synced_at = datetime.now()
-        db.commit()
+        await db.commit()
+        cart_events.publish(cart.id, "cart")
 
         return {
             "success": True,
@@ -96,210 +109,199 @@ async def sync_cart_to_clover_order(
             "clover_order": clover_order
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to sync cart: {str(e)}")
 
 
 @router.post("/sync-items")
 async def sync_cart_items_to_clover(
     request: SyncCartRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Step 2: Add line items to Clover order
     POST /v3/merchants/{mId}/orders/{orderId}/line_items
     """
     try:
+        await active_carts.flush(request.cart_id, evict=True)
+
         # Get cart with items
-        cart = CartHelper.get_cart_by_id(db, request.cart_id)
+        cart = await CartHelper.get_cart_with_items(db, request.cart_id)
         if not cart:
             raise HTTPException(status_code=404, detail="Cart not found")
 
-        if not cart.clover_order_id:
+        submission = await CartHelper.get_order_submission(db, cart.id)
+        if not submission or not submission.clover_order_id:
             raise HTTPException(status_code=400, detail="Cart not synced to Clover. Run sync-to-clover first.")
 
         # Get merchant token
-        access_token = MerchantHelper.get_merchant_token(db, cart.clover_merchant_id)
+        access_token = await MerchantHelper.get_merchant_token(db, cart.clover_merchant_id)
         if not access_token:
             raise HTTPException(status_code=404, detail="Merchant token not found")
 
-        synced_items = []
-
-        # Add each cart item as line item in Clover
-        for cart_item in cart.items:
-            line_item_data = {
-                "item": {
-                    "id": cart_item.clover_item_id
-                },
-                "unitQty": cart_item.quantity,
-                "note": cart_item.notes or ""
-            }
-
-            url = f"{CLOVER_BASE_URL}/v3/merchants/{cart.clover_merchant_id}/orders/{cart.clover_order_id}/line_items"
-
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    url,
-                    headers=_build_headers(access_token),
-                    json=line_item_data
-                )
+        # Items that already have a Clover line item were pushed by an earlier call
+        line_item_ids = load_ids(submission.line_item_ids)
+        pending_items = [cart_item for cart_item in cart.items if str(cart_item.id) not in line_item_ids]
+        results = await push_line_items(
+            cart.clover_merchant_id, submission.clover_order_id, access_token, pending_items,
+            idempotency_key=submission.idempotency_key
+        )
 
-                if response.status_code >= 400:
-                    raise HTTPException(
-                        status_code=response.status_code,
-                        detail=f"Failed to add line item: {response.text}"
-                    )
-
-                clover_line_item = response.json()
-                clover_line_item_id = clover_line_item.get("id")
-
-                # Update cart item with Clover line item ID
-                cart_item.clover_line_item_id = clover_line_item_id
-
-                synced_items.append({
-                    "cart_item_id": cart_item.id,
-                    "clover_line_item_id": clover_line_item_id,
-                    "name": cart_item.name,
-                    "quantity": cart_item.quantity
-                })
-
-        db.commit()
+        synced_items = []
+        for cart_item, result in zip(pending_items, results):
+            if result["clover_line_item_id"]:
+                line_item_ids[str(cart_item.id)] = result["clover_line_item_id"]
+            synced_items.append({
+                "cart_item_id": cart_item.id,
+                "clover_line_item_id": result["clover_line_item_id"],
+                "name": cart_item.name,
+                "quantity": cart_item.quantity,
+                "error": result["error"]
+            })
+
+        failed = failed_results(synced_items)
+        submission.line_item_ids = json.dumps(line_item_ids)
+        if not failed and submission.step == "order_created":
+            submission.step = "line_items_synced"
+        await db.commit()
+
+        if failed and len(failed) == len(synced_items):
+            raise HTTPException(status_code=502, detail=failed[0]["error"])
 
         return {
-            "success": True,
-            "message": "Cart items synced to Clover order",
+            "success": not failed,
+            "message": "Cart items synced to Clover order" if not failed else "Some cart items failed to sync",
             "cart_id": cart.id,
-            "clover_order_id": cart.clover_order_id,
-            "synced_items": synced_items
+            "clover_order_id": submission.clover_order_id,
+            "synced_items": synced_items,
+            "failed_count": len(failed)
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to sync items: {str(e)}")
 
 
 @router.post("/add-modifiers")
 async def sync_cart_modifiers_to_clover(
     request: SyncCartRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Step 3: Add modifiers to line items in Clover order
     POST /v3/merchants/{mId}/orders/{orderId}/line_items/{lineItemId}/modifications
     """
     try:
+        await active_carts.flush(request.cart_id, evict=True)
+
         # Get cart with items and modifiers
-        cart = CartHelper.get_cart_by_id(db, request.cart_id)
+        cart = await CartHelper.get_cart_with_items(db, request.cart_id)
         if not cart:
             raise HTTPException(status_code=404, detail="Cart not found")
 
-        if not cart.clover_order_id:
+        submission = await CartHelper.get_order_submission(db, cart.id)
+        if not submission or not submission.clover_order_id:
             raise HTTPException(status_code=400, detail="Cart not synced to Clover")
 
         # Get merchant token
-        access_token = MerchantHelper.get_merchant_token(db, cart.clover_merchant_id)
+        access_token = await MerchantHelper.get_merchant_token(db, cart.clover_merchant_id)
         if not access_token:
             raise HTTPException(status_code=404, detail="Merchant token not found")
 
-        synced_modifiers = []
-
-        # Add modifiers for each cart item
+        # Line item ids recorded by sync-items; modifiers already added are skipped
+        line_item_ids = load_ids(submission.line_item_ids)
+        modification_ids = load_ids(submission.modification_ids)
         for cart_item in cart.items:
-            if not cart_item.clover_line_item_id:
-                continue  # Skip items not synced yet
-
-            for modifier in cart_item.modifiers:
-                modification_data = {
-                    "modifier": {
-                        "id": modifier.clover_modifier_id
-                    },
-                    "amount": int(modifier.price * 100)  # Convert to cents
-                }
-
-                url = (
-                    f"{CLOVER_BASE_URL}/v3/merchants/{cart.clover_merchant_id}/orders/"
-                    f"{cart.clover_order_id}/line_items/{cart_item.clover_line_item_id}/modifications"
-                )
-
-                async with httpx.AsyncClient() as client:
-                    response = await client.post(
-                        url,
-                        headers=_build_headers(access_token),
-                        json=modification_data
-                    )
-
-                    if response.status_code >= 400:
-                        raise HTTPException(
-                            status_code=response.status_code,
-                            detail=f"Failed to add modifier: {response.text}"
-                        )
-
-                    clover_modification = response.json()
-
-                    synced_modifiers.append({
-                        "cart_item_id": cart_item.id,
-                        "modifier_id": modifier.id,
-                        "clover_modification_id": clover_modification.get("id"),
-                        "name": modifier.name,
-                        "price": modifier.price
-                    })
+            cart_item.clover_line_item_id = line_item_ids.get(str(cart_item.id))
+
+        synced_modifiers = await push_modifiers(
+            cart.clover_merchant_id, submission.clover_order_id, access_token, cart.items,
+            idempotency_key=submission.idempotency_key,
+            done_modifier_ids={int(modifier_id) for modifier_id in modification_ids}
+        )
+
+        failed = failed_results(synced_modifiers)
+        for result in synced_modifiers:
+            if result["clover_modification_id"]:
+                modification_ids[str(result["modifier_id"])] = result["clover_modification_id"]
+        submission.modification_ids = json.dumps(modification_ids)
+        if not failed and submission.step == "line_items_synced":
+            submission.step = "modifiers_synced"
+        await db.commit()
+
+        if failed and len(failed) == len(synced_modifiers):
+            raise HTTPException(status_code=502, detail=failed[0]["error"])
 
         return {
-            "success": True,
-            "message": "Modifiers synced to Clover order",
+            "success": not failed,
+            "message": "Modifiers synced to Clover order" if not failed else "Some modifiers failed to sync",
             "cart_id": cart.id,
-            "clover_order_id": cart.clover_order_id,
-            "synced_modifiers": synced_modifiers
+            "clover_order_id": submission.clover_order_id,
+            "synced_modifiers": synced_modifiers,
+            "failed_count": len(failed)
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to sync modifiers: {str(e)}")
 
 
 @router.get("/order-status/{cart_id}")
 async def get_clover_order_status(
     cart_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Step 4: Get current order status from Clover
     GET /v3/merchants/{mId}/orders/{orderId}
+
+    Clients that follow an order should stream GET /cart/{cart_id}/events
+    instead of polling this.
     """
     try:
         # Get cart
-        cart = CartHelper.get_cart_by_id(db, cart_id)
+        cart = await CartHelper.get_cart_by_id(db, cart_id)
         if not cart:
             raise HTTPException(status_code=404, detail="Cart not found")
 
-        if not cart.clover_order_id:
+        submission = await CartHelper.get_order_submission(db, cart_id)
+        clover_order_id = submission.clover_order_id if submission else None
+        if not clover_order_id:
             raise HTTPException(status_code=400, detail="Cart not synced to Clover")
 
         # Get merchant token
-        access_token = MerchantHelper.get_merchant_token(db, cart.clover_merchant_id)
+        access_token = await MerchantHelper.get_merchant_token(db, cart.clover_merchant_id)
         if not access_token:
             raise HTTPException(status_code=404, detail="Merchant token not found")
 
-        url = f"{CLOVER_BASE_URL}/v3/merchants/{cart.clover_merchant_id}/orders/{cart.clover_order_id}"
+        url = f"/v3/merchants/{cart.clover_merchant_id}/orders/{clover_order_id}"
 
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, headers=_build_headers(access_token))
+        response = await clover_client.get(url, access_token=access_token)
 
-            if response.status_code >= 400:
-                raise HTTPException(
-                    status_code=response.status_code,
-                    detail=f"Clover API error: {response.text}"
-                )
+        if response.status_code >= 400:
+            raise HTTPException(
+                status_code=response.status_code,
+                detail=f"Clover API error: {response.text}"
+            )
 
-            clover_order = response.json()
+        clover_order = response.json()
 
         return {
             "success": True,
             "cart_id": cart.id,
-            "clover_order_id": cart.clover_order_id,
+            "clover_order_id": clover_order_id,
             "order_status": clover_order
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get order status: {str(e)}")
 
@@ -307,35 +309,35 @@ async def get_clover_order_status(
 @router.post("/complete-order")
 async def complete_order_flow(
     request: SyncCartRequest,
-    db: Session = Depends(get_db)
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
 ):
     """
     Complete workflow: Create order + Add items + Add modifiers
+
+    Progress is saved after every step, so calling this again after a
+    failure resumes where it stopped; calling it for a completed cart
+    returns the earlier result.
     """
     try:
-        # Step 1: Sync cart to Clover order
-        await sync_cart_to_clover_order(request, db)
-
-        # Step 2: Sync items
-        await sync_cart_items_to_clover(request, db)
-
-        # Step 3: Sync modifiers
-        await sync_cart_modifiers_to_clover(request, db)
-
-        # Get final cart status
-        cart = CartHelper.get_cart_by_id(db, request.cart_id)
-        cart.status = "completed"
-        db.commit()
-
-        return {
-            "success": True,
-            "message": "Order completed successfully",
-            "cart_id": cart.id,
-            "clover_order_id": cart.clover_order_id,
-            "status": "completed"
-        }
+        return await OrderSubmissionPipeline.submit(request.cart_id, idempotency_key)
 
+    except HTTPException:
+        raise
     except Exception as e:
-        db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to complete order: {str(e)}")
 
+
+@router.get("/submission/{cart_id}")
+async def get_order_submission(
+    cart_id: int,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Progress of the Clover order submission for a cart"""
+    submission = await CartHelper.get_order_submission(db, cart_id)
+    if not submission:
+        raise HTTPException(status_code=404, detail="No order submission for this cart")
+
+    return {
+        "success": True,
+        "submission": OrderSubmissionPipeline.progress(submission)
+    }
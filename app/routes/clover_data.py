@@ -1,159 +1,250 @@
-from fastapi import APIRouter, HTTPException, Query, Depends, Path
-from sqlalchemy.orm import Session
-import os
+from fastapi import APIRouter, HTTPException, Query, Depends, Path, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 import httpx
-from database.database import get_db
+import json
+from database.database import get_async_db, get_async_read_db
 from helpers.merchant_helper import MerchantHelper
+from helpers.catalog_helper import CatalogHelper
 from typing import Optional,Dict, Any
 from models.merchant_detail import MerchantDetail
+from services.clover_client import clover_client
+from services.clover_scheduler import CloverPriority
+from services.clover_api import iter_clover_pages, fetch_all_clover_elements
+from services.catalog_sync import catalog_sync_worker
+from services.menu_snapshot import MENU_SNAPSHOT_IMMUTABLE_CACHE_CONTROL, SNAPSHOT_ID_PATTERN, menu_snapshots
+from services.stock_snapshot import stock_snapshots
+from services.response_cache import response_cache
 
 router = APIRouter(prefix="/api/clover", tags=["Clover Items"])
 
-CLOVER_BASE_URL = os.getenv("CLOVER_BASE_URL", "https://apisandbox.dev.clover.com")
+STREAM_FORMAT_PATTERN = "^(ndjson|json)$"
 
 
-def _build_headers(access_token: str):
-    return {
-        "Authorization": f"Bearer {access_token}",
-        "Content-Type": "application/json",
-    }
+async def _stream_collection(
+    merchant_id: str,
+    access_token: str,
+    endpoint: str,
+    params: Optional[Dict[str, Any]] = None,
+    stream_format: str = "ndjson",
+) -> StreamingResponse:
+    """
+    Stream every page of a Clover collection back to the client.
+
+    ndjson: one element per line (application/x-ndjson)
+    json:   a single {"elements": [...]} document, written page by page
+
+    The first page is fetched before the response starts so that upstream
+    errors (bad token, unknown merchant) still map to a proper status code.
+    """
+    pages = iter_clover_pages(merchant_id, access_token, endpoint, params)
+    try:
+        first_page = await anext(pages, None)
+    except httpx.HTTPStatusError as e:
+        raise HTTPException(status_code=e.response.status_code, detail=e.response.text)
+
+    async def all_pages():
+        if first_page is not None:
+            yield first_page
+        async for page in pages:
+            yield page
+
+    async def ndjson_body():
+        async for page in all_pages():
+            yield "".join(json.dumps(element) + "\n" for element in page)
+
+    async def json_body():
+        yield '{"merchant_id": ' + json.dumps(merchant_id) + ', "elements": ['
+        first = True
+        async for page in all_pages():
+            chunk = ",".join(json.dumps(element) for element in page)
+            if not chunk:
+                continue
+            yield chunk if first else "," + chunk
+            first = False
+        yield "]}"
+
+    if stream_format == "json":
+        return StreamingResponse(json_body(), media_type="application/json")
+    return StreamingResponse(ndjson_body(), media_type="application/x-ndjson")
 
 @router.get("/items/{merchant_id}")
 async def get_all_items_with_variations(
+    request: Request,
     merchant_id: str = Path(..., description="Clover merchant ID"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_read_db),
 ):
     """
     Get all items with their variations for a specific merchant.
+    Served from the local catalog mirror once it has been synced.
     """
-    access_token = MerchantHelper.get_merchant_token(db, merchant_id)
+    access_token = await MerchantHelper.get_merchant_token(db, merchant_id)
     if not access_token:
         raise HTTPException(status_code=404, detail="Merchant token not found. Add the merchant first.")
 
-    url = f"{CLOVER_BASE_URL}/v3/merchants/{merchant_id}/items"
-    params = {"expand": "variants"} 
+    return await response_cache.respond(
+        request, "items", merchant_id,
+        lambda: _items_with_variations(db, merchant_id, access_token),
+    )
 
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(url, headers=_build_headers(access_token), params=params)
-            response.raise_for_status()
-            clover_items = response.json().get("elements", [])
-
-            formatted_items = []
-            for item in clover_items:
-                variations = []
-                if "variants" in item and "elements" in item["variants"]:
-                    for variant in item["variants"]["elements"]:
-                        variations.append({
-                            "id": variant.get("id"),
-                            "name": variant.get("name"),
-                            "price": variant.get("price"),
-                        })
-
-                formatted_items.append({
-                    "id": item.get("id"),
-                    "name": item.get("name"),
-                    "price": item.get("price"),
-                    "variations": variations,
-                })
-
-            return {"merchant_id": merchant_id, "items": formatted_items}
 
-        except httpx.HTTPStatusError as e:
-            if e.response.status_code == 401:
-                raise HTTPException(status_code=401, detail="Invalid or expired Clover token.")
-            raise HTTPException(status_code=e.response.status_code, detail=f"Clover API error: {e.response.text}")
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
+async def _items_with_variations(db: AsyncSession, merchant_id: str, access_token: str) -> Dict[str, Any]:
+    if await db.run_sync(CatalogHelper.is_synced, merchant_id, "items"):
+        items = await db.run_sync(CatalogHelper.get_items_with_variations, merchant_id)
+        return {"merchant_id": merchant_id, "items": items}
+
+    # Mirror not populated yet: answer live and start filling it
+    catalog_sync_worker.trigger(merchant_id, access_token)
+    params = {"expand": "variants"}
+
+    try:
+        clover_items = await fetch_all_clover_elements(merchant_id, access_token, "items", params)
+
+        formatted_items = []
+        for item in clover_items:
+            variations = []
+            if "variants" in item and "elements" in item["variants"]:
+                for variant in item["variants"]["elements"]:
+                    variations.append({
+                        "id": variant.get("id"),
+                        "name": variant.get("name"),
+                        "price": variant.get("price"),
+                    })
+
+            formatted_items.append({
+                "id": item.get("id"),
+                "name": item.get("name"),
+                "price": item.get("price"),
+                "variations": variations,
+            })
+
+        return {"merchant_id": merchant_id, "items": formatted_items}
+
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code == 401:
+            raise HTTPException(status_code=401, detail="Invalid or expired Clover token.")
+        raise HTTPException(status_code=e.response.status_code, detail=f"Clover API error: {e.response.text}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
 
 
 @router.get("/items")
 async def list_items(
+    request: Request,
     merchant_id: str = Query(..., description="Clover merchant ID"),
     limit: int = Query(100, ge=1, le=1000),
     offset: int = Query(0, ge=0),
     expand: str = Query("", description="Optional expand params, e.g. categories,modifierGroups"),
-    db: Session = Depends(get_db),
+    fetch_all: bool = Query(False, alias="all", description="Fetch every page and stream the merged collection"),
+    stream_format: str = Query("ndjson", alias="format", pattern=STREAM_FORMAT_PATTERN, description="Stream format when all=true"),
+    db: AsyncSession = Depends(get_async_read_db),
 ):
-    access_token = MerchantHelper.get_merchant_token(db, merchant_id)
+    access_token = await MerchantHelper.get_merchant_token(db, merchant_id)
     if not access_token:
         raise HTTPException(status_code=404, detail="Merchant token not found. Add the merchant first.")
 
-    url = f"{CLOVER_BASE_URL}/v3/merchants/{merchant_id}/items"
+    if fetch_all:
+        return await _stream_collection(
+            merchant_id, access_token, "items", {"expand": expand} if expand else None, stream_format
+        )
+
+    url = f"/v3/merchants/{merchant_id}/items"
     params = {"limit": limit, "offset": offset}
     if expand:
         params["expand"] = expand
 
-    async with httpx.AsyncClient() as client:
-        r = await client.get(url, headers=_build_headers(access_token), params=params)
+    async def fetch():
+        r = await clover_client.get(url, access_token=access_token, params=params, priority=CloverPriority.CATALOG_READ)
         if r.status_code >= 400:
             raise HTTPException(status_code=r.status_code, detail=r.text)
         return r.json()
 
+    return await response_cache.respond(request, "items", merchant_id, fetch)
+
 
 @router.get("/categories")
 async def list_categories(
+    request: Request,
     merchant_id: str = Query(..., description="Clover merchant ID"),
     limit: int = Query(100, ge=1, le=1000),
     offset: int = Query(0, ge=0),
-    db: Session = Depends(get_db),
+    fetch_all: bool = Query(False, alias="all", description="Fetch every page and stream the merged collection"),
+    stream_format: str = Query("ndjson", alias="format", pattern=STREAM_FORMAT_PATTERN, description="Stream format when all=true"),
+    db: AsyncSession = Depends(get_async_read_db),
 ):
-    access_token = MerchantHelper.get_merchant_token(db, merchant_id)
+    access_token = await MerchantHelper.get_merchant_token(db, merchant_id)
     if not access_token:
         raise HTTPException(status_code=404, detail="Merchant token not found. Add the merchant first.")
 
-    url = f"{CLOVER_BASE_URL}/v3/merchants/{merchant_id}/categories"
+    if fetch_all:
+        return await _stream_collection(merchant_id, access_token, "categories", None, stream_format)
+
+    url = f"/v3/merchants/{merchant_id}/categories"
     params = {"limit": limit, "offset": offset}
 
-    async with httpx.AsyncClient() as client:
-        r = await client.get(url, headers=_build_headers(access_token), params=params)
+    async def fetch():
+        r = await clover_client.get(url, access_token=access_token, params=params, priority=CloverPriority.CATALOG_READ)
         if r.status_code >= 400:
             raise HTTPException(status_code=r.status_code, detail=r.text)
         return r.json()
 
+    return await response_cache.respond(request, "categories", merchant_id, fetch)
+
 
 @router.get("/modifier-groups")
 async def list_modifier_groups(
+    request: Request,
     merchant_id: str = Query(..., description="Clover merchant ID"),
     limit: int = Query(100, ge=1, le=1000),
     offset: int = Query(0, ge=0),
-    db: Session = Depends(get_db),
+    fetch_all: bool = Query(False, alias="all", description="Fetch every page and stream the merged collection"),
+    stream_format: str = Query("ndjson", alias="format", pattern=STREAM_FORMAT_PATTERN, description="Stream format when all=true"),
+    db: AsyncSession = Depends(get_async_read_db),
 ):
-    access_token = MerchantHelper.get_merchant_token(db, merchant_id)
+    access_token = await MerchantHelper.get_merchant_token(db, merchant_id)
     if not access_token:
         raise HTTPException(status_code=404, detail="Merchant token not found. Add the merchant first.")
 
-    url = f"{CLOVER_BASE_URL}/v3/merchants/{merchant_id}/modifier_groups"
+    if fetch_all:
+        return await _stream_collection(merchant_id, access_token, "modifier_groups", None, stream_format)
+
+    url = f"/v3/merchants/{merchant_id}/modifier_groups"
     params = {"limit": limit, "offset": offset}
 
-    async with httpx.AsyncClient() as client:
-        r = await client.get(url, headers=_build_headers(access_token), params=params)
+    async def fetch():
+        r = await clover_client.get(url, access_token=access_token, params=params, priority=CloverPriority.CATALOG_READ)
         if r.status_code >= 400:
             raise HTTPException(status_code=r.status_code, detail=r.text)
         return r.json()
 
+    return await response_cache.respond(request, "modifier_groups", merchant_id, fetch)
+
 
 
 
 @router.get("/modifier-groups/{modifier_group_id}")
 async def get_modifier_group(
+    request: Request,
     modifier_group_id: str,
     merchant_id: str = Query(..., description="Clover merchant ID"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_read_db),
 ):
     """Get a specific modifier group for a merchant."""
-    access_token = MerchantHelper.get_merchant_token(db, merchant_id)
+    access_token = await MerchantHelper.get_merchant_token(db, merchant_id)
     if not access_token:
         raise HTTPException(status_code=404, detail="Merchant token not found. Add the merchant first.")
 
-    url = f"{CLOVER_BASE_URL}/v3/merchants/{merchant_id}/modifier_groups/{modifier_group_id}/modifiers"
+    url = f"/v3/merchants/{merchant_id}/modifier_groups/{modifier_group_id}/modifiers"
 
-    async with httpx.AsyncClient() as client:
-        r = await client.get(url, headers=_build_headers(access_token))
+    async def fetch():
+        r = await clover_client.get(url, access_token=access_token, priority=CloverPriority.CATALOG_READ)
         if r.status_code >= 400:
             raise HTTPException(status_code=r.status_code, detail=r.text)
         return r.json()
 
+    return await response_cache.respond(request, "modifier_groups", merchant_id, fetch)
+
 
 # Merchant-focused endpoints
 merchant_router = APIRouter(prefix="/clover/merchant", tags=["Clover Merchant"])
@@ -161,52 +252,55 @@ merchant_router = APIRouter(prefix="/clover/merchant", tags=["Clover Merchant"])
 
 @router.get("/modifier-groups/{modifier_group_id}/modifiers/{modifier_id}")
 async def get_modifier(
+    request: Request,
     modifier_group_id: str,
     modifier_id: str,
     merchant_id: str = Query(..., description="Clover merchant ID"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_read_db),
 ):
     """Get a specific modifier within a modifier group for a merchant."""
-    access_token = MerchantHelper.get_merchant_token(db, merchant_id)
+    access_token = await MerchantHelper.get_merchant_token(db, merchant_id)
     if not access_token:
         raise HTTPException(status_code=404, detail="Merchant token not found. Add the merchant first.")
 
     url = (
-        f"{CLOVER_BASE_URL}/v3/merchants/{merchant_id}/modifier_groups/"
+        f"/v3/merchants/{merchant_id}/modifier_groups/"
         f"{modifier_group_id}/modifiers/{modifier_id}"
     )
 
-    async with httpx.AsyncClient() as client:
-        r = await client.get(url, headers=_build_headers(access_token))
+    async def fetch():
+        r = await clover_client.get(url, access_token=access_token, priority=CloverPriority.CATALOG_READ)
         if r.status_code >= 400:
             raise HTTPException(status_code=r.status_code, detail=r.text)
         return r.json()
 
+    return await response_cache.respond(request, "modifier_groups", merchant_id, fetch)
+
 
 @merchant_router.get("/details")
 async def get_and_store_merchant_details(
     merchant_id: str = Query(..., description="Clover merchant ID"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Get and store merchant details from Clover API"""
     try:
-        access_token = MerchantHelper.get_merchant_token(db, merchant_id)
+        access_token = await MerchantHelper.get_merchant_token(db, merchant_id)
         if not access_token:
             raise HTTPException(status_code=404, detail="Merchant token not found. Add the merchant first.")
 
-        url = f"{CLOVER_BASE_URL}/v3/merchants/{merchant_id}/address"
+        url = f"/v3/merchants/{merchant_id}/address"
 
-        async with httpx.AsyncClient() as client:
-            r = await client.get(url, headers=_build_headers(access_token))
-            if r.status_code >= 400:
-                raise HTTPException(status_code=r.status_code, detail=r.text)
-            merchant_data = r.json()
+        r = await clover_client.get(url, access_token=access_token)
+        if r.status_code >= 400:
+            raise HTTPException(status_code=r.status_code, detail=r.text)
+        merchant_data = r.json()
 
 
         # Check if merchant detail already exists
-        existing_merchant = db.query(MerchantDetail).filter(
-            MerchantDetail.clover_merchant_id == merchant_id
-        ).first()
+        result = await db.execute(
+            select(MerchantDetail).where(MerchantDetail.clover_merchant_id == merchant_id)
+        )
+        existing_merchant = result.scalars().first()
 
         print("Raw merchant data:", merchant_data.get("address1"))  # Debug print
         if existing_merchant:
@@ -221,8 +315,8 @@ async def get_and_store_merchant_details(
             existing_merchant.currency = str(merchant_data.get("currency", "")) if merchant_data.get("currency") else None
             existing_merchant.timezone = str(merchant_data.get("timezone", "")) if merchant_data.get("timezone") else None
 
-            db.commit()
-            db.refresh(existing_merchant)
+            await db.commit()
+            await db.refresh(existing_merchant)
 
             return {
                 "success": True,
@@ -256,8 +350,8 @@ async def get_and_store_merchant_details(
             )
 
             db.add(new_merchant)
-            db.commit()
-            db.refresh(new_merchant)
+            await db.commit()
+            await db.refresh(new_merchant)
 
             return {
                 "success": True,
@@ -277,7 +371,7 @@ async def get_and_store_merchant_details(
             }
 
     except Exception as e:
-        db.rollback()  # Rollback in case of error
+        await db.rollback()  # Rollback in case of error
         print(f"Error storing merchant details: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to store merchant details: {str(e)}")
 
@@ -328,20 +422,19 @@ async def get_and_store_merchant_details(
 @merchant_router.get("/address")
 async def get_merchant_address(
     merchant_id: str = Query(..., description="Clover merchant ID"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Get merchant address details specifically"""
-    access_token = MerchantHelper.get_merchant_token(db, merchant_id)
+    access_token = await MerchantHelper.get_merchant_token(db, merchant_id)
     if not access_token:
         raise HTTPException(status_code=404, detail="Merchant token not found. Add the merchant first.")
 
-    url = f"{CLOVER_BASE_URL}/v3/merchants/{merchant_id}/address"
+    url = f"/v3/merchants/{merchant_id}/address"
 
-    async with httpx.AsyncClient() as client:
-        r = await client.get(url, headers=_build_headers(access_token))
-        if r.status_code >= 400:
-            raise HTTPException(status_code=r.status_code, detail=r.text)
-        merchant_data = r.json()
+    r = await clover_client.get(url, access_token=access_token)
+    if r.status_code >= 400:
+        raise HTTPException(status_code=r.status_code, detail=r.text)
+    merchant_data = r.json()
     print(merchant_data)
     # Extract only address-related fields
     address_data = {
@@ -363,39 +456,99 @@ async def get_merchant_address(
 @merchant_router.get("/properties")
 async def get_merchant_properties(
     merchant_id: str = Query(..., description="Clover merchant ID"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    access_token = MerchantHelper.get_merchant_token(db, merchant_id)
+    access_token = await MerchantHelper.get_merchant_token(db, merchant_id)
     if not access_token:
         raise HTTPException(status_code=404, detail="Merchant token not found. Add the merchant first.")
 
-    url = f"{CLOVER_BASE_URL}/v3/merchants/{merchant_id}/properties"
-    async with httpx.AsyncClient() as client:
-        r = await client.get(url, headers=_build_headers(access_token))
-        if r.status_code >= 400:
-            raise HTTPException(status_code=r.status_code, detail=r.text)
-        return r.json()
+    url = f"/v3/merchants/{merchant_id}/properties"
+    r = await clover_client.get(url, access_token=access_token)
+    if r.status_code >= 400:
+        raise HTTPException(status_code=r.status_code, detail=r.text)
+    return r.json()
+
+
+@router.get("/menu/{merchant_id}")
+async def get_full_menu(
+    request: Request,
+    merchant_id: str = Path(..., description="Clover merchant ID", pattern=SNAPSHOT_ID_PATTERN),
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    """
+    Items, categories, modifier groups (with modifiers) and stock in one
+    versioned document. The collections are fetched from Clover
+    concurrently and joined here, so the app needs a single round trip;
+    `version` changes only when the content does.
+
+    Served from a pre-encoded snapshot (see services.menu_snapshot);
+    Content-Location names the immutable URL of the version returned.
+    """
+    access_token = await MerchantHelper.get_merchant_token(db, merchant_id)
+    if not access_token:
+        raise HTTPException(status_code=404, detail="Merchant token not found. Add the merchant first.")
+
+    try:
+        snapshot = await menu_snapshots.current(merchant_id, access_token)
+    except httpx.HTTPStatusError as e:
+        raise HTTPException(status_code=e.response.status_code, detail=f"Clover API error: {e.response.text}")
+
+    location = request.url_for("get_menu_version", merchant_id=merchant_id, version=snapshot.version)
+    return menu_snapshots.respond(request, snapshot, headers={"Content-Location": location.path})
+
+
+@router.get("/menu/{merchant_id}/versions/{version}")
+async def get_menu_version(
+    request: Request,
+    merchant_id: str = Path(..., description="Clover merchant ID", pattern=SNAPSHOT_ID_PATTERN),
+    version: str = Path(..., description="Menu version, as returned in the menu's `version`"),
+):
+    """One version of a merchant's menu; its content never changes, so it may be cached indefinitely"""
+    snapshot = menu_snapshots.version(merchant_id, version)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail=f"Menu version {version} not found")
+    return menu_snapshots.respond(request, snapshot, cache_control=MENU_SNAPSHOT_IMMUTABLE_CACHE_CONTROL)
 
 
 @router.get("/item-stocks")
 async def get_item_stocks(
+    request: Request,
     merchant_id: str = Query(..., description="Clover merchant ID"),
     limit: int = Query(100, ge=1, le=1000),
     offset: int = Query(0, ge=0),
     item_id: str | None = Query(None, description="Optional Clover item ID to filter"),
-    db: Session = Depends(get_db),
+    fetch_all: bool = Query(False, alias="all", description="Fetch every page and stream the merged collection"),
+    stream_format: str = Query("ndjson", alias="format", pattern=STREAM_FORMAT_PATTERN, description="Stream format when all=true"),
+    db: AsyncSession = Depends(get_async_read_db),
 ):
-    access_token = MerchantHelper.get_merchant_token(db, merchant_id)
+    access_token = await MerchantHelper.get_merchant_token(db, merchant_id)
     if not access_token:
         raise HTTPException(status_code=404, detail="Merchant token not found. Add the merchant first.")
 
-    url = f"{CLOVER_BASE_URL}/v3/merchants/{merchant_id}/item_stocks"
-    params = {"limit": limit, "offset": offset}
-    if item_id:
-        params["itemId"] = item_id
+    if fetch_all:
+        return await _stream_collection(
+            merchant_id, access_token, "item_stocks", {"itemId": item_id} if item_id else None, stream_format
+        )
 
-    async with httpx.AsyncClient() as client:
-        r = await client.get(url, headers=_build_headers(access_token), params=params)
-        if r.status_code >= 400:
-            raise HTTPException(status_code=r.status_code, detail=r.text)
-        return r.json()
\ No newline at end of file
+    # Served from the in-memory stock snapshot; only its first load goes upstream
+    async def fetch():
+        try:
+            snapshot = await stock_snapshots.ensure(merchant_id, access_token)
+        except httpx.HTTPStatusError as e:
+            raise HTTPException(status_code=e.response.status_code, detail=e.response.text)
+        if item_id:
+            stock = snapshot.by_item.get(item_id)
+            return {"elements": [stock] if stock else []}
+        return {"elements": snapshot.elements()[offset:offset + limit]}
+
+    return await response_cache.respond(request, "item_stocks", merchant_id, fetch)
+
+@router.delete("/cache/{merchant_id}")
+async def invalidate_merchant_cache(merchant_id: str = Path(..., description="Clover merchant ID")):
+    """Drop every cached catalog response for a merchant"""
+    menu_snapshots.invalidate(merchant_id)
+    return {
+        "success": True,
+        "merchant_id": merchant_id,
+        "invalidated": response_cache.invalidate_merchant(merchant_id)
+    }
\ No newline at end of file
@@ -0,0 +1,107 @@
+# app/routes/clover_webhooks.py
+import asyncio
+
+from fastapi import APIRouter, BackgroundTasks, Depends, Header, HTTPException, Query, Request
+from sqlalchemy.orm import Session
+from pydantic import BaseModel
+from typing import List, Optional
+
+from database.database import get_db
+from helpers.webhook_helper import WebhookHelper
+from services.catalog_sync import run_in_session
+from services.clover_webhooks import CloverWebhookService, parse_clover_webhook, verify_clover_auth
+
+router = APIRouter(prefix="/clover/webhooks", tags=["Clover Webhooks"])
+
+
+def require_clover_auth(x_clover_auth: Optional[str] = Header(None)) -> None:
+    """The event log routes take the same X-Clover-Auth code as the webhook itself"""
+    if not verify_clover_auth(x_clover_auth):
+        raise HTTPException(status_code=401, detail="Invalid Clover webhook auth code")
+
+
+class ReplayWebhooksRequest(BaseModel):
+    event_ids: Optional[List[int]] = None
+    merchant_id: Optional[str] = None
+    since_id: Optional[int] = None
+    only_failed: bool = False
+    limit: int = 500
+
+
+@router.post("")
+async def receive_clover_webhook(
+    request: Request,
+    background_tasks: BackgroundTasks,
+):
+    """
+    Receive Clover inventory, order and merchant change notifications.
+    Events are logged first and applied after the response is sent, so
+    Clover gets its 200 quickly.
+    """
+    try:
+        payload = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Webhook body must be JSON")
+    if not isinstance(payload, dict):
+        raise HTTPException(status_code=400, detail="Webhook body must be a JSON object")
+
+    # Sent once when the webhook URL is configured in the Clover dashboard
+    if "verificationCode" in payload:
+        print(f"Clover webhook verification code: {payload['verificationCode']}")
+        return {"success": True, "message": "Verification code received"}
+
+    if not verify_clover_auth(request.headers.get("X-Clover-Auth")):
+        raise HTTPException(status_code=401, detail="Invalid Clover webhook auth code")
+
+    events = parse_clover_webhook(payload)
+    # The log is written with the sync session, off the event loop
+    event_ids = await asyncio.to_thread(run_in_session, WebhookHelper.log_events, events)
+    if event_ids:
+        background_tasks.add_task(CloverWebhookService.process_events, event_ids)
+
+    return {
+        "success": True,
+        "received": len(events),
+        "logged": len(event_ids)
+    }
+
+
+@router.get("/events", dependencies=[Depends(require_clover_auth)])
+def list_clover_webhook_events(
+    merchant_id: Optional[str] = Query(None, description="Clover merchant ID"),
+    since_id: Optional[int] = Query(None, description="Only events logged after this ID"),
+    only_failed: bool = Query(False),
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db),
+):
+    """Browse the webhook event log"""
+    events = WebhookHelper.list_events(db, merchant_id, since_id, only_failed, limit)
+    return {
+        "success": True,
+        "events": [WebhookHelper.to_dict(event) for event in events]
+    }
+
+
+@router.post("/replay", dependencies=[Depends(require_clover_auth)])
+async def replay_clover_webhook_events(request: ReplayWebhooksRequest):
+    """
+    Apply logged events again, either by ID or by filter. Useful after a
+    failure and for exercising invalidation locally without Clover.
+    """
+    if request.event_ids:
+        event_ids = request.event_ids
+    else:
+        events = await asyncio.to_thread(
+            run_in_session, WebhookHelper.list_events,
+            request.merchant_id, request.since_id, request.only_failed, request.limit
+        )
+        event_ids = [event.id for event in events]
+
+    results = await CloverWebhookService.process_events(event_ids)
+
+    return {
+        "success": True,
+        "replayed": len(results),
+        "failed": sum(1 for error in results.values() if error),
+        "results": [{"id": event_id, "error": error} for event_id, error in results.items()]
+    }
@@ -0,0 +1,46 @@
+# app/routes/fake_clover_oauth.py
+import os
+import secrets
+import time
+from typing import Optional, Set
+
+from fastapi import APIRouter, Form, HTTPException
+
+# Local stand-in for Clover's token endpoint, for exercising token refresh
+# without a sandbox app. Mounted only when FAKE_CLOVER_OAUTH_ENABLED is set;
+# point CLOVER_TOKEN_URL at http://localhost:8000/dev/clover/oauth/token.
+FAKE_CLOVER_OAUTH_ENABLED = os.getenv("FAKE_CLOVER_OAUTH_ENABLED", "false").lower() in ("1", "true", "yes", "on")
+FAKE_ACCESS_TOKEN_TTL_SECONDS = int(os.getenv("FAKE_ACCESS_TOKEN_TTL_SECONDS", "3600"))
+FAKE_REFRESH_TOKEN_TTL_SECONDS = int(os.getenv("FAKE_REFRESH_TOKEN_TTL_SECONDS", "2592000"))
+
+router = APIRouter(prefix="/dev/clover/oauth", tags=["Dev"])
+
+# Like Clover, a refresh token can be exchanged only once
+_used_refresh_tokens: Set[str] = set()
+
+
+@router.post("/token")
+async def fake_token(
+    grant_type: str = Form(...),
+    refresh_token: Optional[str] = Form(None),
+    code: Optional[str] = Form(None),
+    client_id: Optional[str] = Form(None)
+):
+    """Issue a new access/refresh token pair for an authorization code or an unused refresh token"""
+    if grant_type == "refresh_token":
+        if not refresh_token or refresh_token in _used_refresh_tokens:
+            raise HTTPException(status_code=400, detail="invalid_grant")
+        _used_refresh_tokens.add(refresh_token)
+    elif grant_type == "authorization_code":
+        if not code:
+            raise HTTPException(status_code=400, detail="invalid_request")
+    else:
+        raise HTTPException(status_code=400, detail="unsupported_grant_type")
+
+    now = int(time.time())
+    return {
+        "access_token": f"fake-access-{secrets.token_hex(8)}",
+        "refresh_token": f"fake-refresh-{secrets.token_hex(8)}",
+        "access_token_expiration": now + FAKE_ACCESS_TOKEN_TTL_SECONDS,
+        "refresh_token_expiration": now + FAKE_REFRESH_TOKEN_TTL_SECONDS
+    }
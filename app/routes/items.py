@@ -1,14 +1,17 @@
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import List
 
-from database.database import get_db
+from database.database import get_async_db, get_read_db
 from dependencies import get_clover_token
 from services.clover_api import get_clover_merchant_details, get_clover_item_details
 from app.schemas.item import ItemDetailRequest, ItemDetailResponse
 
 from models.merchant import Merchant as MerchantModel # Add this import
-from models.merchant_token import MerchantToken # Add this import
+from models.merchant_detail import MerchantDetail
+from helpers.catalog_helper import CatalogHelper
+from helpers.merchant_helper import MerchantHelper
 import asyncio
 
 router = APIRouter(
@@ -19,36 +22,41 @@ router = APIRouter(
 @router.post("/details", response_model=ItemDetailResponse)
 async def get_item_details_from_clover(
     request: ItemDetailRequest,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db),
+    token_db: AsyncSession = Depends(get_async_db)
 ):
     """
     Fetches the name of a merchant and the variations of a specific item
     directly from the Clover API.
     """
-    # CORRECTED LOGIC TO FIND TOKEN
-    # First, find the merchant in your DB using the Clover ID to get the internal ID
-    merchant = db.query(MerchantModel).filter(MerchantModel.clover_merchant_id == request.merchant_id).first()
-    
-    # If the merchant doesn't exist in your database, you can't get a token
-    if not merchant:
+    # Token comes from the merchant token cache; only a miss touches the database
+    access_token = await MerchantHelper.get_merchant_token(token_db, request.merchant_id)
+    if not access_token:
         raise HTTPException(
             status_code=404,
-            detail=f"Merchant with Clover ID {request.merchant_id} not found in our system."
-        )
-
-    # Now, use the internal merchant.id to find the latest token
-    token_record = db.query(MerchantToken)\
-        .filter(MerchantToken.merchant_id == merchant.id)\
-        .order_by(MerchantToken.created_at.desc())\
-        .first()
-
-    if not token_record or not token_record.token:
-        raise HTTPException(
-            status_code=404, # Changed to 404 to match the error you're seeing
             detail=f"No valid Clover API token found for merchant ID: {request.merchant_id}"
         )
-    
-    access_token = token_record.token
+
+    # Serve from the local catalog mirror when the item is there
+    mirrored_item = CatalogHelper.get_item(db, request.merchant_id, request.item_id)
+    if mirrored_item:
+        detail = db.query(MerchantDetail).filter(
+            MerchantDetail.clover_merchant_id == request.merchant_id
+        ).first()
+        merchant_name = detail.name if detail else None
+        if not merchant_name:
+            merchant = db.query(MerchantModel).filter(
+                MerchantModel.clover_merchant_id == request.merchant_id
+            ).first()
+            merchant_name = merchant.name if merchant else None
+        if merchant_name:
+            return ItemDetailResponse(
+                merchant_id=request.merchant_id,
+                merchant_name=merchant_name,
+                item_id=request.item_id,
+                item_name=mirrored_item.name or 'Unknown Item',
+                types=[v.name or 'Unnamed Variation' for v in mirrored_item.variants] or ["Standard"]
+            )
 
     # Fetch merchant and item details concurrently to save time
     try:
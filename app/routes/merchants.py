@@ -1,20 +1,25 @@
 # app/routes/merchants.py
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 from typing import List, Optional
-from sqlalchemy.orm import Session
 from pydantic import BaseModel
+import asyncio
 import os
 import httpx
 from dotenv import load_dotenv
 
+from database.database import AsyncReadSessionLocal
+from helpers.catalog_helper import CatalogHelper
 from services.clover_api import get_clover_items, get_clover_categories
-from schemas.category import Category, Variation as SchemaVariation, CloverItem # Assuming schemas/category.py exists
+from services.catalog_sync import catalog_sync_worker
+from services.clover_client import clover_client
+from services.response_cache import response_cache
+from services.category_menu import CategoryTree, category_menu_cache
+from schemas.category import Category # Assuming schemas/category.py exists
 
 load_dotenv()
 
 router = APIRouter()
 
-CLOVER_BASE_URL = os.getenv("CLOVER_BASE_URL", "https://apisandbox.dev.clover.com")
 CLOVER_ACCESS_TOKEN = os.getenv("CLOVER_ACCESS_TOKEN")
 CLOVER_MERCHANT_ID = os.getenv("CLOVER_MERCHANT_ID")
 
@@ -47,6 +52,7 @@ class MerchantInfo(BaseModel):
 # --- NEW ENDPOINT TO FETCH ITEMS ---
 @router.get("/merchants/{merchant_id}/items", response_model=MerchantItemsResponse)
 async def get_merchant_items_from_clover(
+    request: Request,
     merchant_id: str  # The Clover Merchant ID from the URL
 ):
     """
@@ -56,6 +62,10 @@ async def get_merchant_items_from_clover(
     if not CLOVER_ACCESS_TOKEN:
         raise HTTPException(status_code=500, detail="Clover access token not configured.")
 
+    return await response_cache.respond(request, "items", merchant_id, lambda: _merchant_items(merchant_id))
+
+
+async def _merchant_items(merchant_id: str) -> MerchantItemsResponse:
     try:
         # Call the Clover API to get items with variants expanded
         clover_items_data = await get_clover_items(merchant_id, CLOVER_ACCESS_TOKEN)
@@ -104,115 +114,88 @@ async def list_all_merchants():
             detail="Clover credentials not configured in .env file."
         )
 
-    url = f"{CLOVER_BASE_URL}/v3/merchants/{CLOVER_MERCHANT_ID}"
-    headers = {
-        "Authorization": f"Bearer {CLOVER_ACCESS_TOKEN}",
-        "Content-Type": "application/json"
-    }
-
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(url, headers=headers)
-            response.raise_for_status()
-            merchant_data = response.json()
-
-            merchant_info = MerchantInfo(
-                clover_merchant_id=merchant_data.get("id"),
-                name=merchant_data.get("name")
-            )
+    url = f"/v3/merchants/{CLOVER_MERCHANT_ID}"
 
-            return [merchant_info]
+    try:
+        response = await clover_client.get(url, access_token=CLOVER_ACCESS_TOKEN)
+        response.raise_for_status()
+        merchant_data = response.json()
 
-        except httpx.HTTPStatusError as e:
-            if e.response.status_code == 401:
-                raise HTTPException(status_code=401, detail="Unauthorized: Please check your CLOVER_ACCESS_TOKEN.")
-            raise HTTPException(
-                status_code=e.response.status_code,
-                detail=f"Clover API error: {e.response.text}"
-            )
-        except Exception as e:
-            raise HTTPException(
-                status_code=500,
-                detail=f"An unexpected error occurred: {str(e)}"
-            )
+        merchant_info = MerchantInfo(
+            clover_merchant_id=merchant_data.get("id"),
+            name=merchant_data.get("name")
+        )
+
+        return [merchant_info]
+
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code == 401:
+            raise HTTPException(status_code=401, detail="Unauthorized: Please check your CLOVER_ACCESS_TOKEN.")
+        raise HTTPException(
+            status_code=e.response.status_code,
+            detail=f"Clover API error: {e.response.text}"
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"An unexpected error occurred: {str(e)}"
+        )
 
 # Endpoint to get categories and variations from Clover
 @router.get("/merchants/{merchant_id}/categories", response_model=List[Category])
 async def get_merchant_categories_from_clover(
-    merchant_id: str # The Clover Merchant ID from the URL
+    request: Request,
+    merchant_id: str, # The Clover Merchant ID from the URL
 ):
     """
-    Retrieves all categories and their variations for a specific merchant
-    by fetching data directly from the Clover API.
+    Retrieves all categories and their variations for a specific merchant.
+    Served from the local catalog mirror once it has been synced, otherwise
+    fetched directly from the Clover API.
     """
+    return await response_cache.respond(
+        request, "categories", merchant_id, lambda: _merchant_categories(merchant_id)
+    )
+
+
+def _mirror_synced(db, merchant_id: str) -> bool:
+    return CatalogHelper.is_synced(db, merchant_id, "items") and CatalogHelper.is_synced(db, merchant_id, "categories")
+
+
+async def _merchant_categories(merchant_id: str) -> List[Category]:
+    # The build is shared by concurrent requests, so it must not use any one request's session
+    tree = await category_menu_cache.get(merchant_id, lambda: _build_category_tree(merchant_id))
+    return tree.menu()
+
+
+async def _build_category_tree(merchant_id: str) -> CategoryTree:
+    async with AsyncReadSessionLocal() as db:
+        if await db.run_sync(_mirror_synced, merchant_id):
+            return await db.run_sync(CatalogHelper.get_category_tree, merchant_id)
+
     if not CLOVER_ACCESS_TOKEN:
         raise HTTPException(status_code=500, detail="Clover access token not configured.")
 
+    # Mirror not populated yet: answer live and start filling it
+    catalog_sync_worker.trigger(merchant_id, CLOVER_ACCESS_TOKEN)
+
     try:
-        # Call the Clover API with the correct Clover Merchant ID.
-        clover_categories_data = await get_clover_categories(merchant_id, CLOVER_ACCESS_TOKEN)
-        clover_items_data = await get_clover_items(merchant_id, CLOVER_ACCESS_TOKEN)
+        # Call the Clover API with the correct Clover Merchant ID; both collections at once
+        clover_categories_data, clover_items_data = await asyncio.gather(
+            get_clover_categories(merchant_id, CLOVER_ACCESS_TOKEN),
+            get_clover_items(merchant_id, CLOVER_ACCESS_TOKEN)
+        )
+
+        # Group items under their categories in one pass over the raw items
+        return CategoryTree.from_clover(
+            clover_categories_data.get('elements', []),
+            clover_items_data.get('elements', [])
+        )
 
-        # Process the data
-        categories_map = {
-            cat['id']: Category(id=cat['id'], name=cat['name'], variations=[])
-            for cat in clover_categories_data.get('elements', [])
-        }
-        
-        # Create a default category for uncategorized items
-        uncategorized = Category(id="uncategorized", name="Uncategorized", variations=[])
-        
-        for item_data in clover_items_data.get('elements', []):
-            item = CloverItem(**item_data)
-            
-            # Check if the item has categories
-            if item.categories and item.categories.get('elements'):
-                for category_ref in item.categories['elements']:
-                    category_id = category_ref['id']
-                    if category_id in categories_map:
-                        if item.variants:
-                            for variant_data in item.variants:
-                                variation = SchemaVariation(
-                                    id=variant_data.id,
-                                    name=f"{item.name} ({variant_data.name})",
-                                    price=variant_data.price / 100.0
-                                )
-                                categories_map[category_id].variations.append(variation)
-                        else:
-                            variation = SchemaVariation(
-                                id=item.id,
-                                name=item.name,
-                                price=item.price / 100.0
-                            )
-                            categories_map[category_id].variations.append(variation)
-            else:
-                # If the item has no categories, add it to the "Uncategorized" list
-                if item.variants:
-                    for variant_data in item.variants:
-                        variation = SchemaVariation(
-                            id=variant_data.id,
-                            name=f"{item.name} ({variant_data.name})",
-                            price=variant_data.price / 100.0
-                        )
-                        uncategorized.variations.append(variation)
-                else:
-                    variation = SchemaVariation(
-                        id=item.id,
-                        name=item.name,
-                        price=item.price / 100.0
-                    )
-                    uncategorized.variations.append(variation)
-
-        # Combine the categorized and uncategorized items
-        final_categories = list(categories_map.values())
-        if uncategorized.variations:
-            final_categories.append(uncategorized)
-            
-        return final_categories
-        
     except httpx.HTTPStatusError as e:
         if e.response.status_code == 401:
             raise HTTPException(status_code=401, detail="Unauthorized: Please check your CLOVER_ACCESS_TOKEN.")
         raise HTTPException(status_code=e.response.status_code, detail=f"Clover API error: {e.response.text}")
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
@@ -0,0 +1,120 @@
+# app/routes/metrics.py
+from fastapi import APIRouter
+
+from database.database import pool_monitor
+from services.active_carts import active_carts
+from services.cart_events import cart_events
+from services.cart_expiry import cart_expiry_sweeper
+from services.cart_totals import cart_totals_verifier
+from services.category_menu import category_menu_cache
+from services.clover_client import clover_client
+from services.clover_scheduler import clover_scheduler
+from services.menu_snapshot import menu_snapshots
+from services.response_cache import response_cache
+from services.stock_snapshot import stock_snapshots
+from services.token_cache import merchant_token_cache
+from services.token_refresh import token_refresh_manager
+
+router = APIRouter(prefix="/metrics", tags=["Metrics"])
+
+
+@router.get("/clover-scheduler")
+async def get_clover_scheduler_metrics():
+    """Per-merchant Clover queue depths, throttling state and queue wait times"""
+    return {
+        "success": True,
+        "scheduler": clover_scheduler.metrics()
+    }
+
+
+@router.get("/clover-coalescing")
+async def get_clover_coalescing_metrics():
+    """How many Clover GETs were served by sharing an identical in-flight request"""
+    return {
+        "success": True,
+        "singleflight": clover_client.singleflight.metrics()
+    }
+
+
+@router.get("/response-cache")
+async def get_response_cache_metrics():
+    """Catalog response cache size, hit ratio, evictions and 304s served, plus category tree builds"""
+    return {
+        "success": True,
+        "response_cache": response_cache.metrics(),
+        "category_menu": category_menu_cache.metrics()
+    }
+
+
+@router.get("/db-pool")
+async def get_db_pool_metrics():
+    """Connection pool usage per engine: checked out vs capacity, peaks and saturated checkouts"""
+    return {
+        "success": True,
+        "pools": pool_monitor.metrics()
+    }
+
+
+@router.get("/merchant-tokens")
+async def get_merchant_token_cache_metrics():
+    """Merchant token cache size, hit ratio, invalidations and coalesced database lookups"""
+    return {
+        "success": True,
+        "merchant_token_cache": merchant_token_cache.metrics(),
+        "token_refresh": token_refresh_manager.metrics(),
+        "unauthorized_retries": clover_client.unauthorized_retries
+    }
+
+
+@router.get("/stock-snapshots")
+async def get_stock_snapshot_metrics():
+    """Merchants and items held in the stock snapshot, polls and changes seen"""
+    return {
+        "success": True,
+        "stock_snapshots": stock_snapshots.metrics()
+    }
+
+
+@router.get("/menu-snapshots")
+async def get_menu_snapshot_metrics():
+    """Menu snapshots mapped by this worker, hits, stale serves and builds"""
+    return {
+        "success": True,
+        "menu_snapshots": menu_snapshots.metrics()
+    }
+
+
+@router.get("/cart-totals")
+async def get_cart_totals_metrics():
+    """Background cart total verification passes and carts found drifted"""
+    return {
+        "success": True,
+        "cart_totals": cart_totals_verifier.metrics()
+    }
+
+
+@router.get("/active-carts")
+async def get_active_cart_metrics():
+    """Carts held in the cart store, how many have unsaved edits, and flush activity"""
+    return {
+        "success": True,
+        "active_carts": await active_carts.metrics()
+    }
+
+
+@router.get("/cart-expiry")
+async def get_cart_expiry_metrics():
+    """Carts abandoned and purged by the expiry sweep, and how fast the last pass went"""
+    return {
+        "success": True,
+        "cart_expiry": cart_expiry_sweeper.metrics()
+    }
+
+
+@router.get("/cart-events")
+async def get_cart_event_metrics():
+    """Open cart event streams and events published, delivered and collapsed into resyncs"""
+    return {
+        "success": True,
+        "cart_events": cart_events.metrics()
+    }
@@ -1,8 +1,9 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
 from typing import Optional, List
-from database.database import get_db
+from database.database import get_async_db, get_async_read_db
 from models.question_model import QuestionMaster, QuestionTranslation
 
 router = APIRouter(prefix="/api/v1/questions", tags=["question-master"])
@@ -60,14 +61,15 @@ class QuestionWithTranslationsResponse(BaseModel):
 @router.post("/", response_model=QuestionResponse)
 async def create_question(
     question_data: QuestionCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Create a new question (English only)"""
     try:
         # Check if question_key already exists
-        existing = db.query(QuestionMaster).filter(
-            QuestionMaster.question_key == question_data.question_key
-        ).first()
+        result = await db.execute(
+            select(QuestionMaster).where(QuestionMaster.question_key == question_data.question_key)
+        )
+        existing = result.scalars().first()
 
         if existing:
             raise HTTPException(
@@ -85,8 +87,8 @@ async def create_question(
         )
 
         db.add(question)
-        db.commit()
-        db.refresh(question)
+        await db.commit()
+        await db.refresh(question)
 
         return QuestionResponse(
             id=question.id,
@@ -100,7 +102,7 @@ async def create_question(
         )
 
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to create question: {str(e)}")
 
 
@@ -108,18 +110,18 @@ async def create_question(
 async def get_all_questions(
     type: Optional[str] = None,
     active_only: bool = True,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """Get all questions (English only)"""
-    query = db.query(QuestionMaster)
+    query = select(QuestionMaster)
 
     if type:
-        query = query.filter(QuestionMaster.type == type)
+        query = query.where(QuestionMaster.type == type)
 
     if active_only:
-        query = query.filter(QuestionMaster.is_active == True)
+        query = query.where(QuestionMaster.is_active == True)
 
-    questions = query.order_by(QuestionMaster.question_order).all()
+    questions = (await db.execute(query.order_by(QuestionMaster.question_order))).scalars().all()
 
     return [
         QuestionResponse(
@@ -136,9 +138,12 @@ async def get_all_questions(
 
 
 @router.get("/{question_id}", response_model=QuestionResponse)
-async def get_question(question_id: int, db: Session = Depends(get_db)):
+async def get_question(question_id: int, db: AsyncSession = Depends(get_async_read_db)):
     """Get question by ID"""
-    question = db.query(QuestionMaster).filter(QuestionMaster.id == question_id).first()
+    result = await db.execute(
+        select(QuestionMaster).where(QuestionMaster.id == question_id)
+    )
+    question = result.scalars().first()
 
     if not question:
         raise HTTPException(status_code=404, detail="Question not found")
@@ -159,10 +164,13 @@ async def get_question(question_id: int, db: Session = Depends(get_db)):
 async def update_question(
     question_id: int,
     question_data: QuestionUpdate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update question"""
-    question = db.query(QuestionMaster).filter(QuestionMaster.id == question_id).first()
+    result = await db.execute(
+        select(QuestionMaster).where(QuestionMaster.id == question_id)
+    )
+    question = result.scalars().first()
 
     if not question:
         raise HTTPException(status_code=404, detail="Question not found")
@@ -173,8 +181,8 @@ async def update_question(
         for field, value in update_data.items():
             setattr(question, field, value)
 
-        db.commit()
-        db.refresh(question)
+        await db.commit()
+        await db.refresh(question)
 
         return QuestionResponse(
             id=question.id,
@@ -188,14 +196,17 @@ async def update_question(
         )
 
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to update question: {str(e)}")
 
 
 @router.delete("/{question_id}")
-async def delete_question(question_id: int, db: Session = Depends(get_db)):
+async def delete_question(question_id: int, db: AsyncSession = Depends(get_async_db)):
     """Delete question (soft delete by setting is_active=False)"""
-    question = db.query(QuestionMaster).filter(QuestionMaster.id == question_id).first()
+    result = await db.execute(
+        select(QuestionMaster).where(QuestionMaster.id == question_id)
+    )
+    question = result.scalars().first()
 
     if not question:
         raise HTTPException(status_code=404, detail="Question not found")
@@ -203,12 +214,12 @@ async def delete_question(question_id: int, db: Session = Depends(get_db)):
     try:
         # Soft delete
         question.is_active = False
-        db.commit()
+        await db.commit()
 
         return {"success": True, "message": f"Question '{question.question_key}' deactivated successfully"}
 
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to delete question: {str(e)}")
 
 
@@ -216,14 +227,15 @@ async def delete_question(question_id: int, db: Session = Depends(get_db)):
 @router.post("/translations", response_model=TranslationResponse)
 async def add_translation(
     translation_data: TranslationCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Add translation for a question"""
     try:
         # Check if question_key exists in question_masters
-        question_exists = db.query(QuestionMaster).filter(
-            QuestionMaster.question_key == translation_data.question_key
-        ).first()
+        result = await db.execute(
+            select(QuestionMaster).where(QuestionMaster.question_key == translation_data.question_key)
+        )
+        question_exists = result.scalars().first()
 
         if not question_exists:
             raise HTTPException(
@@ -232,10 +244,13 @@ async def add_translation(
             )
 
         # Check if translation already exists
-        existing_translation = db.query(QuestionTranslation).filter(
-            QuestionTranslation.question_key == translation_data.question_key,
-            QuestionTranslation.language == translation_data.language
-        ).first()
+        result = await db.execute(
+            select(QuestionTranslation).where(
+                QuestionTranslation.question_key == translation_data.question_key,
+                QuestionTranslation.language == translation_data.language
+            )
+        )
+        existing_translation = result.scalars().first()
 
         if existing_translation:
             raise HTTPException(
@@ -252,8 +267,8 @@ async def add_translation(
         )
 
         db.add(translation)
-        db.commit()
-        db.refresh(translation)
+        await db.commit()
+        await db.refresh(translation)
 
         return TranslationResponse(
             id=translation.id,
@@ -264,7 +279,7 @@ async def add_translation(
         )
 
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to add translation: {str(e)}")
 
 
@@ -272,18 +287,18 @@ async def add_translation(
 async def get_all_translations(
     language: Optional[str] = None,
     question_key: Optional[str] = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """Get all translations with optional filtering"""
-    query = db.query(QuestionTranslation)
+    query = select(QuestionTranslation)
 
     if language:
-        query = query.filter(QuestionTranslation.language == language)
+        query = query.where(QuestionTranslation.language == language)
 
     if question_key:
-        query = query.filter(QuestionTranslation.question_key == question_key)
+        query = query.where(QuestionTranslation.question_key == question_key)
 
-    translations = query.all()
+    translations = (await db.execute(query)).scalars().all()
 
     return [
         TranslationResponse(
@@ -297,11 +312,12 @@ async def get_all_translations(
 
 
 @router.get("/translations/{translation_id}", response_model=TranslationResponse)
-async def get_translation(translation_id: int, db: Session = Depends(get_db)):
+async def get_translation(translation_id: int, db: AsyncSession = Depends(get_async_read_db)):
     """Get translation by ID"""
-    translation = db.query(QuestionTranslation).filter(
-        QuestionTranslation.id == translation_id
-    ).first()
+    result = await db.execute(
+        select(QuestionTranslation).where(QuestionTranslation.id == translation_id)
+    )
+    translation = result.scalars().first()
 
     if not translation:
         raise HTTPException(status_code=404, detail="Translation not found")
@@ -319,12 +335,13 @@ async def get_translation(translation_id: int, db: Session = Depends(get_db)):
 async def update_translation(
     translation_id: int,
     translation_data: TranslationUpdate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update translation"""
-    translation = db.query(QuestionTranslation).filter(
-        QuestionTranslation.id == translation_id
-    ).first()
+    result = await db.execute(
+        select(QuestionTranslation).where(QuestionTranslation.id == translation_id)
+    )
+    translation = result.scalars().first()
 
     if not translation:
         raise HTTPException(status_code=404, detail="Translation not found")
@@ -335,8 +352,8 @@ async def update_translation(
         for field, value in update_data.items():
             setattr(translation, field, value)
 
-        db.commit()
-        db.refresh(translation)
+        await db.commit()
+        await db.refresh(translation)
 
         return TranslationResponse(
             id=translation.id,
@@ -347,47 +364,50 @@ async def update_translation(
         )
 
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to update translation: {str(e)}")
 
 
 @router.delete("/translations/{translation_id}")
-async def delete_translation(translation_id: int, db: Session = Depends(get_db)):
+async def delete_translation(translation_id: int, db: AsyncSession = Depends(get_async_db)):
     """Delete translation"""
-    translation = db.query(QuestionTranslation).filter(
-        QuestionTranslation.id == translation_id
-    ).first()
+    result = await db.execute(
+        select(QuestionTranslation).where(QuestionTranslation.id == translation_id)
+    )
+    translation = result.scalars().first()
 
     if not translation:
         raise HTTPException(status_code=404, detail="Translation not found")
 
     try:
-        db.delete(translation)
-        db.commit()
+        await db.delete(translation)
+        await db.commit()
 
         return {"success": True, "message": "Translation deleted successfully"}
 
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to delete translation: {str(e)}")
 
 
 # Combined Operations
 @router.get("/{question_key}/with-translations", response_model=QuestionWithTranslationsResponse)
-async def get_question_with_translations(question_key: str, db: Session = Depends(get_db)):
+async def get_question_with_translations(question_key: str, db: AsyncSession = Depends(get_async_read_db)):
     """Get question with all its translations"""
     # Get the main question
-    question = db.query(QuestionMaster).filter(
-        QuestionMaster.question_key == question_key
-    ).first()
+    result = await db.execute(
+        select(QuestionMaster).where(QuestionMaster.question_key == question_key)
+    )
+    question = result.scalars().first()
 
     if not question:
         raise HTTPException(status_code=404, detail="Question not found")
 
     # Get all translations
-    translations = db.query(QuestionTranslation).filter(
-        QuestionTranslation.question_key == question_key
-    ).all()
+    result = await db.execute(
+        select(QuestionTranslation).where(QuestionTranslation.question_key == question_key)
+    )
+    translations = result.scalars().all()
 
     question_response = QuestionResponse(
         id=question.id,
@@ -421,18 +441,27 @@ async def get_localized_questions(
     language: str = "en",
     type: Optional[str] = None,
     active_only: bool = True,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """Get questions in specified language (English from master, others from translations)"""
-    query = db.query(QuestionMaster)
+    query = select(QuestionMaster)
 
     if type:
-        query = query.filter(QuestionMaster.type == type)
+        query = query.where(QuestionMaster.type == type)
 
     if active_only:
-        query = query.filter(QuestionMaster.is_active == True)
+        query = query.where(QuestionMaster.is_active == True)
 
-    questions = query.order_by(QuestionMaster.question_order).all()
+    questions = (await db.execute(query.order_by(QuestionMaster.question_order))).scalars().all()
+
+    # One query for every translation in the language instead of one per question
+    translations = {}
+    if language != "en":
+        rows = await db.execute(
+            select(QuestionTranslation).where(QuestionTranslation.language == language)
+        )
+        for t in rows.scalars().all():
+            translations.setdefault(t.question_key, t)
 
     result = []
     for question in questions:
@@ -448,10 +477,7 @@ async def get_localized_questions(
             })
         else:
             # Look for translation
-            translation = db.query(QuestionTranslation).filter(
-                QuestionTranslation.question_key == question.question_key,
-                QuestionTranslation.language == language
-            ).first()
+            translation = translations.get(question.question_key)
 
             if translation:
                 result.append({
@@ -478,9 +504,9 @@ async def get_localized_questions(
 
 
 @router.get("/languages/available")
-async def get_available_languages(db: Session = Depends(get_db)):
+async def get_available_languages(db: AsyncSession = Depends(get_async_read_db)):
     """Get all available languages"""
-    languages = db.query(QuestionTranslation.language).distinct().all()
+    languages = (await db.execute(select(QuestionTranslation.language).distinct())).all()
 
     # Always include English
     available_languages = ["en"]
@@ -493,7 +519,7 @@ async def get_available_languages(db: Session = Depends(get_db)):
 
 
 @router.post("/bulk-create")
-async def create_default_questions(db: Session = Depends(get_db)):
+async def create_default_questions(db: AsyncSession = Depends(get_async_db)):
     """Create default food ordering questions"""
     default_questions = [
         {
@@ -532,16 +558,17 @@ async def create_default_questions(db: Session = Depends(get_db)):
         created_questions = []
         for q_data in default_questions:
             # Check if exists
-            existing = db.query(QuestionMaster).filter(
-                QuestionMaster.question_key == q_data["question_key"]
-            ).first()
+            result = await db.execute(
+                select(QuestionMaster).where(QuestionMaster.question_key == q_data["question_key"])
+            )
+            existing = result.scalars().first()
 
             if not existing:
                 question = QuestionMaster(**q_data, is_active=True)
                 db.add(question)
                 created_questions.append(q_data["question_key"])
 
-        db.commit()
+        await db.commit()
         return {
             "success": True,
             "message": f"Created {len(created_questions)} default questions",
@@ -549,14 +576,14 @@ async def create_default_questions(db: Session = Depends(get_db)):
         }
 
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to create default questions: {str(e)}")
 
 
 @router.post("/translations/bulk-add")
 async def bulk_add_translations(
     translations: List[TranslationCreate],
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Bulk add translations"""
     try:
@@ -565,9 +592,10 @@ async def bulk_add_translations(
 
         for translation_data in translations:
             # Check if question exists
-            question_exists = db.query(QuestionMaster).filter(
-                QuestionMaster.question_key == translation_data.question_key
-            ).first()
+            result = await db.execute(
+                select(QuestionMaster).where(QuestionMaster.question_key == translation_data.question_key)
+            )
+            question_exists = result.scalars().first()
 
             if not question_exists:
                 skipped_translations.append({
@@ -578,10 +606,13 @@ async def bulk_add_translations(
                 continue
 
             # Check if translation already exists
-            existing = db.query(QuestionTranslation).filter(
-                QuestionTranslation.question_key == translation_data.question_key,
-                QuestionTranslation.language == translation_data.language
-            ).first()
+            result = await db.execute(
+                select(QuestionTranslation).where(
+                    QuestionTranslation.question_key == translation_data.question_key,
+                    QuestionTranslation.language == translation_data.language
+                )
+            )
+            existing = result.scalars().first()
 
             if existing:
                 skipped_translations.append({
@@ -605,7 +636,7 @@ async def bulk_add_translations(
                 "language": translation_data.language
             })
 
-        db.commit()
+        await db.commit()
         return {
             "success": True,
             "message": f"Added {len(added_translations)} translations, skipped {len(skipped_translations)}",
@@ -614,7 +645,7 @@ async def bulk_add_translations(
         }
 
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to bulk add translations: {str(e)}")
 
 
@@ -622,15 +653,15 @@ async def bulk_add_translations(
 async def get_questions_by_type(
     question_type: str,
     active_only: bool = True,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """Get questions by type"""
-    query = db.query(QuestionMaster).filter(QuestionMaster.type == question_type)
+    query = select(QuestionMaster).where(QuestionMaster.type == question_type)
 
     if active_only:
-        query = query.filter(QuestionMaster.is_active == True)
+        query = query.where(QuestionMaster.is_active == True)
 
-    questions = query.order_by(QuestionMaster.question_order).all()
+    questions = (await db.execute(query.order_by(QuestionMaster.question_order))).scalars().all()
 
     return [
         QuestionResponse(
@@ -647,12 +678,14 @@ async def get_questions_by_type(
 
 
 @router.get("/types/list")
-async def get_question_types(db: Session = Depends(get_db)):
+async def get_question_types(db: AsyncSession = Depends(get_async_read_db)):
     """Get all unique question types"""
-    types = db.query(QuestionMaster.type).filter(
-        QuestionMaster.type.isnot(None),
-        QuestionMaster.is_active == True
-    ).distinct().all()
+    types = (await db.execute(
+        select(QuestionMaster.type).where(
+            QuestionMaster.type.isnot(None),
+            QuestionMaster.is_active == True
+        ).distinct()
+    )).all()
 
     return {
         "success": True,
@@ -1,7 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
-from database.database import get_db
+from database.database import get_async_db, get_async_read_db
 from app.schemas.conversation import (
     SelectAnswerRequest,
     ConversationEntryResponse,
@@ -15,14 +15,14 @@ router = APIRouter()
 @router.post("/answer", response_model=ConversationEntryResponse)
 async def submit_select_answer(
     request: SelectAnswerRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Submit an answer using select mode
     """
 
     try:
-        result = ConversationService.process_select_answer(
+        result = await ConversationService.process_select_answer(
             db=db,
             session_id=request.session_id,
             user_id=request.user_id,
@@ -32,7 +32,7 @@ async def submit_select_answer(
         )
 
         # Add language information to the response
-        user_language = ConversationService.get_user_language(db, request.session_id)
+        user_language = await ConversationService.get_user_language(db, request.session_id)
 
         # Convert result to dict if it's a Pydantic model
         if hasattr(result, 'dict'):
@@ -57,12 +57,12 @@ async def submit_select_answer(
 @router.get("/question/{question_key}", response_model=QuestionResponse)
 async def get_question_details(
     question_key: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """
     Get question details with available answers for select mode
     """
-    question = get_question_with_answers(db, question_key)
+    question = await get_question_with_answers(db, question_key)
 
     if not question:
         raise HTTPException(
@@ -76,12 +76,12 @@ async def get_question_details(
 async def get_next_question(
     session_id: str,
     current_question_key: Optional[str] = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """
     Get the next question in the wizard flow
     """
-    next_question = ConversationService.get_next_question(
+    next_question = await ConversationService.get_next_question(
         db=db,
         session_id=session_id,
         current_question_key=current_question_key
@@ -1,7 +1,8 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional, Dict, Any
-from database.database import get_db
+from database.database import get_async_db, get_async_read_db
 from app.schemas.conversation import (
     VoiceAnswerRequest,
     QuestionResponse
@@ -14,14 +15,14 @@ router = APIRouter()
 @router.post("/answer", response_model=Dict[str, Any])
 async def submit_voice_answer(
     request: VoiceAnswerRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Submit an answer using voice mode
     The voice_text should be the transcribed text from user's voice input
     """
     try:
-        result = ConversationService.process_voice_answer(
+        result = await ConversationService.process_voice_answer(
             db=db,
             session_id=request.session_id,
             user_id=request.user_id,
@@ -45,13 +46,13 @@ async def submit_voice_answer(
 @router.get("/question/{question_key}", response_model=QuestionResponse)
 async def get_question_for_voice(
     question_key: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """
     Get question details with available answers for voice mode
     This helps in voice matching and UI display
     """
-    question = get_question_with_answers(db, question_key)
+    question = await get_question_with_answers(db, question_key)
 
     if not question:
         raise HTTPException(
@@ -65,7 +66,7 @@ async def get_question_for_voice(
 async def match_voice_to_answer(
     question_key: str,
     voice_text: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """
     Test endpoint to check voice matching without creating entry
@@ -73,7 +74,7 @@ async def match_voice_to_answer(
     """
     from helpers.voice_matcher import match_voice_to_answer
 
-    matched_answer_key = match_voice_to_answer(
+    matched_answer_key = await match_voice_to_answer(
         db=db,
         voice_text=voice_text,
         question_key=question_key
@@ -82,9 +83,10 @@ async def match_voice_to_answer(
     if matched_answer_key:
         # Get the matched answer details
         from models.conversation import AnswerMaster
-        answer = db.query(AnswerMaster).filter(
-            AnswerMaster.answer_key == matched_answer_key
-        ).first()
+        result = await db.execute(
+            select(AnswerMaster).where(AnswerMaster.answer_key == matched_answer_key)
+        )
+        answer = result.scalars().first()
 
         return {
             "matched": True,
@@ -104,12 +106,12 @@ async def match_voice_to_answer(
 async def get_next_question_voice(
     session_id: str,
     current_question_key: Optional[str] = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """
     Get the next question in the wizard flow for voice mode
     """
-    next_question = ConversationService.get_next_question(
+    next_question = await ConversationService.get_next_question(
         db=db,
         session_id=session_id,
         current_question_key=current_question_key
@@ -0,0 +1,102 @@
+# benchmarks/bench_cart_summaries.py
+"""
+Queries and time needed to serialize cart histories.
+
+Seeds an in-memory SQLite database with one customer whose orders came
+from N carts of M items with K modifiers each, then counts the SQL
+statements CartHelper.get_carts_by_customer and get_cart_summaries issue.
+Both must stay at one query for the carts plus one per selectinload batch
+of items and of modifiers, never one per row; the script exits non-zero
+if they do not.
+
+    python -m benchmarks.bench_cart_summaries [--items 5] [--modifiers 3]
+"""
+import argparse
+import asyncio
+import math
+import sys
+import time
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from database.base import Base
+from helpers.cart_helper import CartHelper
+from models.cart import Cart, CartItem, CartItemModifier, Order
+
+CART_COUNTS = (1, 10, 100, 1000)
+# selectinload puts at most this many parent ids in one IN (...)
+SELECTIN_BATCH = 500
+
+
+def query_budget(carts: int, items: int) -> int:
+    """The carts, then items and modifiers one selectinload batch at a time"""
+    return 1 + math.ceil(carts / SELECTIN_BATCH) + math.ceil(carts * items / SELECTIN_BATCH)
+
+
+async def seed(sessionmaker, carts: int, items: int, modifiers: int, customer_id: str):
+    async with sessionmaker() as db:
+        for c in range(carts):
+            cart = Cart(clover_merchant_id="BENCH", session_id=f"s{c}", status="converted", subtotal=0.0, total_amount=0.0)
+            for i in range(items):
+                item = CartItem(clover_item_id=f"I{i}", name=f"Item {i}", price=5.0, quantity=1, line_total=5.0)
+                item.modifiers = [
+                    CartItemModifier(clover_modifier_id=f"M{m}", clover_modifier_group_id="G", name=f"Mod {m}", price=0.5)
+                    for m in range(modifiers)
+                ]
+                cart.items.append(item)
+            db.add(cart)
+            await db.flush()
+            db.add(Order(
+                cart_id=cart.id, clover_merchant_id="BENCH", customer_id=customer_id,
+                customer_name="Bench", customer_phone="0", subtotal=0.0, total_amount=0.0,
+            ))
+        await db.commit()
+
+
+async def run(items: int, modifiers: int) -> bool:
+    ok = True
+    print(f"{'carts':>6} {'by_customer':>12} {'summaries':>10} {'budget':>9} {'ms':>8}")
+    for carts in CART_COUNTS:
+        engine = create_async_engine("sqlite+aiosqlite://")
+        statements = []
+        event.listen(engine.sync_engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+        async with engine.begin() as conn:
+            await conn.run_sync(lambda sync_conn: Base.metadata.create_all(
+                sync_conn, tables=[Cart.__table__, CartItem.__table__, CartItemModifier.__table__, Order.__table__]
+            ))
+        sessionmaker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        await seed(sessionmaker, carts, items, modifiers, "CUST")
+
+        async with sessionmaker() as db:
+            statements.clear()
+            start = time.perf_counter()
+            history = await CartHelper.get_carts_by_customer(db, "CUST")
+            elapsed = (time.perf_counter() - start) * 1000
+            by_customer = len(statements)
+
+            statements.clear()
+            summaries = await CartHelper.get_cart_summaries(db, [summary["cart_id"] for summary in history])
+            bulk = len(statements)
+
+        assert len(history) == len(summaries) == carts
+        budget = query_budget(carts, items)
+        print(f"{carts:>6} {by_customer:>12} {bulk:>10} {budget:>9} {elapsed:>8.1f}")
+        ok = ok and max(by_customer, bulk) <= budget
+        await engine.dispose()
+    return ok
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=5)
+    parser.add_argument("--modifiers", type=int, default=3)
+    args = parser.parse_args()
+
+    if not asyncio.run(run(args.items, args.modifiers)):
+        print("Cart summaries issued more queries than their selectinload batches account for")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
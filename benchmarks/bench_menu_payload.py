@@ -0,0 +1,120 @@
+# benchmarks/bench_menu_payload.py
+"""
+Serialization and bytes-on-wire for a synthetic 5k-item menu.
+
+Compares the stdlib path the app used before (jsonable_encoder + json.dumps)
+with utils.json_response.dumps, then the size and cost of gzip and brotli
+at the middleware's settings.
+
+    python -m benchmarks.bench_menu_payload [--items 5000] [--repeat 20]
+"""
+import argparse
+import json
+import random
+import time
+from typing import Any, Callable, Dict, List
+
+from fastapi.encoders import jsonable_encoder
+
+from services.category_menu import CategoryTree
+from services.menu_aggregate import join_menu
+from utils.compression import RESPONSE_BROTLI_QUALITY, RESPONSE_GZIP_LEVEL, brotli, compress_bytes
+from utils.json_response import dumps, orjson
+
+
+def synthetic_collections(item_count: int, seed: int = 7) -> Dict[str, List[Dict[str, Any]]]:
+    """Clover-shaped items, categories, modifier groups and stock"""
+    rng = random.Random(seed)
+    categories = [{"id": f"CAT{i:04d}", "name": f"Category {i}", "sortOrder": i} for i in range(60)]
+    groups = [
+        {
+            "id": f"MG{i:04d}",
+            "name": f"Modifier group {i}",
+            "minRequired": 0,
+            "maxAllowed": rng.randint(1, 5),
+            "modifiers": {"elements": [
+                {"id": f"MG{i:04d}M{j}", "name": f"Option {j}", "price": rng.choice([0, 50, 100, 150])}
+                for j in range(rng.randint(2, 8))
+            ]},
+        }
+        for i in range(120)
+    ]
+    items = []
+    for i in range(item_count):
+        item = {
+            "id": f"ITEM{i:06d}",
+            "name": f"Menu item number {i} with a realistic name",
+            "price": rng.randint(199, 2999),
+            "priceType": "FIXED",
+            "hidden": False,
+            "available": True,
+            "modifiedTime": 1_700_000_000_000 + i,
+            "categories": {"elements": [{"id": c["id"]} for c in rng.sample(categories, rng.randint(1, 2))]},
+            "modifierGroups": {"elements": [{"id": g["id"]} for g in rng.sample(groups, rng.randint(0, 3))]},
+        }
+        if rng.random() < 0.4:
+            item["variants"] = {"elements": [
+                {"id": f"ITEM{i:06d}V{s}", "name": size, "price": item["price"] + 100 * s}
+                for s, size in enumerate(("Small", "Medium", "Large"))
+            ]}
+        items.append(item)
+    stocks = [
+        {"item": {"id": item["id"]}, "quantity": rng.randint(0, 50), "modifiedTime": item["modifiedTime"]}
+        for item in items[::3]
+    ]
+    return {"items": items, "categories": categories, "modifier_groups": groups, "item_stocks": stocks}
+
+
+def best_of(fn: Callable[[], Any], repeat: int) -> float:
+    """Fastest of `repeat` runs, in milliseconds"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def stdlib_dumps(payload: Any) -> bytes:
+    return json.dumps(jsonable_encoder(payload), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def report(name: str, payload: Any, repeat: int) -> None:
+    old_ms = best_of(lambda: stdlib_dumps(payload), repeat)
+    new_ms = best_of(lambda: dumps(payload), repeat)
+    body = dumps(payload)
+
+    print(f"\n{name}")
+    print(f"  serialize  stdlib+jsonable_encoder {old_ms:8.2f} ms")
+    print(f"  serialize  {'orjson' if orjson else 'stdlib (orjson missing)':<23} {new_ms:8.2f} ms   ({old_ms / new_ms:.1f}x)")
+    print(f"  identity   {len(body):>10,} bytes")
+
+    encodings = [("gzip", RESPONSE_GZIP_LEVEL)]
+    if brotli is not None:
+        encodings.append(("br", RESPONSE_BROTLI_QUALITY))
+    for encoding, level in encodings:
+        compressed, _ = compress_bytes(body, encoding)
+        ms = best_of(lambda: compress_bytes(body, encoding), max(1, repeat // 4))
+        print(
+            f"  {encoding:<4}-{level:<5} {len(compressed):>10,} bytes  "
+            f"{100 * len(compressed) / len(body):5.1f}% of identity, {ms:7.2f} ms to compress"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    collections = synthetic_collections(args.items)
+    menu = join_menu("BENCHMERCHANT", collections)
+    categories = CategoryTree.from_clover(collections["categories"], collections["items"]).menu()
+
+    print(f"{args.items} items, {len(collections['modifier_groups'])} modifier groups, best of {args.repeat}")
+    report("/api/clover/menu/{merchant_id}", menu, args.repeat)
+    report("/api/merchants/{merchant_id}/categories", categories, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
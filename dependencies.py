@@ -1,9 +1,10 @@
 from fastapi import Depends, HTTPException, status, Path
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from database.database import get_db
+from database.database import get_db, get_async_db
+from helpers.merchant_helper import MerchantHelper
 from models.user import User
-from models.merchant_token import MerchantToken
 
 # import jwt
 from typing import Optional
@@ -77,20 +78,17 @@ def get_current_user_simple(db: Session = Depends(get_db)) -> User:
         )
     return user
 
-def get_clover_token(
+async def get_clover_token(
     merchant_id: str = Path(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> str:
     """
-    Dependency to fetch the latest Clover access token for a merchant from the database.
+    Dependency to fetch the Clover access token for a merchant, through the merchant token cache.
     """
-    token_record = db.query(MerchantToken).filter(
-        MerchantToken.merchant_id == merchant_id
-    ).order_by(MerchantToken.created_at.desc()).first()
-
-    if not token_record or not token_record.token:
+    token = await MerchantHelper.get_merchant_token(db, merchant_id)
+    if not token:
         raise HTTPException(
             status_code=404,
             detail=f"No valid Clover API token found for merchant ID: {merchant_id}"
         )
-    return token_record.token
+    return token
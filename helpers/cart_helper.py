@@ -1,19 +1,33 @@
 # helpers/cart_helper.py
-from sqlalchemy.orm import Session
-from sqlalchemy import text
-from datetime import datetime
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import raiseload, selectinload
+from sqlalchemy import delete, func, or_, select, text, update
+from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Any
-from models.cart import Cart, CartItem, CartItemModifier
+from models.cart import Cart, CartItem, CartItemModifier, Order, OrderSubmission
 import httpx
 import os
 
+# Totals are floats in currency units; differences below half a cent are rounding
+CART_TOTALS_TOLERANCE = 0.005
+# An active cart nobody changed for this long is abandoned by the expiry sweep
+CART_EXPIRY_SECONDS = float(os.getenv("CART_EXPIRY_SECONDS", "86400"))
+
+
+class CartVersionConflict(Exception):
+    """The cart changed since its version was read; nothing was written"""
+
+    def __init__(self, cart_id: int):
+        super().__init__(f"Cart {cart_id} was changed by another writer")
+        self.cart_id = cart_id
+
 
 class CartHelper:
     """Helper class for cart database operations"""
 
     @staticmethod
-    def create_cart(
-        db: Session,
+    async def create_cart(
+        db: AsyncSession,
         merchant_id: str,
         # customer_id: str = None,
         session_id: str = None
@@ -23,29 +37,77 @@ class CartHelper:
             clover_merchant_id=merchant_id,
             # customer_id=customer_id,
             session_id=session_id,
-            status="active"
+            status="active",
+            expires_at=CartHelper._expiry()
         )
         db.add(cart)
-        db.commit()
-        db.refresh(cart)
+        await db.commit()
+        await db.refresh(cart)
         return cart
 
     @staticmethod
-    def get_cart_by_id(db: Session, cart_id: int) -> Optional[Cart]:
-        """Get cart by ID with items and modifiers"""
-        return db.query(Cart).filter(Cart.id == cart_id).first()
+    async def get_cart_by_id(db: AsyncSession, cart_id: int) -> Optional[Cart]:
+        """Get cart by ID"""
+        result = await db.execute(select(Cart).where(Cart.id == cart_id))
+        return result.scalars().first()
 
     @staticmethod
-    def get_active_cart_by_session(db: Session, session_id: str) -> Optional[Cart]:
+    async def get_cart_with_items(db: AsyncSession, cart_id: int) -> Optional[Cart]:
+        """Get cart with its items and their modifiers loaded up front"""
+        result = await db.execute(
+            select(Cart)
+            .options(selectinload(Cart.items).selectinload(CartItem.modifiers))
+            .where(Cart.id == cart_id)
+            # Reload collections a previous statement in this session already loaded
+            .execution_options(populate_existing=True)
+        )
+        return result.scalars().first()
+
+    @staticmethod
+    async def get_order_submission(db: AsyncSession, cart_id: int) -> Optional[OrderSubmission]:
+        """Get the Clover order submission progress for a cart"""
+        result = await db.execute(select(OrderSubmission).where(OrderSubmission.cart_id == cart_id))
+        return result.scalars().first()
+
+    @staticmethod
+    async def get_cart_ids_for_clover_order(db: AsyncSession, merchant_id: str, clover_order_id: str) -> List[int]:
+        """Carts whose submission or order is the given Clover order"""
+        submitted = select(OrderSubmission.cart_id).where(
+            OrderSubmission.clover_merchant_id == merchant_id,
+            OrderSubmission.clover_order_id == clover_order_id
+        )
+        ordered = select(Order.cart_id).where(
+            Order.clover_merchant_id == merchant_id,
+            Order.clover_order_id == clover_order_id
+        )
+        result = await db.execute(submitted.union(ordered))
+        return [cart_id for cart_id in result.scalars().all() if cart_id is not None]
+
+    @staticmethod
+    async def get_active_cart_by_session(db: AsyncSession, session_id: str) -> Optional[Cart]:
         """Get active cart by session ID"""
-        return db.query(Cart).filter(
-            Cart.session_id == session_id,
-            Cart.status == "active"
-        ).first()
+        result = await db.execute(
+            select(Cart).where(
+                Cart.session_id == session_id,
+                Cart.status == "active"
+            )
+        )
+        return result.scalars().first()
 
     @staticmethod
-    def add_item_to_cart(
-        db: Session,
+    async def get_cart_item_by_clover_id(db: AsyncSession, cart_id: int, clover_item_id: str) -> Optional[CartItem]:
+        """Get the cart's line for a Clover item; a cart holds at most one per item"""
+        result = await db.execute(
+            select(CartItem).where(
+                CartItem.cart_id == cart_id,
+                CartItem.clover_item_id == clover_item_id
+            )
+        )
+        return result.scalars().first()
+
+    @staticmethod
+    async def add_item_to_cart(
+        db: AsyncSession,
         cart_id: int,
         clover_item_id: str,
         name: str,
@@ -53,21 +115,19 @@ class CartHelper:
         quantity: int = 1,
         notes: str = None
     ) -> CartItem:
-        """Add an item to cart"""
+        """
+        Add an item to cart. The change is only flushed; the caller
+        recomputes the totals and commits (see recompute_cart_totals).
+        """
         # Check if item already exists in cart
-        existing_item = db.query(CartItem).filter(
-            CartItem.cart_id == cart_id,
-            CartItem.clover_item_id == clover_item_id
-        ).first()
+        existing_item = await CartHelper.get_cart_item_by_clover_id(db, cart_id, clover_item_id)
 
         if existing_item:
             # Update quantity and totals
             existing_item.quantity += quantity
             existing_item.line_total = existing_item.price * existing_item.quantity
             existing_item.updated_at = datetime.now()
-            db.commit()
-            db.refresh(existing_item)
-            CartHelper._update_cart_totals(db, cart_id)
+            await db.flush()
             return existing_item
         else:
             # Create new item
@@ -81,61 +141,47 @@ class CartHelper:
                 notes=notes
             )
             db.add(cart_item)
-            db.commit()
-            db.refresh(cart_item)
-            CartHelper._update_cart_totals(db, cart_id)
+            await db.flush()
             return cart_item
 
     @staticmethod
-    def update_item_quantity(
-        db: Session,
-        cart_item_id: int,
-        quantity: int
-    ) -> Optional[CartItem]:
-        """Update cart item quantity"""
-        cart_item = db.query(CartItem).filter(CartItem.id == cart_item_id).first()
+    async def update_item_quantity(db: AsyncSession, cart_item_id: int, quantity: int) -> Optional[CartItem]:
+        """Update cart item quantity; flushed only, like add_item_to_cart"""
+        cart_item = await db.get(CartItem, cart_item_id)
         if not cart_item:
             return None
 
         if quantity <= 0:
             # Remove item if quantity is 0 or negative
-            cart_id = cart_item.cart_id
-            db.delete(cart_item)
-            db.commit()
-            CartHelper._update_cart_totals(db, cart_id)
-            return None
-
-        cart_item.quantity = quantity
-        cart_item.line_total = cart_item.price * quantity
-        cart_item.updated_at = datetime.now()
-        db.commit()
-        db.refresh(cart_item)
-        CartHelper._update_cart_totals(db, cart_item.cart_id)
+            await db.delete(cart_item)
+            cart_item = None
+        else:
+            cart_item.quantity = quantity
+            cart_item.line_total = cart_item.price * quantity
+            cart_item.updated_at = datetime.now()
+        await db.flush()
         return cart_item
 
     @staticmethod
-    def remove_item_from_cart(db: Session, cart_item_id: int) -> bool:
-        """Remove an item from cart"""
-        cart_item = db.query(CartItem).filter(CartItem.id == cart_item_id).first()
+    async def remove_item_from_cart(db: AsyncSession, cart_item_id: int) -> bool:
+        """Remove an item from cart; flushed only, like add_item_to_cart"""
+        cart_item = await db.get(CartItem, cart_item_id)
         if not cart_item:
             return False
-
-        cart_id = cart_item.cart_id
-        db.delete(cart_item)
-        db.commit()
-        CartHelper._update_cart_totals(db, cart_id)
+        await db.delete(cart_item)
+        await db.flush()
         return True
 
     @staticmethod
-    def add_modifier_to_item(
-        db: Session,
+    async def add_modifier_to_item(
+        db: AsyncSession,
         cart_item_id: int,
         clover_modifier_id: str,
         clover_modifier_group_id: str,
         name: str,
         price: float = 0.0
     ) -> CartItemModifier:
-        """Add a modifier to a cart item"""
+        """Add a modifier to a cart item; flushed only, like add_item_to_cart"""
         modifier = CartItemModifier(
             cart_item_id=cart_item_id,
             clover_modifier_id=clover_modifier_id,
@@ -144,64 +190,187 @@ class CartHelper:
             price=price
         )
         db.add(modifier)
-        db.commit()
-        db.refresh(modifier)
+        await db.flush()
+        return modifier
 
-        # Update cart totals
-        cart_item = db.query(CartItem).filter(CartItem.id == cart_item_id).first()
-        if cart_item:
-            CartHelper._update_cart_totals(db, cart_item.cart_id)
+    @staticmethod
+    def _expiry() -> datetime:
+        """expires_at for a cart changed now"""
+        return datetime.now() + timedelta(seconds=CART_EXPIRY_SECONDS)
 
-        return modifier
+    @staticmethod
+    def _expired(now: datetime):
+        """Active carts past expires_at; carts from before expires_at was set go by their last change"""
+        return (Cart.status == "active") & or_(
+            Cart.expires_at < now,
+            Cart.expires_at.is_(None)
+            & (func.coalesce(Cart.updated_at, Cart.created_at) < now - timedelta(seconds=CART_EXPIRY_SECONDS))
+        )
 
     @staticmethod
-    def clear_cart(db: Session, cart_id: int) -> bool:
-        """Clear all items from cart"""
-        cart = db.query(Cart).filter(Cart.id == cart_id).first()
-        if not cart:
-            return False
+    async def find_expired_cart_ids(db: AsyncSession, now: datetime, limit: int) -> List[int]:
+        """Up to `limit` expired active carts, longest expired first"""
+        result = await db.execute(
+            select(Cart.id).where(CartHelper._expired(now)).order_by(Cart.expires_at).limit(limit)
+        )
+        return list(result.scalars().all())
 
-        # Delete all items (modifiers will be deleted via cascade)
-        db.query(CartItem).filter(CartItem.id == cart_id).delete()
-        db.commit()
-        CartHelper._update_cart_totals(db, cart_id)
-        return True
+    @staticmethod
+    async def abandon_carts(db: AsyncSession, cart_ids: List[int], now: datetime) -> int:
+        """
+        Mark the given carts abandoned in one UPDATE and commit; the expiry
+        condition is checked again so a cart changed since it was found
+        stays active. Returns how many were abandoned.
+        """
+        if not cart_ids:
+            return 0
+        result = await db.execute(
+            update(Cart)
+            .where(Cart.id.in_(cart_ids), CartHelper._expired(now))
+            .values(status="abandoned", version=Cart.version + 1, updated_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+        return result.rowcount or 0
 
     @staticmethod
-    def _update_cart_totals(db: Session, cart_id: int):
-        """Update cart totals based on items and modifiers"""
-        cart = db.query(Cart).filter(Cart.id == cart_id).first()
-        if not cart:
-            return
+    async def purge_abandoned_carts(db: AsyncSession, before: datetime, limit: int) -> int:
+        """
+        Delete up to `limit` carts abandoned before `before`, with their
+        items and modifiers, and commit; carts an order or submission points
+        at are kept. Returns how many carts were deleted.
+        """
+        has_order = select(Order.id).where(Order.cart_id == Cart.id).exists()
+        has_submission = select(OrderSubmission.id).where(OrderSubmission.cart_id == Cart.id).exists()
+        result = await db.execute(
+            select(Cart.id)
+            .where(
+                Cart.status == "abandoned",
+                func.coalesce(Cart.updated_at, Cart.created_at) < before,
+                ~has_order,
+                ~has_submission
+            )
+            .limit(limit)
+        )
+        cart_ids = list(result.scalars().all())
+        if not cart_ids:
+            return 0
 
-        # Calculate subtotal from items
-        subtotal = 0.0
-        for item in cart.items:
-            item_total = item.line_total
-            # Add modifier costs
-            modifier_total = sum(mod.price for mod in item.modifiers)
-            item_total += (modifier_total * item.quantity)
-            subtotal += item_total
+        # Bulk deletes skip the ORM cascade, so children go first
+        item_ids = select(CartItem.id).where(CartItem.cart_id.in_(cart_ids))
+        await db.execute(delete(CartItemModifier).where(CartItemModifier.cart_item_id.in_(item_ids)))
+        await db.execute(delete(CartItem).where(CartItem.cart_id.in_(cart_ids)))
+        await db.execute(delete(Cart).where(Cart.id.in_(cart_ids)))
+        await db.commit()
+        return len(cart_ids)
+
+    @staticmethod
+    def _computed_subtotal():
+        """Correlated SQL expression: a cart's subtotal recomputed from its items and modifiers"""
+        modifier_unit_total = (
+            select(func.coalesce(func.sum(CartItemModifier.price), 0.0))
+            .where(CartItemModifier.cart_item_id == CartItem.id)
+            .correlate(CartItem)
+            .scalar_subquery()
+        )
+        return (
+            select(func.coalesce(func.sum(CartItem.line_total + CartItem.quantity * modifier_unit_total), 0.0))
+            .where(CartItem.cart_id == Cart.id)
+            .correlate(Cart)
+            .scalar_subquery()
+        )
+
+    @staticmethod
+    async def recompute_cart_totals(
+        db: AsyncSession,
+        cart_id: int,
+        expected_version: Optional[int] = None,
+        new_version: Optional[int] = None
+    ):
+        """
+        Set the cart's totals from its items and modifiers in one statement;
+        the caller commits. The version becomes new_version (default: one
+        more); with expected_version it is a compare-and-swap that raises
+        CartVersionConflict, leaving the rollback to the caller.
+        """
+        computed = CartHelper._computed_subtotal()
+        query = update(Cart).where(Cart.id == cart_id)
+        if expected_version is not None:
+            query = query.where(Cart.version == expected_version)
+        result = await db.execute(
+            query
+            .values(
+                subtotal=computed,
+                total_amount=computed,
+                version=new_version if new_version is not None else Cart.version + 1,
+                updated_at=datetime.now(),
+                expires_at=CartHelper._expiry()
+            )
+            .execution_options(synchronize_session="fetch")
+        )
+        if not result.rowcount and expected_version is not None:
+            raise CartVersionConflict(cart_id)
 
-        # For now, set tax and discount to 0 (can be enhanced later)
-        tax_amount = 0.0
-        discount_amount = 0.0
-        total_amount = subtotal + tax_amount - discount_amount
+    @staticmethod
+    async def verify_cart_totals(
+        db: AsyncSession,
+        cart_ids: Optional[List[int]] = None,
+        fix: bool = True
+    ) -> List[Dict[str, Any]]:
+        """
+        Recompute totals from scratch and report carts whose stored totals
+        have drifted from them; every active cart when no ids are given.
+        With fix=True the drifted carts are corrected and committed.
+        """
+        computed = CartHelper._computed_subtotal()
+        drifted = or_(
+            func.abs(func.coalesce(Cart.subtotal, 0.0) - computed) > CART_TOTALS_TOLERANCE,
+            func.abs(func.coalesce(Cart.total_amount, 0.0) - computed) > CART_TOTALS_TOLERANCE,
+        )
+        query = select(Cart.id, Cart.subtotal, Cart.total_amount, computed.label("computed")).where(drifted)
+        if cart_ids is not None:
+            query = query.where(Cart.id.in_(cart_ids))
+        else:
+            query = query.where(Cart.status == "active")
 
-        # Update cart
-        cart.subtotal = subtotal
-        cart.total_amount = total_amount
-        cart.updated_at = datetime.now()
+        rows = (await db.execute(query)).all()
+        report = [
+            {
+                "cart_id": row.id,
+                "stored_subtotal": row.subtotal,
+                "stored_total_amount": row.total_amount,
+                "computed_subtotal": row.computed,
+            }
+            for row in rows
+        ]
 
-        db.commit()
+        if fix and report:
+            # Recomputed again inside the UPDATE so a write since the SELECT is not lost
+            await db.execute(
+                update(Cart)
+                .where(Cart.id.in_([r["cart_id"] for r in report]))
+                .values(subtotal=computed, total_amount=computed)
+                .execution_options(synchronize_session="fetch")
+            )
+            await db.commit()
+        return report
 
     @staticmethod
-    def get_cart_summary(db: Session, cart_id: int) -> Optional[Dict]:
-        """Get cart summary with all details"""
-        cart = db.query(Cart).filter(Cart.id == cart_id).first()
-        if not cart:
-            return None
+    def _with_items(query):
+        """
+        Load carts with their items and modifiers in two extra SELECTs,
+        however many carts match; any other relationship the serializer
+        touches raises instead of lazy-loading one row at a time
+        """
+        return (
+            query
+            .options(selectinload(Cart.items).selectinload(CartItem.modifiers), raiseload("*"))
+            .execution_options(populate_existing=True)
+        )
 
+    @staticmethod
+    def summarize_cart(cart: Cart) -> Dict:
+        """Serialize a cart whose items and modifiers are already loaded"""
         items = []
         for item in cart.items:
             modifiers = [
@@ -234,22 +403,51 @@ class CartHelper:
             "status": cart.status,
             "subtotal": cart.subtotal,
             "total_amount": cart.total_amount,
+            "version": cart.version or 0,
             "items": items,
             "created_at": cart.created_at.isoformat() if cart.created_at else None,
             "updated_at": cart.updated_at.isoformat() if cart.updated_at else None
         }
 
     @staticmethod
-    def get_carts_by_customer(db: Session, customer_id: str) -> List[Dict]:
-        """Get all carts for a specific customer"""
-        carts = db.query(Cart).filter(
-            Cart.customer_id == customer_id
-        ).order_by(Cart.created_at.desc()).all()
+    async def get_carts_with_items(db: AsyncSession, cart_ids: List[int]) -> List[Cart]:
+        """Many carts with items and modifiers from three queries, in the order of cart_ids; unknown ids are skipped"""
+        if not cart_ids:
+            return []
+        result = await db.execute(CartHelper._with_items(select(Cart).where(Cart.id.in_(cart_ids))))
+        carts = {cart.id: cart for cart in result.scalars().all()}
+        return [carts[cart_id] for cart_id in cart_ids if cart_id in carts]
 
-        cart_summaries = []
-        for cart in carts:
-            summary = CartHelper.get_cart_summary(db, cart.id)
-            if summary:
-                cart_summaries.append(summary)
+    @staticmethod
+    async def get_cart_summaries(db: AsyncSession, cart_ids: List[int]) -> List[Dict]:
+        """Summaries of many carts from three queries, in the order of cart_ids; unknown ids are skipped"""
+        return [CartHelper.summarize_cart(cart) for cart in await CartHelper.get_carts_with_items(db, cart_ids)]
 
-        return cart_summaries
+    @staticmethod
+    async def get_cart_summary(db: AsyncSession, cart_id: int) -> Optional[Dict]:
+        """Get cart summary with all details"""
+        summaries = await CartHelper.get_cart_summaries(db, [cart_id])
+        return summaries[0] if summaries else None
+
+    @staticmethod
+    async def get_carts_by_customer(
+        db: AsyncSession,
+        customer_id: str,
+        limit: Optional[int] = None,
+        offset: int = 0
+    ) -> List[Dict]:
+        """
+        Get all carts for a specific customer, newest first. Carts carry no
+        customer id, so a customer's carts are the ones their orders were
+        placed from.
+        """
+        customer_cart_ids = select(Order.cart_id).where(Order.customer_id == customer_id)
+        query = (
+            select(Cart)
+            .where(Cart.id.in_(customer_cart_ids))
+            .order_by(Cart.created_at.desc(), Cart.id.desc())
+            .offset(offset)
+            .limit(limit)
+        )
+        result = await db.execute(CartHelper._with_items(query))
+        return [CartHelper.summarize_cart(cart) for cart in result.scalars().all()]
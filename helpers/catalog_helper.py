@@ -0,0 +1,362 @@
+# helpers/catalog_helper.py
+from sqlalchemy.orm import Session, selectinload
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Set
+from models.catalog import (
+    CatalogItem,
+    CatalogVariant,
+    CatalogCategory,
+    CatalogItemCategory,
+    CatalogModifierGroup,
+    CatalogModifier,
+    CatalogItemStock,
+    CatalogSyncState,
+)
+from services.category_menu import CategoryTree
+
+
+def _elements(value: Any) -> List[Dict[str, Any]]:
+    """Clover nests expanded collections as {"elements": [...]}"""
+    if isinstance(value, dict):
+        return value.get("elements", []) or []
+    if isinstance(value, list):
+        return value
+    return []
+
+
+def _max_modified(rows: Iterable[Dict[str, Any]]) -> Optional[int]:
+    times = [row.get("modifiedTime") for row in rows if row.get("modifiedTime")]
+    return max(times) if times else None
+
+
+# entity -> (mirror model, Clover id column)
+_ENTITY_MODELS = {
+    "items": (CatalogItem, CatalogItem.clover_item_id),
+    "categories": (CatalogCategory, CatalogCategory.clover_category_id),
+    "modifier_groups": (CatalogModifierGroup, CatalogModifierGroup.clover_modifier_group_id),
+    "item_stocks": (CatalogItemStock, CatalogItemStock.clover_item_id),
+}
+
+
+class CatalogHelper:
+    """Helper class for the local Clover catalog mirror"""
+
+    # ---- sync state -------------------------------------------------------
+
+    @staticmethod
+    def get_sync_state(db: Session, merchant_id: str, entity: str) -> Optional[CatalogSyncState]:
+        return db.query(CatalogSyncState).filter(
+            CatalogSyncState.clover_merchant_id == merchant_id,
+            CatalogSyncState.entity == entity
+        ).first()
+
+    @staticmethod
+    def save_sync_state(
+        db: Session,
+        merchant_id: str,
+        entity: str,
+        last_modified_time: Optional[int],
+        full: bool,
+        error: Optional[str] = None
+    ) -> None:
+        """Record a finished sync pass; the watermark never moves backwards"""
+        state = CatalogHelper.get_sync_state(db, merchant_id, entity)
+        if not state:
+            state = CatalogSyncState(clover_merchant_id=merchant_id, entity=entity)
+            db.add(state)
+
+        if error:
+            state.last_error = error[:2000]
+        else:
+            now = datetime.now()
+            if last_modified_time and (state.last_modified_time or 0) < last_modified_time:
+                state.last_modified_time = last_modified_time
+            state.last_synced_at = now
+            if full:
+                state.last_full_sync_at = now
+            state.last_error = None
+        db.commit()
+
+    @staticmethod
+    def is_synced(db: Session, merchant_id: str, entity: str = "items") -> bool:
+        """True once at least one sync pass of the entity finished for the merchant"""
+        state = CatalogHelper.get_sync_state(db, merchant_id, entity)
+        return bool(state and state.last_synced_at)
+
+    # ---- upserts ----------------------------------------------------------
+
+    @staticmethod
+    def upsert_items(db: Session, merchant_id: str, elements: List[Dict[str, Any]]) -> Optional[int]:
+        """
+        Insert or update a page of Clover items (expanded with variants and
+        categories). Items flagged deleted are removed.
+
+        Returns:
+            The highest modifiedTime in the page
+        """
+        ids = [e["id"] for e in elements if e.get("id")]
+        existing = {
+            item.clover_item_id: item
+            for item in db.query(CatalogItem).options(
+                selectinload(CatalogItem.variants),
+                selectinload(CatalogItem.category_links)
+            ).filter(
+                CatalogItem.clover_merchant_id == merchant_id,
+                CatalogItem.clover_item_id.in_(ids)
+            ).all()
+        } if ids else {}
+
+        for data in elements:
+            item_id = data.get("id")
+            if not item_id:
+                continue
+            item = existing.get(item_id)
+
+            if data.get("deleted"):
+                if item:
+                    db.delete(item)
+                continue
+
+            if not item:
+                item = CatalogItem(clover_merchant_id=merchant_id, clover_item_id=item_id)
+                db.add(item)
+
+            item.name = data.get("name") or ""
+            item.price = data.get("price") or 0
+            item.price_type = data.get("priceType")
+            item.sku = data.get("sku")
+            item.hidden = bool(data.get("hidden", False))
+            item.available = bool(data.get("available", True))
+            item.modified_time = data.get("modifiedTime")
+
+            # Variants: update in place, add new, drop missing
+            variants = {v.clover_variant_id: v for v in item.variants}
+            incoming = _elements(data.get("variants"))
+            for variant_data in incoming:
+                variant = variants.pop(variant_data.get("id"), None)
+                if not variant:
+                    variant = CatalogVariant(clover_variant_id=variant_data.get("id"))
+                    item.variants.append(variant)
+                variant.name = variant_data.get("name")
+                variant.price = variant_data.get("price") or 0
+            for stale in variants.values():
+                item.variants.remove(stale)
+
+            # Category links
+            links = {link.clover_category_id: link for link in item.category_links}
+            for category_ref in _elements(data.get("categories")):
+                category_id = category_ref.get("id")
+                if category_id and not links.pop(category_id, None):
+                    item.category_links.append(
+                        CatalogItemCategory(clover_category_id=category_id, clover_merchant_id=merchant_id)
+                    )
+            for stale in links.values():
+                item.category_links.remove(stale)
+
+        db.commit()
+        return _max_modified(elements)
+
+    @staticmethod
+    def upsert_categories(db: Session, merchant_id: str, elements: List[Dict[str, Any]]) -> Optional[int]:
+        ids = [e["id"] for e in elements if e.get("id")]
+        existing = {
+            c.clover_category_id: c
+            for c in db.query(CatalogCategory).filter(
+                CatalogCategory.clover_merchant_id == merchant_id,
+                CatalogCategory.clover_category_id.in_(ids)
+            ).all()
+        } if ids else {}
+
+        for data in elements:
+            category_id = data.get("id")
+            if not category_id:
+                continue
+            category = existing.get(category_id)
+
+            if data.get("deleted"):
+                if category:
+                    db.delete(category)
+                continue
+
+            if not category:
+                category = CatalogCategory(clover_merchant_id=merchant_id, clover_category_id=category_id)
+                db.add(category)
+            category.name = data.get("name") or ""
+            category.sort_order = data.get("sortOrder")
+            category.modified_time = data.get("modifiedTime")
+
+        db.commit()
+        return _max_modified(elements)
+
+    @staticmethod
+    def upsert_modifier_groups(db: Session, merchant_id: str, elements: List[Dict[str, Any]]) -> Optional[int]:
+        """Insert or update a page of modifier groups expanded with their modifiers"""
+        ids = [e["id"] for e in elements if e.get("id")]
+        existing = {
+            g.clover_modifier_group_id: g
+            for g in db.query(CatalogModifierGroup).options(
+                selectinload(CatalogModifierGroup.modifiers)
+            ).filter(
+                CatalogModifierGroup.clover_merchant_id == merchant_id,
+                CatalogModifierGroup.clover_modifier_group_id.in_(ids)
+            ).all()
+        } if ids else {}
+
+        for data in elements:
+            group_id = data.get("id")
+            if not group_id:
+                continue
+            group = existing.get(group_id)
+
+            if data.get("deleted"):
+                if group:
+                    db.delete(group)
+                continue
+
+            if not group:
+                group = CatalogModifierGroup(clover_merchant_id=merchant_id, clover_modifier_group_id=group_id)
+                db.add(group)
+            group.name = data.get("name") or ""
+            group.min_required = data.get("minRequired")
+            group.max_allowed = data.get("maxAllowed")
+            group.show_by_default = bool(data.get("showByDefault", True))
+            group.modified_time = data.get("modifiedTime")
+
+            modifiers = {m.clover_modifier_id: m for m in group.modifiers}
+            for modifier_data in _elements(data.get("modifiers")):
+                modifier = modifiers.pop(modifier_data.get("id"), None)
+                if not modifier:
+                    modifier = CatalogModifier(clover_modifier_id=modifier_data.get("id"))
+                    group.modifiers.append(modifier)
+                modifier.name = modifier_data.get("name") or ""
+                modifier.price = modifier_data.get("price") or 0
+                modifier.available = bool(modifier_data.get("available", True))
+            for stale in modifiers.values():
+                group.modifiers.remove(stale)
+
+        db.commit()
+        return _max_modified(elements)
+
+    @staticmethod
+    def upsert_item_stocks(db: Session, merchant_id: str, elements: List[Dict[str, Any]]) -> Optional[int]:
+        def item_id_of(data: Dict[str, Any]) -> Optional[str]:
+            return (data.get("item") or {}).get("id") or data.get("id")
+
+        ids = [item_id_of(e) for e in elements if item_id_of(e)]
+        existing = {
+            s.clover_item_id: s
+            for s in db.query(CatalogItemStock).filter(
+                CatalogItemStock.clover_merchant_id == merchant_id,
+                CatalogItemStock.clover_item_id.in_(ids)
+            ).all()
+        } if ids else {}
+
+        for data in elements:
+            item_id = item_id_of(data)
+            if not item_id:
+                continue
+            stock = existing.get(item_id)
+            if not stock:
+                stock = CatalogItemStock(clover_merchant_id=merchant_id, clover_item_id=item_id)
+                db.add(stock)
+                existing[item_id] = stock
+            stock.quantity = data.get("quantity")
+            stock.stock_count = data.get("stockCount")
+            stock.modified_time = data.get("modifiedTime")
+
+        db.commit()
+        return _max_modified(elements)
+
+    @staticmethod
+    def delete_missing(db: Session, merchant_id: str, entity: str, seen_ids: Set[str]) -> int:
+        """After a full sync, drop mirror rows Clover no longer returns"""
+        model, column = _ENTITY_MODELS[entity]
+
+        stale = [
+            row for row in db.query(model).filter(model.clover_merchant_id == merchant_id).all()
+            if getattr(row, column.key) not in seen_ids
+        ]
+        for row in stale:
+            db.delete(row)  # ORM delete so child rows cascade on every backend
+        db.commit()
+        return len(stale)
+
+    @staticmethod
+    def delete_by_ids(db: Session, merchant_id: str, entity: str, ids: Iterable[str]) -> int:
+        """Drop specific mirror rows, e.g. for a Clover DELETE webhook"""
+        model, column = _ENTITY_MODELS[entity]
+        rows = db.query(model).filter(
+            model.clover_merchant_id == merchant_id,
+            column.in_(list(ids))
+        ).all()
+        for row in rows:
+            db.delete(row)
+        db.commit()
+        return len(rows)
+
+    # ---- reads ------------------------------------------------------------
+
+    @staticmethod
+    def get_items_with_variations(db: Session, merchant_id: str) -> List[Dict[str, Any]]:
+        """Items and their variations in the /api/clover/items/{merchant_id} shape"""
+        items = db.query(CatalogItem).options(
+            selectinload(CatalogItem.variants)
+        ).filter(
+            CatalogItem.clover_merchant_id == merchant_id
+        ).order_by(CatalogItem.id).all()
+
+        return [
+            {
+                "id": item.clover_item_id,
+                "name": item.name,
+                "price": item.price,
+                "variations": [
+                    {"id": v.clover_variant_id, "name": v.name, "price": v.price}
+                    for v in item.variants
+                ],
+            }
+            for item in items
+        ]
+
+    @staticmethod
+    def get_item(db: Session, merchant_id: str, item_id: str) -> Optional[CatalogItem]:
+        return db.query(CatalogItem).options(
+            selectinload(CatalogItem.variants)
+        ).filter(
+            CatalogItem.clover_merchant_id == merchant_id,
+            CatalogItem.clover_item_id == item_id
+        ).first()
+
+    @staticmethod
+    def get_category_menu(db: Session, merchant_id: str) -> List[Dict[str, Any]]:
+        """
+        Categories with their sellable variations, in the
+        /api/merchants/{merchant_id}/categories shape. Items without a
+        category end up in a trailing "Uncategorized" entry.
+        """
+        return CatalogHelper.get_category_tree(db, merchant_id).menu()
+
+    @staticmethod
+    def get_category_tree(db: Session, merchant_id: str) -> CategoryTree:
+        """The mirrored catalog as a CategoryTree, built in one pass over the items"""
+        categories = db.query(CatalogCategory).filter(
+            CatalogCategory.clover_merchant_id == merchant_id
+        ).order_by(CatalogCategory.sort_order, CatalogCategory.id).all()
+        items = db.query(CatalogItem).options(
+            selectinload(CatalogItem.variants),
+            selectinload(CatalogItem.category_links)
+        ).filter(
+            CatalogItem.clover_merchant_id == merchant_id
+        ).order_by(CatalogItem.id).all()
+
+        tree = CategoryTree((c.clover_category_id, c.name) for c in categories)
+        for item in items:
+            if item.variants:
+                variations = [
+                    {"id": v.clover_variant_id, "name": f"{item.name} ({v.name})", "price": (v.price or 0) / 100.0}
+                    for v in item.variants
+                ]
+            else:
+                variations = [{"id": item.clover_item_id, "name": item.name, "price": (item.price or 0) / 100.0}]
+            tree.put_item(item.clover_item_id, [link.clover_category_id for link in item.category_links], variations)
+        return tree
@@ -1,10 +1,11 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import delete, select, text
 from datetime import datetime
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, List, Tuple
 from models.merchant import Merchant
 from models.merchant_detail import MerchantDetail
 from models.merchant_token import MerchantToken
+from services.token_cache import merchant_token_cache
 import json
 
 
@@ -13,14 +14,15 @@ class MerchantHelper:
     """Helper class for merchant database operations"""
 
     @staticmethod
-    def get_merchant_by_clover_id(db: Session, clover_merchant_id: str) -> Optional[Merchant]:
+    async def get_merchant_by_clover_id(db: AsyncSession, clover_merchant_id: str) -> Optional[Merchant]:
         """Get merchant by Clover merchant ID"""
-        return db.query(Merchant).filter(
-            Merchant.clover_merchant_id == clover_merchant_id
-        ).first()
+        result = await db.execute(
+            select(Merchant).where(Merchant.clover_merchant_id == clover_merchant_id)
+        )
+        return result.scalars().first()
 
     @staticmethod
-    def create_merchant(db: Session, clover_merchant_id: str, name: str = None, email: str = None) -> Merchant:
+    async def create_merchant(db: AsyncSession, clover_merchant_id: str, name: str = None, email: str = None) -> Merchant:
         """Create new merchant"""
         merchant = Merchant(
             clover_merchant_id=clover_merchant_id,
@@ -28,43 +30,63 @@ class MerchantHelper:
             email=email
         )
         db.add(merchant)
-        db.commit()
-        db.refresh(merchant)
+        await db.commit()
+        await db.refresh(merchant)
         return merchant
 
     @staticmethod
-    def update_merchant(db: Session, merchant: Merchant, name: str = None, email: str = None) -> Merchant:
+    async def update_merchant(db: AsyncSession, merchant: Merchant, name: str = None, email: str = None) -> Merchant:
         """Update existing merchant"""
         if name:
             merchant.name = name
         if email:
             merchant.email = email
-        db.commit()
-        db.refresh(merchant)
+        await db.commit()
+        await db.refresh(merchant)
         return merchant
 
     @staticmethod
-    def store_or_update_token(db: Session, merchant_id: int, access_token: str) -> None:
-        """Store or update merchant access token"""
+    async def store_or_update_token(
+        db: AsyncSession,
+        merchant_id: int,
+        access_token: str,
+        refresh_token: Optional[str] = None,
+        expires_at: Optional[datetime] = None,
+        refresh_expires_at: Optional[datetime] = None
+    ) -> None:
+        """Store or update merchant access token, with its OAuth refresh token and expiries when known"""
         # Check if token exists
-        existing_token = db.query(MerchantToken).filter(
-            MerchantToken.merchant_id == merchant_id
-        ).first()
+        result = await db.execute(
+            select(MerchantToken).where(MerchantToken.merchant_id == merchant_id)
+        )
+        existing_token = result.scalars().first()
 
         if existing_token:
             # Update existing token
             existing_token.token = access_token
             existing_token.token_type = "bearer"
+            existing_token.expires_at = expires_at
+            if refresh_token:
+                existing_token.refresh_token = refresh_token
+                existing_token.refresh_expires_at = refresh_expires_at
+                existing_token.refreshed_at = datetime.utcnow()
         else:
             # Create new token
             token = MerchantToken(
                 merchant_id=merchant_id,
                 token=access_token,
-                token_type="bearer"
+                token_type="bearer",
+                refresh_token=refresh_token,
+                expires_at=expires_at,
+                refresh_expires_at=refresh_expires_at
             )
             db.add(token)
 
-        db.commit()
+        await db.commit()
+
+        merchant = await db.get(Merchant, merchant_id)
+        if merchant:
+            merchant_token_cache.invalidate(merchant.clover_merchant_id)
 
     # @staticmethod
     # def store_or_update_merchant_details(db: Session, clover_merchant_id: str, merchant_data: Dict[str, Any]) -> None:
@@ -106,7 +128,7 @@ class MerchantHelper:
     #     db.commit()
 
     @staticmethod
-    def store_or_update_merchant_details(db: Session, clover_merchant_id: str, merchant_data: Dict[str, Any]) -> None:
+    async def store_or_update_merchant_details(db: AsyncSession, clover_merchant_id: str, merchant_data: Dict[str, Any]) -> None:
         """Store or update merchant detailed information"""
 
         def safe_extract_string(data: dict, key: str, max_length: int = None) -> str:
@@ -144,9 +166,10 @@ class MerchantHelper:
                 print(f"  --> LIST DETECTED in '{key}': {value}")
 
         # Check if details exist
-        existing_detail = db.query(MerchantDetail).filter(
-            MerchantDetail.clover_merchant_id == clover_merchant_id
-        ).first()
+        result = await db.execute(
+            select(MerchantDetail).where(MerchantDetail.clover_merchant_id == clover_merchant_id)
+        )
+        existing_detail = result.scalars().first()
 
         if existing_detail:
             # Update existing details with safe extraction
@@ -181,17 +204,23 @@ class MerchantHelper:
             db.add(detail)
 
         try:
-            db.commit()
+            await db.commit()
             print("✅ Merchant details stored successfully")
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             print(f"❌ Error committing to database: {str(e)}")
             raise Exception(f"Database commit failed: {str(e)}")
 
     @staticmethod
-    def get_merchant_token(db: Session, clover_merchant_id: str) -> Optional[str]:
-        """Get merchant access token"""
-        result = db.execute(
+    async def get_merchant_token(db: AsyncSession, clover_merchant_id: str) -> Optional[str]:
+        """Get merchant access token, from the token cache when possible"""
+        return await merchant_token_cache.get(
+            clover_merchant_id, lambda: MerchantHelper._load_merchant_token(db, clover_merchant_id)
+        )
+
+    @staticmethod
+    async def _load_merchant_token(db: AsyncSession, clover_merchant_id: str) -> Optional[str]:
+        result = (await db.execute(
             text("""
                 SELECT mt.token
                 FROM merchant_tokens mt
@@ -199,51 +228,110 @@ class MerchantHelper:
                 WHERE m.clover_merchant_id = :clover_id
             """),
             {"clover_id": clover_merchant_id}
-        ).fetchone()
+        )).fetchone()
 
         return result[0] if result else None
 
     @staticmethod
-    def get_total_merchants_count(db: Session) -> int:
+    async def get_token_record(db: AsyncSession, clover_merchant_id: str) -> Optional[MerchantToken]:
+        """Get the merchant_tokens row (with refresh token and expiries) for a Clover merchant"""
+        result = await db.execute(
+            select(MerchantToken)
+            .join(Merchant, MerchantToken.merchant_id == Merchant.id)
+            .where(Merchant.clover_merchant_id == clover_merchant_id)
+        )
+        return result.scalars().first()
+
+    @staticmethod
+    async def get_merchants_with_tokens_expiring(db: AsyncSession, before: datetime) -> List[str]:
+        """Clover merchant IDs whose access token expires before `before` and can be refreshed"""
+        result = await db.execute(
+            select(Merchant.clover_merchant_id)
+            .join(MerchantToken, MerchantToken.merchant_id == Merchant.id)
+            .where(
+                MerchantToken.refresh_token.isnot(None),
+                MerchantToken.expires_at.isnot(None),
+                MerchantToken.expires_at <= before
+            )
+            .order_by(MerchantToken.expires_at)
+        )
+        return list(result.scalars().all())
+
+    @staticmethod
+    async def get_all_merchant_tokens(db: AsyncSession) -> List[Tuple[str, str]]:
+        """Get (clover_merchant_id, access token) for every merchant with a token"""
+        rows = (await db.execute(
+            text("""
+                SELECT m.clover_merchant_id, mt.token
+                FROM merchant_tokens mt
+                JOIN merchants m ON mt.merchant_id = m.id
+            """)
+        )).fetchall()
+
+        return [(row[0], row[1]) for row in rows]
+
+    @staticmethod
+    async def delete_merchant(db: AsyncSession, clover_merchant_id: str) -> bool:
+        """Delete a merchant and its tokens"""
+        merchant = await MerchantHelper.get_merchant_by_clover_id(db, clover_merchant_id)
+        if not merchant:
+            return False
+
+        await db.execute(delete(MerchantToken).where(MerchantToken.merchant_id == merchant.id))
+        await db.delete(merchant)
+        await db.commit()
+        merchant_token_cache.invalidate(clover_merchant_id)
+        return True
+
+    @staticmethod
+    async def get_total_merchants_count(db: AsyncSession) -> int:
         """Get total number of merchants"""
-        result = db.execute(text("SELECT COUNT(*) FROM merchants")).fetchone()
+        result = (await db.execute(text("SELECT COUNT(*) FROM merchants"))).fetchone()
         return result[0] if result else 0
 
     @staticmethod
-    def store_complete_merchant_data(
-        db: Session,
+    async def store_complete_merchant_data(
+        db: AsyncSession,
         clover_merchant_id: str,
         merchant_data: Dict[str, Any],
-        access_token: str
+        access_token: str,
+        refresh_token: Optional[str] = None,
+        expires_at: Optional[datetime] = None,
+        refresh_expires_at: Optional[datetime] = None
     ) -> int:
         """Complete merchant storage workflow"""
         try:
             # 1. Store/Update merchant basic info
-            merchant = MerchantHelper.get_merchant_by_clover_id(db, clover_merchant_id)
+            merchant = await MerchantHelper.get_merchant_by_clover_id(db, clover_merchant_id)
 
             if merchant:
                 # Update existing merchant
-                merchant = MerchantHelper.update_merchant(
+                merchant = await MerchantHelper.update_merchant(
                     db, merchant,
                     name=merchant_data.get("name"),
                     email=merchant_data.get("email")
                 )
             else:
                 # Create new merchant
-                merchant = MerchantHelper.create_merchant(
+                merchant = await MerchantHelper.create_merchant(
                     db, clover_merchant_id,
                     name=merchant_data.get("name"),
                     email=merchant_data.get("email")
                 )
 
             # 2. Store/Update token
-            MerchantHelper.store_or_update_token(db, merchant.id, access_token)
+            await MerchantHelper.store_or_update_token(
+                db, merchant.id, access_token,
+                refresh_token=refresh_token,
+                expires_at=expires_at,
+                refresh_expires_at=refresh_expires_at
+            )
             print("Before merchat detail")
             # 3. Store/Update detailed information
-            MerchantHelper.store_or_update_merchant_details(db, clover_merchant_id, merchant_data)
+            await MerchantHelper.store_or_update_merchant_details(db, clover_merchant_id, merchant_data)
 
             return merchant.id
 
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             raise Exception(f"Failed to store merchant data: {str(e)}")
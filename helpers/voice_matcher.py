@@ -1,4 +1,5 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional, List
 from difflib import SequenceMatcher
 from models.conversation import AnswerMaster
@@ -9,8 +10,8 @@ def calculate_similarity(text1: str, text2: str) -> float:
     text2 = text2.lower().strip()
     return SequenceMatcher(None, text1, text2).ratio()
 
-def match_voice_to_answer(
-    db: Session,
+async def match_voice_to_answer(
+    db: AsyncSession,
     voice_text: str,
     question_key: str,
     threshold: float = 0.6
@@ -20,10 +21,13 @@ def match_voice_to_answer(
     Returns answer_key if match found, None otherwise
     """
     # Get all active answers for the question
-    answers = db.query(AnswerMaster).filter(
-        AnswerMaster.question_key == question_key,
-        AnswerMaster.is_active == True
-    ).all()
+    result = await db.execute(
+        select(AnswerMaster).where(
+            AnswerMaster.question_key == question_key,
+            AnswerMaster.is_active == True
+        )
+    )
+    answers = result.scalars().all()
 
     if not answers:
         return None
@@ -0,0 +1,126 @@
+# helpers/webhook_helper.py
+from sqlalchemy.orm import Session
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from models.webhook_event import CloverWebhookEvent
+from models.cart import Order
+
+
+class WebhookHelper:
+    """Helper class for the Clover webhook event log"""
+
+    @staticmethod
+    def log_events(db: Session, events: List[Dict[str, Any]]) -> List[int]:
+        """
+        Store parsed webhook events, skipping deliveries already logged.
+
+        Returns:
+            IDs of the newly stored events, in arrival order
+        """
+        if not events:
+            return []
+
+        seen = {
+            (e.clover_merchant_id, e.object_id, e.event_type, e.ts)
+            for e in db.query(CloverWebhookEvent).filter(
+                CloverWebhookEvent.object_id.in_({event["object_id"] for event in events})
+            ).all()
+        }
+
+        rows = []
+        for event in events:
+            key = (event["merchant_id"], event["object_id"], event["event_type"], event.get("ts"))
+            if key in seen:
+                continue
+            seen.add(key)
+            rows.append(CloverWebhookEvent(
+                clover_merchant_id=event["merchant_id"],
+                object_type=event["object_type"],
+                object_id=event["object_id"],
+                event_type=event["event_type"],
+                ts=event.get("ts"),
+                payload=event.get("payload"),
+                attempts=0
+            ))
+
+        db.add_all(rows)
+        db.commit()
+        return [row.id for row in rows]
+
+    @staticmethod
+    def get_event(db: Session, event_id: int) -> Optional[CloverWebhookEvent]:
+        return db.query(CloverWebhookEvent).filter(CloverWebhookEvent.id == event_id).first()
+
+    @staticmethod
+    def list_events(
+        db: Session,
+        merchant_id: Optional[str] = None,
+        since_id: Optional[int] = None,
+        only_failed: bool = False,
+        limit: int = 100
+    ) -> List[CloverWebhookEvent]:
+        """Logged events in arrival order, optionally filtered"""
+        query = db.query(CloverWebhookEvent)
+        if merchant_id:
+            query = query.filter(CloverWebhookEvent.clover_merchant_id == merchant_id)
+        if since_id:
+            query = query.filter(CloverWebhookEvent.id > since_id)
+        if only_failed:
+            query = query.filter(CloverWebhookEvent.last_error.isnot(None))
+        return query.order_by(CloverWebhookEvent.id).limit(limit).all()
+
+    @staticmethod
+    def mark_result(db: Session, event_id: int, error: Optional[str] = None) -> None:
+        """Record one attempt at applying an event"""
+        event = WebhookHelper.get_event(db, event_id)
+        if not event:
+            return
+        event.attempts = (event.attempts or 0) + 1
+        event.last_error = error[:2000] if error else None
+        if not error:
+            event.processed_at = datetime.now()
+        db.commit()
+
+    @staticmethod
+    def apply_clover_order(
+        db: Session,
+        merchant_id: str,
+        clover_order_id: str,
+        clover_order: Optional[Dict[str, Any]]
+    ) -> int:
+        """
+        Bring local orders linked to a Clover order in line with it.
+        A missing order (deleted in Clover) cancels them.
+
+        Returns:
+            Number of local orders touched
+        """
+        orders = db.query(Order).filter(
+            Order.clover_merchant_id == merchant_id,
+            Order.clover_order_id == clover_order_id
+        ).all()
+
+        for order in orders:
+            if clover_order is None:
+                order.status = "cancelled"
+            elif (clover_order.get("paymentState") or "").upper() == "PAID":
+                order.payment_status = "paid"
+            order.synced_at = datetime.now()
+
+        db.commit()
+        return len(orders)
+
+    @staticmethod
+    def to_dict(event: CloverWebhookEvent) -> Dict[str, Any]:
+        return {
+            "id": event.id,
+            "merchant_id": event.clover_merchant_id,
+            "object_type": event.object_type,
+            "object_id": event.object_id,
+            "event_type": event.event_type,
+            "ts": event.ts,
+            "received_at": event.received_at,
+            "processed_at": event.processed_at,
+            "attempts": event.attempts,
+            "last_error": event.last_error
+        }
@@ -7,7 +7,10 @@ from app.routes.userCart import router as userCart
 from app.routes.clover_data import router as clover_data_router, merchant_router as clover_merchant_router
 from app.routes.cart import router as cart_router
 from app.routes.clover_cart import router as clover_cart_router
+from app.routes.clover_webhooks import router as clover_webhooks_router
+from app.routes.fake_clover_oauth import FAKE_CLOVER_OAUTH_ENABLED, router as fake_clover_oauth_router
 import os
+from contextlib import asynccontextmanager
 from urllib.parse import urlencode
 import secrets
 from typing import Optional,Dict, Any
@@ -15,15 +18,30 @@ from datetime import datetime
 import httpx
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
-from database.database import get_db, Base, engine
+from sqlalchemy.ext.asyncio import AsyncSession
+from database.database import get_db, get_async_db, Base, engine, async_engine, async_read_engine
 from helpers.merchant_helper import MerchantHelper
 from models.merchant_token import MerchantToken
+from services.clover_client import clover_client
+from services.active_carts import active_carts
+from services.cart_expiry import cart_expiry_sweeper
+from services.cart_totals import cart_totals_verifier
+from services.catalog_sync import catalog_sync_worker
+from services.category_menu import category_menu_cache
+from services.menu_snapshot import menu_snapshots
+from services.response_cache import response_cache
+from services.stock_snapshot import stock_snapshots
+from services.token_cache import merchant_token_cache
+from services.token_refresh import parse_token_response, token_refresh_manager
 from fastapi.middleware.cors import CORSMiddleware
+from utils.compression import CompressionMiddleware
+from utils.json_response import FastJSONResponse
 from app.routes import question_master
 from routers.router import api_router
 from routers import users, pizzas, ai, auth, recommendations
 from routers import recommendations, users
 from app.routes import merchants
+from app.routes import metrics
 
 
 from utils.merchant_extractor import (
@@ -61,8 +79,41 @@ merchant_tokens: Dict[str, str] = {}
 class MerchantToken(BaseModel):
     merchant_id: str
     access_token: str
-
-app = FastAPI(title="Pizza API", version="1.0.0")
+    # From the OAuth token response; lets the token be refreshed before it expires
+    refresh_token: Optional[str] = None
+    access_token_expiration: Optional[int] = None
+    refresh_token_expiration: Optional[int] = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open shared resources on startup and release them on shutdown"""
+    await clover_client.start()
+    catalog_sync_worker.start()
+    token_refresh_manager.start()
+    stock_snapshots.start()
+    cart_totals_verifier.start()
+    active_carts.start()
+    cart_expiry_sweeper.start()
+    yield
+    await cart_expiry_sweeper.stop()
+    # Writes the carts still dirty, so it runs while the engines are open
+    await active_carts.stop()
+    await cart_totals_verifier.stop()
+    await stock_snapshots.stop()
+    await token_refresh_manager.stop()
+    await catalog_sync_worker.stop()
+    await clover_client.close()
+    await async_engine.dispose()
+    if async_read_engine is not async_engine:
+        await async_read_engine.dispose()
+
+app = FastAPI(
+    title="Pizza API",
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse,
+)
+app.add_middleware(CompressionMiddleware)
 
 # Include routers (this connects all your route files)
 # app.include_router(pizzas.router, prefix="/api", tags=["pizzas"])
@@ -74,12 +125,16 @@ app.include_router(clover_data_router)
 app.include_router(clover_merchant_router)
 app.include_router(cart_router)
 app.include_router(clover_cart_router)
+app.include_router(clover_webhooks_router)
 app.include_router(question_master.router)
 app.include_router(api_router)
 app.include_router(users.router, prefix="/users", tags=["Users"])
 app.include_router(recommendations.router)
 app.include_router(recommendations.router, prefix="/users", tags=["recommendations"])
 app.include_router(merchants.router, prefix="/api", tags=["merchants"])
+app.include_router(metrics.router)
+if FAKE_CLOVER_OAUTH_ENABLED:
+    app.include_router(fake_clover_oauth_router)
 
 @app.get("/")
 def read_root():
@@ -96,27 +151,22 @@ async def get_merchant_details():
         )
 
     # Call Clover API
-    url = f"{CLOVER_BASE_URL}/v3/merchants/{CLOVER_MERCHANT_ID}"
-    headers = {
-        "Authorization": f"Bearer {CLOVER_ACCESS_TOKEN}",
-        "Content-Type": "application/json"
-    }
+    url = f"/v3/merchants/{CLOVER_MERCHANT_ID}"
 
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(url, headers=headers)
-            response.raise_for_status()
+    try:
+        response = await clover_client.get(url, access_token=CLOVER_ACCESS_TOKEN)
+        response.raise_for_status()
 
-            return {
-                "success": True,
-                "data": response.json()
-            }
+        return {
+            "success": True,
+            "data": response.json()
+        }
 
-        except httpx.HTTPStatusError as e:
-            raise HTTPException(
-                status_code=e.response.status_code,
-                detail=f"Clover API error: {e.response.text}"
-            )
+    except httpx.HTTPStatusError as e:
+        raise HTTPException(
+            status_code=e.response.status_code,
+            detail=f"Clover API error: {e.response.text}"
+        )
 
 @app.get("/merchant/properties")
 async def get_merchant_properties():
@@ -125,27 +175,22 @@ async def get_merchant_properties():
     if not CLOVER_ACCESS_TOKEN or not CLOVER_MERCHANT_ID:
         raise HTTPException(status_code=500, detail="Clover credentials not configured")
 
-    url = f"{CLOVER_BASE_URL}/v3/merchants/{CLOVER_MERCHANT_ID}/properties"
-    headers = {
-        "Authorization": f"Bearer {CLOVER_ACCESS_TOKEN}",
-        "Content-Type": "application/json"
-    }
+    url = f"/v3/merchants/{CLOVER_MERCHANT_ID}/properties"
 
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(url, headers=headers)
-            response.raise_for_status()
+    try:
+        response = await clover_client.get(url, access_token=CLOVER_ACCESS_TOKEN)
+        response.raise_for_status()
 
-            return {
-                "success": True,
-                "data": response.json()
-            }
+        return {
+            "success": True,
+            "data": response.json()
+        }
 
-        except httpx.HTTPStatusError as e:
-            raise HTTPException(
-                status_code=e.response.status_code,
-                detail=f"Clover API error: {e.response.text}"
-            )
+    except httpx.HTTPStatusError as e:
+        raise HTTPException(
+            status_code=e.response.status_code,
+            detail=f"Clover API error: {e.response.text}"
+        )
 
 
 async def store_merchant_in_db(
@@ -271,6 +316,7 @@ async def store_merchant_in_db(
         )
 
     db.commit()
+    merchant_token_cache.invalidate(clover_merchant_id)
     return merchant_id
 
 
@@ -374,73 +420,72 @@ async def store_merchant_in_db(
 #             )
 
 @app.post("/merchants/add")
-async def add_merchant_token(merchant: MerchantToken, db: Session = Depends(get_db)):
+async def add_merchant_token(merchant: MerchantToken, db: AsyncSession = Depends(get_async_db)):
     """Add a merchant and their access token with database storage"""
 
     # Test if the token works first
-    url = f"{CLOVER_BASE_URL}/v3/merchants/{merchant.merchant_id}"
-    headers = {
-        "Authorization": f"Bearer {merchant.access_token}",
-        "Content-Type": "application/json"
-    }
-
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(url, headers=headers)
-            response.raise_for_status()
-            merchant_data = response.json()
-
-            # DEBUG: Print the merchant data structure
-            # print("=== MERCHANT DATA DEBUG ===")
-            # print(f"Full merchant_data type: {type(merchant_data)}")
-            # print(f"Full merchant_data: {merchant_data}")
-
-            # Check each field and its type
-            for key, value in merchant_data.items():
-                print(f"Field '{key}': Type={type(value).__name__}, Value={repr(value)}")
-                if isinstance(value, dict):
-                    print(f"  -> DICT DETECTED in field '{key}': {value}")
-                elif isinstance(value, list):
-                    print(f"  -> LIST DETECTED in field '{key}': {value}")
-
-            # Validate the response
-            if not validate_merchant_response(merchant_data):
-                raise HTTPException(status_code=400, detail="Invalid merchant data received")
-
-
-            # Store in database using helper (this is where the error occurs)
-            merchant_id = MerchantHelper.store_complete_merchant_data(
-                db,
-                merchant.merchant_id,
-                merchant_data,
-                merchant.access_token
-            )
+    url = f"/v3/merchants/{merchant.merchant_id}"
+
+    try:
+        response = await clover_client.get(url, access_token=merchant.access_token)
+        response.raise_for_status()
+        merchant_data = response.json()
+
+        # DEBUG: Print the merchant data structure
+        # print("=== MERCHANT DATA DEBUG ===")
+        # print(f"Full merchant_data type: {type(merchant_data)}")
+        # print(f"Full merchant_data: {merchant_data}")
+
+        # Check each field and its type
+        for key, value in merchant_data.items():
+            print(f"Field '{key}': Type={type(value).__name__}, Value={repr(value)}")
+            if isinstance(value, dict):
+                print(f"  -> DICT DETECTED in field '{key}': {value}")
+            elif isinstance(value, list):
+                print(f"  -> LIST DETECTED in field '{key}': {value}")
+
+        # Validate the response
+        if not validate_merchant_response(merchant_data):
+            raise HTTPException(status_code=400, detail="Invalid merchant data received")
+
+
+        # Store in database using helper (this is where the error occurs)
+        token = parse_token_response(merchant.model_dump())
+        merchant_id = await MerchantHelper.store_complete_merchant_data(
+            db,
+            merchant.merchant_id,
+            merchant_data,
+            merchant.access_token,
+            refresh_token=token["refresh_token"],
+            expires_at=token["expires_at"],
+            refresh_expires_at=token["refresh_expires_at"]
+        )
 
-            # Extract clean merchant summary for response
-            summary = get_merchant_summary(merchant_data)
+        # Extract clean merchant summary for response
+        summary = get_merchant_summary(merchant_data)
 
-            # Get total merchants count
-            total_count = MerchantHelper.get_total_merchants_count(db)
+        # Get total merchants count
+        total_count = await MerchantHelper.get_total_merchants_count(db)
 
-            return {
-                "success": True,
-                "message": f"✅ Merchant {merchant.merchant_id} added successfully",
-                "merchant_info": summary,
-                "database_id": merchant_id,
-                "total_merchants": total_count
-            }
+        return {
+            "success": True,
+            "message": f"✅ Merchant {merchant.merchant_id} added successfully",
+            "merchant_info": summary,
+            "database_id": merchant_id,
+            "total_merchants": total_count
+        }
 
-        except httpx.HTTPStatusError as e:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Invalid token for merchant {merchant.merchant_id}: {e.response.text}"
-            )
-        except Exception as e:
-            print(f"Full error details: {str(e)}")
-            raise HTTPException(
-                status_code=500,
-                detail=f"Database error: {str(e)}"
-            )
+    except httpx.HTTPStatusError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid token for merchant {merchant.merchant_id}: {e.response.text}"
+        )
+    except Exception as e:
+        print(f"Full error details: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Database error: {str(e)}"
+        )
 
 
 # @app.get("/inventory/items")
@@ -475,13 +520,18 @@ async def add_merchant_token(merchant: MerchantToken, db: Session = Depends(get_
 
 
 @app.get("/merchants/{clover_merchant_id}/token")
-async def get_merchant_token(clover_merchant_id: str, db: Session = Depends(get_db)):
+async def get_merchant_token(clover_merchant_id: str, db: AsyncSession = Depends(get_async_db)):
     """Get merchant access token"""
-    token = MerchantHelper.get_merchant_token(db, clover_merchant_id)
+    await _merchant_access_token(db, clover_merchant_id)
+    return {"merchant_id": clover_merchant_id, "has_token": True}
+
+
+async def _merchant_access_token(db: AsyncSession, merchant_id: str) -> str:
+    """The merchant's Clover access token; 404 if there is none"""
+    token = await MerchantHelper.get_merchant_token(db, merchant_id)
     if not token:
         raise HTTPException(status_code=404, detail="Merchant token not found")
-
-    return {"merchant_id": clover_merchant_id, "has_token": True}
+    return token
 
 
 # def get_merchant_token(merchant_id: str) -> str:
@@ -494,125 +544,121 @@ async def get_merchant_token(clover_merchant_id: str, db: Session = Depends(get_
 #     return merchant_tokens[merchant_id]
 
 @app.get("/merchants/{merchant_id}")
-async def get_merchant_details_endpoint(merchant_id: str = Path(..., description="Merchant ID")):
+async def get_merchant_details_endpoint(
+    merchant_id: str = Path(..., description="Merchant ID"),
+    db: AsyncSession = Depends(get_async_db)
+):
     """Get merchant details for specific merchant"""
 
-    access_token = await get_merchant_token(merchant_id)
+    access_token = await _merchant_access_token(db, merchant_id)
 
-    url = f"{CLOVER_BASE_URL}/v3/merchants/{merchant_id}"
-    headers = {
-        "Authorization": f"Bearer {access_token}",
-        "Content-Type": "application/json"
-    }
+    url = f"/v3/merchants/{merchant_id}"
 
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(url, headers=headers)
-            response.raise_for_status()
-            raw_data = response.json()
+    try:
+        response = await clover_client.get(url, access_token=access_token)
+        response.raise_for_status()
+        raw_data = response.json()
 
-            # Extract only relevant merchant details using our utility function
-            cleaned_data = extract_merchant_details(raw_data)
+        # Extract only relevant merchant details using our utility function
+        cleaned_data = extract_merchant_details(raw_data)
 
-            return {
-                "success": True,
-                "merchant_id": merchant_id,
-                "merchant_details": cleaned_data
-            }
+        return {
+            "success": True,
+            "merchant_id": merchant_id,
+            "merchant_details": cleaned_data
+        }
 
-        except httpx.HTTPStatusError as e:
-            raise HTTPException(
-                status_code=e.response.status_code,
-                detail=f"Clover API error for merchant {merchant_id}: {e.response.text}"
-            )
+    except httpx.HTTPStatusError as e:
+        raise HTTPException(
+            status_code=e.response.status_code,
+            detail=f"Clover API error for merchant {merchant_id}: {e.response.text}"
+        )
 
 @app.get("/merchants/{merchant_id}/inventory/items")
 async def get_inventory_items(
     merchant_id: str = Path(..., description="Merchant ID"),
-    limit: Optional[int] = 100
+    limit: Optional[int] = 100,
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get inventory items for specific merchant"""
 
-    access_token = get_merchant_token(merchant_id)
+    access_token = await _merchant_access_token(db, merchant_id)
 
-    url = f"{CLOVER_BASE_URL}/v3/merchants/{merchant_id}/items"
+    url = f"/v3/merchants/{merchant_id}/items"
     params = {"limit": limit}
-    headers = {
-        "Authorization": f"Bearer {access_token}",
-        "Content-Type": "application/json"
-    }
 
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(url, headers=headers, params=params)
-            response.raise_for_status()
-            raw_data = response.json()
+    try:
+        response = await clover_client.get(url, access_token=access_token, params=params)
+        response.raise_for_status()
+        raw_data = response.json()
 
-            # Extract and clean inventory data
-            cleaned_data = extract_inventory_items(raw_data)
+        # Extract and clean inventory data
+        cleaned_data = extract_inventory_items(raw_data)
 
-            return {
-                "success": True,
-                "merchant_id": merchant_id,
-                "inventory": cleaned_data
-            }
+        return {
+            "success": True,
+            "merchant_id": merchant_id,
+            "inventory": cleaned_data
+        }
 
-        except httpx.HTTPStatusError as e:
-            raise HTTPException(
-                status_code=e.response.status_code,
-                detail=f"Clover API error for merchant {merchant_id}: {e.response.text}"
-            )
+    except httpx.HTTPStatusError as e:
+        raise HTTPException(
+            status_code=e.response.status_code,
+            detail=f"Clover API error for merchant {merchant_id}: {e.response.text}"
+        )
 
 @app.get("/merchants/{merchant_id}/orders")
 async def get_orders(
     merchant_id: str = Path(..., description="Merchant ID"),
-    limit: Optional[int] = 100
+    limit: Optional[int] = 100,
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get orders for specific merchant"""
 
-    access_token = get_merchant_token(merchant_id)
+    access_token = await _merchant_access_token(db, merchant_id)
 
-    url = f"{CLOVER_BASE_URL}/v3/merchants/{merchant_id}/orders"
+    url = f"/v3/merchants/{merchant_id}/orders"
     params = {"limit": limit}
-    headers = {
-        "Authorization": f"Bearer {access_token}",
-        "Content-Type": "application/json"
-    }
 
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(url, headers=headers, params=params)
-            response.raise_for_status()
-            raw_data = response.json()
+    try:
+        response = await clover_client.get(url, access_token=access_token, params=params)
+        response.raise_for_status()
+        raw_data = response.json()
 
-            # Extract and clean orders data
-            cleaned_data = extract_orders(raw_data)
+        # Extract and clean orders data
+        cleaned_data = extract_orders(raw_data)
 
-            return {
-                "success": True,
-                "merchant_id": merchant_id,
-                "orders": cleaned_data
-            }
+        return {
+            "success": True,
+            "merchant_id": merchant_id,
+            "orders": cleaned_data
+        }
 
-        except httpx.HTTPStatusError as e:
-            raise HTTPException(
-                status_code=e.response.status_code,
-                detail=f"Clover API error for merchant {merchant_id}: {e.response.text}"
-            )
+    except httpx.HTTPStatusError as e:
+        raise HTTPException(
+            status_code=e.response.status_code,
+            detail=f"Clover API error for merchant {merchant_id}: {e.response.text}"
+        )
 
 @app.delete("/merchants/{merchant_id}")
-async def remove_merchant(merchant_id: str = Path(..., description="Merchant ID")):
+async def remove_merchant(
+    merchant_id: str = Path(..., description="Merchant ID"),
+    db: AsyncSession = Depends(get_async_db)
+):
     """Remove merchant and their token"""
 
-    if merchant_id not in merchant_tokens:
+    if not await MerchantHelper.delete_merchant(db, merchant_id):
         raise HTTPException(status_code=404, detail=f"Merchant {merchant_id} not found")
 
-    del merchant_tokens[merchant_id]
+    response_cache.invalidate_merchant(merchant_id)
+    category_menu_cache.invalidate(merchant_id)
+    stock_snapshots.invalidate(merchant_id)
+    menu_snapshots.purge(merchant_id)
 
     return {
         "success": True,
         "message": f"Merchant {merchant_id} removed successfully",
-        "remaining_merchants": len(merchant_tokens)
+        "remaining_merchants": await MerchantHelper.get_total_merchants_count(db)
     }
 
 if __name__ == "__main__":
@@ -626,28 +672,23 @@ async def get_orders(limit: Optional[int] = 100):
     if not CLOVER_ACCESS_TOKEN or not CLOVER_MERCHANT_ID:
         raise HTTPException(status_code=500, detail="Clover credentials not configured")
 
-    url = f"{CLOVER_BASE_URL}/v3/merchants/{CLOVER_MERCHANT_ID}/orders"
+    url = f"/v3/merchants/{CLOVER_MERCHANT_ID}/orders"
     params = {"limit": limit}
-    headers = {
-        "Authorization": f"Bearer {CLOVER_ACCESS_TOKEN}",
-        "Content-Type": "application/json"
-    }
 
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(url, headers=headers, params=params)
-            response.raise_for_status()
+    try:
+        response = await clover_client.get(url, access_token=CLOVER_ACCESS_TOKEN, params=params)
+        response.raise_for_status()
 
-            return {
-                "success": True,
-                "data": response.json()
-            }
+        return {
+            "success": True,
+            "data": response.json()
+        }
 
-        except httpx.HTTPStatusError as e:
-            raise HTTPException(
-                status_code=e.response.status_code,
-                detail=f"Clover API error: {e.response.text}"
-            )
+    except httpx.HTTPStatusError as e:
+        raise HTTPException(
+            status_code=e.response.status_code,
+            detail=f"Clover API error: {e.response.text}"
+        )
 
 @app.post("/orders")
 async def create_order(order_data: dict):
@@ -656,29 +697,24 @@ async def create_order(order_data: dict):
     if not CLOVER_ACCESS_TOKEN or not CLOVER_MERCHANT_ID:
         raise HTTPException(status_code=500, detail="Clover credentials not configured")
 
-    url = f"{CLOVER_BASE_URL}/v3/merchants/{CLOVER_MERCHANT_ID}/orders"
-    headers = {
-        "Authorization": f"Bearer {CLOVER_ACCESS_TOKEN}",
-        "Content-Type": "application/json"
-    }
+    url = f"/v3/merchants/{CLOVER_MERCHANT_ID}/orders"
 
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.post(url, headers=headers, json=order_data)
-            response.raise_for_status()
+    try:
+        response = await clover_client.post(url, access_token=CLOVER_ACCESS_TOKEN, json=order_data)
+        response.raise_for_status()
 
-            return {
-                "success": True,
-                "data": response.json()
-            }
+        return {
+            "success": True,
+            "data": response.json()
+        }
 
-        except httpx.HTTPStatusError as e:
-            raise HTTPException(
-                status_code=e.response.status_code,
-                detail=f"Clover API error: {e.response.text}"
-            )
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
+    except httpx.HTTPStatusError as e:
+        raise HTTPException(
+            status_code=e.response.status_code,
+            detail=f"Clover API error: {e.response.text}"
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
 
 @app.get("/test-connection")
 async def test_clover_connection():
@@ -695,31 +731,26 @@ async def test_clover_connection():
         }
 
     # Test connection
-    url = f"{CLOVER_BASE_URL}/v3/merchants/{CLOVER_MERCHANT_ID}"
-    headers = {
-        "Authorization": f"Bearer {CLOVER_ACCESS_TOKEN}",
-        "Content-Type": "application/json"
-    }
+    url = f"/v3/merchants/{CLOVER_MERCHANT_ID}"
 
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(url, headers=headers)
-            response.raise_for_status()
+    try:
+        response = await clover_client.get(url, access_token=CLOVER_ACCESS_TOKEN)
+        response.raise_for_status()
 
-            return {
-                "success": True,
-                "message": "✅ Clover connection working!",
-                "merchant_id": CLOVER_MERCHANT_ID,
-                "token_status": "Valid"
-            }
+        return {
+            "success": True,
+            "message": "✅ Clover connection working!",
+            "merchant_id": CLOVER_MERCHANT_ID,
+            "token_status": "Valid"
+        }
 
-        except httpx.HTTPStatusError as e:
-            return {
-                "success": False,
-                "message": "❌ Clover connection failed",
-                "error": e.response.text,
-                "status_code": e.response.status_code
-            }
+    except httpx.HTTPStatusError as e:
+        return {
+            "success": False,
+            "message": "❌ Clover connection failed",
+            "error": e.response.text,
+            "status_code": e.response.status_code
+        }
 
 @app.get("/health", tags=["Root"])
 async def health_check():
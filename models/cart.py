@@ -1,5 +1,5 @@
 # models/cart.py
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Text, Float, Boolean, func
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Text, Float, Boolean, Index, func
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from database.database import Base
@@ -7,6 +7,11 @@ from database.database import Base
 
 class Cart(Base):
     __tablename__ = 'carts'
+    __table_args__ = (
+        # The session lookup and the expiry sweep
+        Index('ix_carts_session_id_status', 'session_id', 'status'),
+        Index('ix_carts_status_expires_at', 'status', 'expires_at'),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     clover_merchant_id = Column(String(64), nullable=False)
@@ -16,11 +21,13 @@ class Cart(Base):
     status = Column(String(20), default="active")  # active, converted, abandoned
     subtotal = Column(Float, default=0.0)
     total_amount = Column(Float, default=0.0)
+    # Bumped by every change; writers compare-and-swap on it instead of locking the row
+    version = Column(Integer, nullable=False, default=0, server_default="0")
 
     # Timestamps
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, onupdate=func.now())
-    expires_at = Column(DateTime, nullable=True)
+    expires_at = Column(DateTime, nullable=True)  # pushed back on every change; see services/cart_expiry.py
 
     # Relationships
     items = relationship("CartItem", back_populates="cart", cascade="all, delete-orphan")
@@ -166,3 +173,33 @@ class OrderItemModifier(Base):
 
     # Relationships
     order_item = relationship("OrderItem", back_populates="modifiers")
+
+
+class OrderSubmission(Base):
+    """
+    Progress of pushing one cart to Clover as an order. Each finished step
+    is recorded so a retry resumes where the last attempt stopped.
+    """
+    __tablename__ = 'order_submissions'
+
+    id = Column(Integer, primary_key=True, index=True)
+    cart_id = Column(Integer, ForeignKey('carts.id'), nullable=False, unique=True)
+    clover_merchant_id = Column(String(64), nullable=False)
+
+    # Prefix of the Idempotency-Key sent with every Clover write
+    idempotency_key = Column(String(64), nullable=False, unique=True)
+
+    # pending -> order_created -> line_items_synced -> modifiers_synced -> completed
+    step = Column(String(32), default="pending")
+    clover_order_id = Column(String(64), nullable=True)
+    line_item_ids = Column(Text, nullable=True)      # JSON {cart_item_id: clover_line_item_id}
+    modification_ids = Column(Text, nullable=True)   # JSON {cart_item_modifier_id: clover_modification_id}
+
+    attempts = Column(Integer, default=0)
+    last_error = Column(Text, nullable=True)
+
+    created_at = Column(DateTime, server_default=func.now())
+    updated_at = Column(DateTime, onupdate=func.now())
+    completed_at = Column(DateTime, nullable=True)
+
+    cart = relationship("Cart")
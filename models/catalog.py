@@ -0,0 +1,147 @@
+# models/catalog.py
+from sqlalchemy import Column, Integer, BigInteger, String, ForeignKey, DateTime, Text, Boolean, UniqueConstraint, Index, func
+from sqlalchemy.orm import relationship
+from database.database import Base
+
+
+# Local mirror of the Clover catalog, kept current by services/catalog_sync.py.
+# Clover IDs are unique per merchant, so every table is keyed by
+# (clover_merchant_id, clover_*_id). Prices stay in cents as Clover sends them.
+
+
+class CatalogItem(Base):
+    __tablename__ = 'catalog_items'
+    __table_args__ = (
+        UniqueConstraint('clover_merchant_id', 'clover_item_id', name='uq_catalog_items_merchant_item'),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    clover_merchant_id = Column(String(64), nullable=False, index=True)
+    clover_item_id = Column(String(64), nullable=False)
+
+    name = Column(String(255), nullable=False)
+    price = Column(BigInteger, default=0)  # cents
+    price_type = Column(String(32), nullable=True)
+    sku = Column(String(128), nullable=True)
+    hidden = Column(Boolean, default=False)
+    available = Column(Boolean, default=True)
+
+    # Clover modifiedTime (epoch ms) of the version we hold
+    modified_time = Column(BigInteger, nullable=True)
+    synced_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+    variants = relationship("CatalogVariant", back_populates="item", cascade="all, delete-orphan")
+    category_links = relationship("CatalogItemCategory", back_populates="item", cascade="all, delete-orphan")
+
+
+class CatalogVariant(Base):
+    __tablename__ = 'catalog_item_variants'
+    __table_args__ = (
+        UniqueConstraint('item_id', 'clover_variant_id', name='uq_catalog_variants_item_variant'),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    item_id = Column(Integer, ForeignKey('catalog_items.id', ondelete='CASCADE'), nullable=False, index=True)
+    clover_variant_id = Column(String(64), nullable=False)
+    name = Column(String(255), nullable=True)
+    price = Column(BigInteger, default=0)  # cents
+
+    item = relationship("CatalogItem", back_populates="variants")
+
+
+class CatalogCategory(Base):
+    __tablename__ = 'catalog_categories'
+    __table_args__ = (
+        UniqueConstraint('clover_merchant_id', 'clover_category_id', name='uq_catalog_categories_merchant_category'),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    clover_merchant_id = Column(String(64), nullable=False, index=True)
+    clover_category_id = Column(String(64), nullable=False)
+    name = Column(String(255), nullable=False)
+    sort_order = Column(Integer, nullable=True)
+
+    modified_time = Column(BigInteger, nullable=True)
+    synced_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+
+class CatalogItemCategory(Base):
+    __tablename__ = 'catalog_item_categories'
+    __table_args__ = (
+        Index('ix_catalog_item_categories_merchant_category', 'clover_merchant_id', 'clover_category_id'),
+    )
+
+    item_id = Column(Integer, ForeignKey('catalog_items.id', ondelete='CASCADE'), primary_key=True)
+    clover_category_id = Column(String(64), primary_key=True)
+    clover_merchant_id = Column(String(64), nullable=False)
+
+    item = relationship("CatalogItem", back_populates="category_links")
+
+
+class CatalogModifierGroup(Base):
+    __tablename__ = 'catalog_modifier_groups'
+    __table_args__ = (
+        UniqueConstraint('clover_merchant_id', 'clover_modifier_group_id', name='uq_catalog_modifier_groups_merchant_group'),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    clover_merchant_id = Column(String(64), nullable=False, index=True)
+    clover_modifier_group_id = Column(String(64), nullable=False)
+    name = Column(String(255), nullable=False)
+    min_required = Column(Integer, nullable=True)
+    max_allowed = Column(Integer, nullable=True)
+    show_by_default = Column(Boolean, default=True)
+
+    modified_time = Column(BigInteger, nullable=True)
+    synced_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+    modifiers = relationship("CatalogModifier", back_populates="group", cascade="all, delete-orphan")
+
+
+class CatalogModifier(Base):
+    __tablename__ = 'catalog_modifiers'
+    __table_args__ = (
+        UniqueConstraint('group_id', 'clover_modifier_id', name='uq_catalog_modifiers_group_modifier'),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    group_id = Column(Integer, ForeignKey('catalog_modifier_groups.id', ondelete='CASCADE'), nullable=False, index=True)
+    clover_modifier_id = Column(String(64), nullable=False)
+    name = Column(String(255), nullable=False)
+    price = Column(BigInteger, default=0)  # cents
+    available = Column(Boolean, default=True)
+
+    group = relationship("CatalogModifierGroup", back_populates="modifiers")
+
+
+class CatalogItemStock(Base):
+    __tablename__ = 'catalog_item_stocks'
+    __table_args__ = (
+        UniqueConstraint('clover_merchant_id', 'clover_item_id', name='uq_catalog_item_stocks_merchant_item'),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    clover_merchant_id = Column(String(64), nullable=False, index=True)
+    clover_item_id = Column(String(64), nullable=False)
+    quantity = Column(Integer, nullable=True)
+    stock_count = Column(BigInteger, nullable=True)
+
+    modified_time = Column(BigInteger, nullable=True)
+    synced_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+
+class CatalogSyncState(Base):
+    __tablename__ = 'catalog_sync_state'
+    __table_args__ = (
+        UniqueConstraint('clover_merchant_id', 'entity', name='uq_catalog_sync_state_merchant_entity'),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    clover_merchant_id = Column(String(64), nullable=False)
+    entity = Column(String(32), nullable=False)  # items, categories, modifier_groups, item_stocks
+
+    # Highest Clover modifiedTime seen; the next delta asks for anything newer
+    last_modified_time = Column(BigInteger, nullable=True)
+    last_synced_at = Column(DateTime, nullable=True)
+    last_full_sync_at = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
@@ -13,6 +13,11 @@ class MerchantToken(Base):
     merchant_id = Column(Integer, ForeignKey('merchants.id'), nullable=False)
     token = Column(Text, nullable=False)
     token_type = Column(String(100), default="api")
+    # OAuth refresh token and expiries (UTC); NULL for tokens added by hand
+    refresh_token = Column(Text, nullable=True)
+    expires_at = Column(DateTime, nullable=True, index=True)
+    refresh_expires_at = Column(DateTime, nullable=True)
+    refreshed_at = Column(DateTime, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
 
     merchant = relationship("Merchant", back_populates="tokens")
@@ -0,0 +1,29 @@
+# models/webhook_event.py
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, Text, UniqueConstraint, Index, func
+from database.database import Base
+
+
+class CloverWebhookEvent(Base):
+    """
+    One Clover change notification, as received. Rows are kept after they
+    are applied so any range of events can be replayed locally.
+    """
+    __tablename__ = 'clover_webhook_events'
+    __table_args__ = (
+        # Clover retries deliveries; the same change is only logged once
+        UniqueConstraint('clover_merchant_id', 'object_id', 'event_type', 'ts', name='uq_clover_webhook_events_delivery'),
+        Index('ix_clover_webhook_events_merchant_received', 'clover_merchant_id', 'received_at'),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    clover_merchant_id = Column(String(64), nullable=False)
+    object_type = Column(String(8), nullable=False)    # I, IC, IG, IM, O, M, ...
+    object_id = Column(String(128), nullable=False)    # Clover objectId, e.g. "I:ABC123"
+    event_type = Column(String(16), nullable=False)    # CREATE, UPDATE, DELETE
+    ts = Column(BigInteger, nullable=True)             # Clover event time (epoch ms)
+
+    payload = Column(Text, nullable=True)
+    received_at = Column(DateTime, server_default=func.now())
+    processed_at = Column(DateTime, nullable=True)
+    attempts = Column(Integer, default=0)
+    last_error = Column(Text, nullable=True)
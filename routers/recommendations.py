@@ -63,7 +63,7 @@
 
 from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
-from database.database import get_db
+from database.database import get_db, get_read_db
 import models.recommendations as models
 import schemas.recommendations as schemas
 from models import user as user_model
@@ -84,7 +84,7 @@ def create_recommendation(rec: schemas.RecommendationCreate, db: Session = Depen
 
 # Get all recommendations
 @router.get("/", response_model=list[schemas.RecommendationResponse])
-def get_recommendations(db: Session = Depends(get_db)):
+def get_recommendations(db: Session = Depends(get_read_db)):
     return db.query(models.Recommendation).all()
 
 @router.put("/{user_id}/recommendations/", response_model=recommendation_schema.Recommendation)
@@ -0,0 +1,592 @@
+# services/active_carts.py
+import asyncio
+import os
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from dotenv import load_dotenv
+from fastapi import HTTPException
+
+from database.database import AsyncSessionLocal
+from helpers.cart_helper import CartHelper, CartVersionConflict
+from models.cart import Cart
+from services.cart_events import cart_events
+from services.cart_store import CartStore, Document, cart_store
+from services.catalog_sync import run_in_async_session
+from services.singleflight import SingleFlight
+from services.stock_snapshot import stock_snapshots
+
+load_dotenv()
+
+CART_STORE_FLUSH_SECONDS = float(os.getenv("CART_STORE_FLUSH_SECONDS", "5"))
+# Carts written per database transaction
+CART_STORE_FLUSH_BATCH = int(os.getenv("CART_STORE_FLUSH_BATCH", "100"))
+# How long a forced flush waits for a background flush of the same cart
+CART_STORE_LOCK_WAIT_SECONDS = float(os.getenv("CART_STORE_LOCK_WAIT_SECONDS", "10"))
+CART_STORE_LOCK_TTL_SECONDS = 30.0
+# A cart that failed to save this many passes in a row is left out of the
+# background flush for CART_STORE_PARK_SECONDS, so it cannot hold back others
+CART_STORE_PARK_AFTER_FAILURES = int(os.getenv("CART_STORE_PARK_AFTER_FAILURES", "5"))
+CART_STORE_PARK_SECONDS = float(os.getenv("CART_STORE_PARK_SECONDS", "300"))
+# Worker processes serving the app, as uvicorn and gunicorn read them
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY") or os.getenv("UVICORN_WORKERS") or "1")
+
+SUMMARY_FIELDS = (
+    "cart_id", "merchant_id", "session_id", "status", "subtotal", "total_amount",
+    "version", "items", "created_at", "updated_at",
+)
+
+
+def cart_document(summary: Dict[str, Any]) -> Document:
+    """A store document for a cart summary read from the database"""
+    return {
+        **summary,
+        "flushed_version": summary["version"],
+        "dirty": False,
+        # Lines and modifiers added since the last flush have negative ids;
+        # aliases keeps them resolvable after the flush gives them real ones
+        "next_temp_id": -1,
+        "aliases": {},
+    }
+
+
+def cart_summary(doc: Document) -> Dict[str, Any]:
+    return {field: doc[field] for field in SUMMARY_FIELDS}
+
+
+def version_conflict(summary: Optional[Dict[str, Any]]) -> HTTPException:
+    """409 for a write based on an outdated cart; carries the current cart so the client can redo it"""
+    return HTTPException(
+        status_code=409,
+        detail={"message": "Cart was changed by another request", "cart": summary},
+        headers={"ETag": cart_etag(summary)} if summary else None,
+    )
+
+
+def cart_etag(summary: Dict[str, Any]) -> str:
+    return f'"{summary["version"]}"'
+
+
+def parse_if_match(if_match: Optional[str]) -> Optional[int]:
+    """The cart version an If-Match header asks for; None for no precondition or *"""
+    if not if_match or if_match.strip() == "*":
+        return None
+    candidate = if_match.split(",")[0].strip()
+    if candidate.startswith("W/"):
+        candidate = candidate[2:]
+    try:
+        return int(candidate.strip('"'))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="If-Match must be a cart version ETag")
+
+
+def _temp_id(doc: Document) -> int:
+    temp_id = doc["next_temp_id"]
+    doc["next_temp_id"] = temp_id - 1
+    return temp_id
+
+
+def _find_item(doc: Document, cart_item_id: int) -> Optional[Dict[str, Any]]:
+    cart_item_id = doc["aliases"].get(str(cart_item_id), cart_item_id)
+    return next((item for item in doc["items"] if item["id"] == cart_item_id), None)
+
+
+def _find_item_by_clover_id(doc: Document, clover_item_id: str) -> Optional[Dict[str, Any]]:
+    return next((item for item in doc["items"] if item["clover_item_id"] == clover_item_id), None)
+
+
+def _check_stock(doc: Document, clover_item_id: str, quantity: int) -> None:
+    """409 if the stock snapshot has fewer than `quantity` of the item; unknown stock does not block"""
+    if stock_snapshots.available(doc["merchant_id"], clover_item_id, quantity) is False:
+        raise HTTPException(status_code=409, detail="Item is out of stock")
+
+
+def _require_item(doc: Document, cart_item_id: int) -> Dict[str, Any]:
+    item = _find_item(doc, cart_item_id)
+    if item is None:
+        raise HTTPException(status_code=404, detail="Cart item not found")
+    return item
+
+
+def _touch(doc: Document) -> None:
+    """Recompute totals and mark the document changed; tax and discounts are not applied yet"""
+    subtotal = 0.0
+    for item in doc["items"]:
+        modifier_total = sum(modifier["price"] or 0.0 for modifier in item["modifiers"])
+        subtotal += item["line_total"] + modifier_total * item["quantity"]
+    doc["subtotal"] = subtotal
+    doc["total_amount"] = subtotal
+    doc["updated_at"] = datetime.now().isoformat()
+    doc["version"] += 1
+    doc["dirty"] = True
+
+
+class CartOps:
+    """Cart mutations on a store document; each runs inside CartStore.update"""
+
+    find_item = staticmethod(_find_item)
+    find_item_by_clover_id = staticmethod(_find_item_by_clover_id)
+
+    @staticmethod
+    def add_item(
+        doc: Document,
+        clover_item_id: str,
+        name: str,
+        price: float,
+        quantity: int = 1,
+        notes: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        item = _find_item_by_clover_id(doc, clover_item_id)
+        # The line ends up with what the cart already holds plus this add
+        _check_stock(doc, clover_item_id, (item["quantity"] if item else 0) + quantity)
+        if item:
+            item["quantity"] += quantity
+            item["line_total"] = item["price"] * item["quantity"]
+            return item
+
+        item = {
+            "id": _temp_id(doc),
+            "clover_item_id": clover_item_id,
+            "name": name,
+            "price": price,
+            "quantity": quantity,
+            "line_total": price * quantity,
+            "notes": notes,
+            "modifiers": [],
+        }
+        doc["items"].append(item)
+        return item
+
+    @staticmethod
+    def update_quantity(doc: Document, cart_item_id: int, quantity: int) -> Optional[Dict[str, Any]]:
+        """The updated line, or None if a quantity of 0 or less removed it"""
+        item = _require_item(doc, cart_item_id)
+        if quantity <= 0:
+            doc["items"].remove(item)
+            return None
+        if quantity > item["quantity"]:
+            # Lowering a quantity is allowed even when stock has fallen below it
+            _check_stock(doc, item["clover_item_id"], quantity)
+        item["quantity"] = quantity
+        item["line_total"] = item["price"] * quantity
+        return item
+
+    @staticmethod
+    def remove_item(doc: Document, cart_item_id: int) -> None:
+        doc["items"].remove(_require_item(doc, cart_item_id))
+
+    @staticmethod
+    def add_modifier(
+        doc: Document,
+        cart_item_id: int,
+        clover_modifier_id: str,
+        clover_modifier_group_id: str,
+        name: str,
+        price: float = 0.0,
+    ) -> Dict[str, Any]:
+        modifier = {
+            "id": _temp_id(doc),
+            "clover_modifier_id": clover_modifier_id,
+            "clover_modifier_group_id": clover_modifier_group_id,
+            "name": name,
+            "price": price,
+        }
+        _require_item(doc, cart_item_id)["modifiers"].append(modifier)
+        return modifier
+
+    @staticmethod
+    def clear(doc: Document) -> None:
+        doc["items"] = []
+
+
+class ActiveCartService:
+    """
+    Write-back cache of active carts.
+
+    Active carts are loaded from the database once and then read and
+    changed in the cart store (services.cart_store); reads of cached carts
+    and every edit skip the database. A background task writes dirty carts
+    back in batches, CART_STORE_FLUSH_BATCH carts per transaction, every
+    CART_STORE_FLUSH_SECONDS. Anything that reads carts from the database
+    to act on them (checkout, Clover sync) calls flush() first. Carts that
+    are not active are always read from the database.
+    """
+
+    def __init__(self, store: CartStore = cart_store, interval: float = CART_STORE_FLUSH_SECONDS):
+        self.store = store
+        self.interval = interval
+        self._loads = SingleFlight()
+        self._task: Optional[asyncio.Task] = None
+        self.flushes = 0
+        self.carts_flushed = 0
+        self.flush_failures = 0
+        self.conflicts = 0
+        self.parked = 0
+        self.dropped_edits = 0
+        # cart id -> consecutive failed saves / monotonic time it is parked until
+        self._failures: Dict[int, int] = {}
+        self._parked_until: Dict[int, float] = {}
+        self.last_flush_ms: Optional[float] = None
+
+    # ---- reads ------------------------------------------------------------
+
+    async def _load(self, cart_id: int) -> Optional[Document]:
+        doc = await self.store.get(cart_id)
+        if doc is not None:
+            return doc
+        return await self._loads.do(cart_id, lambda: self._load_from_db(cart_id))
+
+    async def _load_from_db(self, cart_id: int) -> Optional[Document]:
+        summary = await run_in_async_session(CartHelper.get_cart_summary, cart_id)
+        if summary is None:
+            return None
+        doc = cart_document(summary)
+        if summary["status"] != "active":
+            return doc
+        return await self.store.add(doc)
+
+    async def get_summary(self, cart_id: int) -> Optional[Dict[str, Any]]:
+        doc = await self._load(cart_id)
+        return cart_summary(doc) if doc else None
+
+    async def get_by_session(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """The session's active cart"""
+        cart_id = await self.store.session_cart_id(session_id)
+        doc = await self.store.get(cart_id) if cart_id is not None else None
+        if doc and doc["status"] == "active" and doc["session_id"] == session_id:
+            return cart_summary(doc)
+
+        cart = await run_in_async_session(CartHelper.get_active_cart_by_session, session_id)
+        return await self.get_summary(cart.id) if cart else None
+
+    async def overlay(self, summaries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Replace database summaries of active carts with their unflushed versions"""
+        active = [s["cart_id"] for s in summaries if s["status"] == "active"]
+        docs = {doc["cart_id"]: doc for doc in await self.store.get_many(active) if doc}
+        return [cart_summary(docs[s["cart_id"]]) if s["cart_id"] in docs else s for s in summaries]
+
+    # ---- writes -----------------------------------------------------------
+
+    async def adopt(self, cart: Cart) -> None:
+        """Start caching a cart that was just created, without reading it back"""
+        now = datetime.now().isoformat()
+        await self.store.add(cart_document({
+            "cart_id": cart.id,
+            "merchant_id": cart.clover_merchant_id,
+            "session_id": cart.session_id,
+            "status": cart.status,
+            "subtotal": cart.subtotal or 0.0,
+            "total_amount": cart.total_amount or 0.0,
+            "version": cart.version or 0,
+            "items": [],
+            "created_at": now,
+            "updated_at": now,
+        }))
+
+    async def mutate(
+        self,
+        cart_id: int,
+        fn: Callable[[Document], Any],
+        expected_version: Optional[int] = None
+    ) -> tuple:
+        """
+        Apply fn to the active cart atomically; returns (fn's result, summary).
+        fn may raise HTTPException, in which case nothing changes. With
+        expected_version (a client's If-Match) the cart must still be at
+        that version, else 409 with the current cart.
+        """
+        def apply(doc: Document) -> tuple:
+            if doc["status"] != "active":
+                raise HTTPException(status_code=400, detail="Cannot modify inactive cart")
+            if expected_version is not None and doc["version"] != expected_version:
+                raise version_conflict(cart_summary(doc))
+            result = fn(doc)
+            _touch(doc)
+            return result, cart_summary(doc)
+
+        for _ in range(2):
+            doc = await self._load(cart_id)
+            if doc is None:
+                raise HTTPException(status_code=404, detail="Cart not found")
+            if doc["status"] != "active":
+                raise HTTPException(status_code=400, detail="Cannot modify inactive cart")
+            try:
+                outcome = await self.store.update(cart_id, apply)
+            except KeyError:
+                continue  # evicted between the load and the update
+            cart_events.publish(cart_id, "cart")
+            return outcome
+        raise HTTPException(status_code=409, detail="Cart changed while it was being updated, try again")
+
+    # ---- flushing ---------------------------------------------------------
+
+    async def flush(self, cart_id: int, evict: bool = False) -> None:
+        """
+        Write the cart's pending changes to the database now. With evict the
+        cart also leaves the store, so that later reads see what the caller
+        is about to write to the database (status changes at checkout).
+        """
+        deadline = time.monotonic() + CART_STORE_LOCK_WAIT_SECONDS
+        while True:
+            token = await self.store.try_lock(cart_id, CART_STORE_LOCK_TTL_SECONDS)
+            if token:
+                break
+            if time.monotonic() > deadline:
+                raise HTTPException(status_code=503, detail="Cart is being saved, try again")
+            await asyncio.sleep(0.05)
+
+        try:
+            for _ in range(3):
+                await self._flush_one(cart_id)
+                if not evict or await self.store.evict(cart_id):
+                    return
+            # Still being edited; later edits load it again from what was flushed
+            await self._flush_one(cart_id)
+            await self.store.evict(cart_id, only_clean=False)
+        finally:
+            await self.store.unlock(cart_id, token)
+
+    async def _flush_one(self, cart_id: int) -> None:
+        _, failed = await self._flush_carts([cart_id])
+        if cart_id in failed:
+            raise HTTPException(status_code=500, detail=f"Cart could not be saved: {failed[cart_id]}")
+
+    async def flush_dirty(self, include_parked: bool = False) -> int:
+        """Flush every dirty cart nobody else is flushing; returns how many were written"""
+        written = 0
+        now = time.monotonic()
+        skipped = set() if include_parked else {
+            cart_id for cart_id, until in self._parked_until.items() if until > now
+        }
+        while True:
+            ids = [i for i in await self.store.dirty_ids(CART_STORE_FLUSH_BATCH + len(skipped)) if i not in skipped]
+            if not ids:
+                return written
+            locked = {}
+            for cart_id in ids[:CART_STORE_FLUSH_BATCH]:
+                token = await self.store.try_lock(cart_id, CART_STORE_LOCK_TTL_SECONDS)
+                if token:
+                    locked[cart_id] = token
+                else:
+                    skipped.add(cart_id)
+            if not locked:
+                return written
+            try:
+                written += (await self._flush_carts(list(locked)))[0]
+            finally:
+                for cart_id, token in locked.items():
+                    await self.store.unlock(cart_id, token)
+            # Carts edited again while they were being written stay dirty for the next pass
+            skipped.update(locked)
+
+    async def _flush_carts(self, cart_ids: List[int]) -> tuple:
+        """
+        Write the dirty ones of these carts; returns (carts written, {cart id: error}
+        for carts that could not be saved). The carts share one transaction;
+        if it fails they are written again one transaction each, so a cart
+        the database refuses does not keep the others from being saved.
+        """
+        docs = [doc for doc in await self.store.get_many(cart_ids) if doc and doc["dirty"]]
+        if not docs:
+            return 0, {}
+
+        start = time.perf_counter()
+        failed: Dict[int, Exception] = {}
+        try:
+            id_maps, dropped = await self._write_carts(docs)
+        except Exception as e:
+            self.flush_failures += 1
+            id_maps, dropped = {}, {}
+            if len(docs) == 1:
+                failed = {docs[0]["cart_id"]: e}
+            else:
+                for doc in docs:
+                    try:
+                        written, refused = await self._write_carts([doc])
+                    except Exception as e:
+                        failed[doc["cart_id"]] = e
+                        continue
+                    id_maps.update(written)
+                    dropped.update(refused)
+
+        for doc in docs:
+            cart_id = doc["cart_id"]
+            if cart_id in failed:
+                self._record_failure(cart_id, failed[cart_id])
+                continue
+            self._failures.pop(cart_id, None)
+            self._parked_until.pop(cart_id, None)
+            if cart_id in dropped:
+                # The database wins; clients that were told the edits succeeded reload the cart
+                self.dropped_edits += 1
+                print(
+                    f"Cart {cart_id}: unsaved edits up to version {doc['version']} dropped, "
+                    f"{dropped[cart_id]}"
+                )
+                await self.store.evict(cart_id, only_clean=False)
+                cart_events.publish(cart_id, "resync")
+                continue
+            try:
+                await self.store.update(cart_id, self._settle(id_maps[cart_id], doc["version"]))
+            except KeyError:
+                pass
+            if id_maps[cart_id]:
+                # Temporary ids were replaced by database ids
+                cart_events.publish(cart_id, "cart")
+
+        self.flushes += 1
+        self.carts_flushed += len(id_maps)
+        self.last_flush_ms = round((time.perf_counter() - start) * 1000, 2)
+        return len(id_maps), failed
+
+    async def _write_carts(self, docs: List[Document]) -> tuple:
+        """
+        One transaction for all docs; returns (cart id -> id map for the carts
+        written, {cart id: reason} for carts the database no longer takes)
+        """
+        id_maps: Dict[int, Dict[int, int]] = {}
+        dropped: Dict[int, str] = {}
+        async with AsyncSessionLocal() as db:
+            carts = {cart.id: cart for cart in await CartHelper.get_carts_with_items(db, [d["cart_id"] for d in docs])}
+            for doc in docs:
+                cart = carts.get(doc["cart_id"])
+                # Abandoned, checked out or changed outside the store underneath us
+                if cart is None:
+                    dropped[doc["cart_id"]] = "the cart was deleted"
+                elif cart.status != "active":
+                    dropped[doc["cart_id"]] = f"the cart is {cart.status}"
+                elif cart.version != doc["flushed_version"]:
+                    self.conflicts += 1
+                    dropped[doc["cart_id"]] = (
+                        f"the database has version {cart.version}, not {doc['flushed_version']}"
+                    )
+                else:
+                    id_maps[doc["cart_id"]] = await self._write_document(db, cart, doc)
+            await db.commit()
+        return id_maps, dropped
+
+    def _record_failure(self, cart_id: int, error: Exception) -> None:
+        if isinstance(error, CartVersionConflict):
+            # Changed outside the store between read and write; the next pass drops it
+            self.conflicts += 1
+        failures = self._failures.get(cart_id, 0) + 1
+        self._failures[cart_id] = failures
+        print(f"Cart {cart_id} could not be saved (attempt {failures}): {str(error)}")
+        if failures >= CART_STORE_PARK_AFTER_FAILURES:
+            self._parked_until[cart_id] = time.monotonic() + CART_STORE_PARK_SECONDS
+            self.parked += 1
+            print(f"Cart {cart_id} left out of background saves for {CART_STORE_PARK_SECONDS:.0f}s")
+
+    @staticmethod
+    async def _write_document(db, cart: Cart, doc: Document) -> Dict[int, int]:
+        """Make the cart's rows match the document; returns temporary id -> database id"""
+        rows = {item.id: item for item in cart.items}
+        kept = {item["id"] for item in doc["items"]}
+        for item_id in [item_id for item_id in rows if item_id not in kept]:
+            await CartHelper.remove_item_from_cart(db, item_id)
+
+        id_map: Dict[int, int] = {}
+        for item in doc["items"]:
+            row = rows.get(item["id"])
+            existing_modifiers = {}
+            if row is None:
+                row = await CartHelper.add_item_to_cart(
+                    db, cart.id, item["clover_item_id"], item["name"], item["price"],
+                    item["quantity"], item["notes"]
+                )
+                id_map[item["id"]] = row.id
+            else:
+                if row.quantity != item["quantity"]:
+                    await CartHelper.update_item_quantity(db, row.id, item["quantity"])
+                existing_modifiers = {modifier.id: modifier for modifier in row.modifiers}
+                kept_modifiers = {modifier["id"] for modifier in item["modifiers"]}
+                for modifier_id, modifier in existing_modifiers.items():
+                    if modifier_id not in kept_modifiers:
+                        await db.delete(modifier)
+
+            for modifier in item["modifiers"]:
+                if modifier["id"] in existing_modifiers:
+                    continue
+                created = await CartHelper.add_modifier_to_item(
+                    db, row.id, modifier["clover_modifier_id"], modifier["clover_modifier_group_id"],
+                    modifier["name"], modifier["price"]
+                )
+                id_map[modifier["id"]] = created.id
+
+        # The database takes the document's version, if nobody else wrote the cart meanwhile
+        await CartHelper.recompute_cart_totals(
+            db, cart.id, expected_version=doc["flushed_version"], new_version=doc["version"]
+        )
+        return id_map
+
+    @staticmethod
+    def _settle(id_map: Dict[int, int], version: int) -> Callable[[Document], None]:
+        """Give flushed lines their database ids; the cart stays dirty if it changed since the snapshot"""
+        def settle(doc: Document) -> None:
+            for item in doc["items"]:
+                if item["id"] in id_map:
+                    doc["aliases"][str(item["id"])] = id_map[item["id"]]
+                    item["id"] = id_map[item["id"]]
+                for modifier in item["modifiers"]:
+                    modifier["id"] = id_map.get(modifier["id"], modifier["id"])
+            doc["flushed_version"] = version
+            doc["dirty"] = doc["version"] != version
+        return settle
+
+    # ---- background flusher -----------------------------------------------
+
+    def start(self) -> None:
+        if self.store.backend == "memory" and WEB_CONCURRENCY > 1:
+            # Each worker would cache and flush its own copy of a cart, and
+            # one worker's flush would drop the others' edits
+            raise RuntimeError(
+                f"CART_STORE_BACKEND=memory cannot be shared by {WEB_CONCURRENCY} workers; "
+                "use CART_STORE_BACKEND=redis or run a single worker"
+            )
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        # Whatever is still dirty must not die with the process
+        try:
+            await self.flush_dirty(include_parked=True)
+        except Exception as e:
+            print(f"Final cart flush failed: {str(e)}")
+        unsaved = await self.store.dirty_ids(CART_STORE_FLUSH_BATCH)
+        if unsaved:
+            print(f"Carts with edits that could not be saved: {sorted(unsaved)}")
+        await self.store.close()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush_dirty()
+                await self.store.expire()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Cart flush failed: {str(e)}")
+
+    async def metrics(self) -> Dict[str, Any]:
+        return {
+            **await self.store.metrics(),
+            "flush_interval_seconds": self.interval,
+            "flushes": self.flushes,
+            "carts_flushed": self.carts_flushed,
+            "flush_failures": self.flush_failures,
+            "version_conflicts": self.conflicts,
+            "failing_carts": len(self._failures),
+            "parked_carts": sum(1 for until in self._parked_until.values() if until > time.monotonic()),
+            "parks": self.parked,
+            "dropped_edits": self.dropped_edits,
+            "last_flush_ms": self.last_flush_ms,
+        }
+
+
+active_carts = ActiveCartService()
@@ -0,0 +1,215 @@
+# services/cart_events.py
+import asyncio
+import os
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from dotenv import load_dotenv
+
+from utils.json_response import dumps
+
+load_dotenv()
+
+# Comment line sent on quiet streams so proxies keep the connection open;
+# a shared (redis) cart store is also re-read then, see CartEventStream
+CART_EVENTS_HEARTBEAT_SECONDS = float(os.getenv("CART_EVENTS_HEARTBEAT_SECONDS", "15"))
+# Undelivered events per subscriber before it is told to resync instead
+CART_EVENTS_QUEUE_SIZE = int(os.getenv("CART_EVENTS_QUEUE_SIZE", "64"))
+# Open streams per process
+CART_EVENTS_MAX_SUBSCRIBERS = int(os.getenv("CART_EVENTS_MAX_SUBSCRIBERS", "2000"))
+# How long a client waits before reconnecting (the SSE retry field)
+CART_EVENTS_RETRY_MS = int(os.getenv("CART_EVENTS_RETRY_MS", "3000"))
+
+Event = Tuple[str, Optional[Dict[str, Any]]]
+
+
+class CartEventBus:
+    """
+    In-process publish/subscribe of cart and order changes, keyed by cart id.
+
+    Publishing never blocks: every subscriber has a bounded queue, and a
+    subscriber that falls behind has its backlog replaced by one "resync"
+    event, after which it reloads the cart instead of replaying changes.
+    Publishers must run on the event loop.
+    """
+
+    def __init__(self, queue_size: int = CART_EVENTS_QUEUE_SIZE, max_subscribers: int = CART_EVENTS_MAX_SUBSCRIBERS):
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self._subscribers: Dict[int, Set[asyncio.Queue]] = {}
+        self.published = 0
+        self.delivered = 0
+        self.resyncs = 0
+
+    @property
+    def subscriber_count(self) -> int:
+        return sum(len(queues) for queues in self._subscribers.values())
+
+    def has_subscribers(self, cart_id: Optional[int] = None) -> bool:
+        if cart_id is None:
+            return bool(self._subscribers)
+        return cart_id in self._subscribers
+
+    def subscribe(self, cart_id: int) -> Optional[asyncio.Queue]:
+        """A queue of (event, data) for the cart, or None when the process is at max_subscribers"""
+        if self.subscriber_count >= self.max_subscribers:
+            return None
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.setdefault(cart_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, cart_id: int, queue: asyncio.Queue) -> None:
+        queues = self._subscribers.get(cart_id)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._subscribers[cart_id]
+
+    def publish(self, cart_id: int, event: str, data: Optional[Dict[str, Any]] = None) -> None:
+        queues = self._subscribers.get(cart_id)
+        self.published += 1
+        if not queues:
+            return
+        for queue in queues:
+            try:
+                queue.put_nowait((event, data))
+                self.delivered += 1
+            except asyncio.QueueFull:
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(("resync", None))
+                self.resyncs += 1
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "carts": len(self._subscribers),
+            "subscribers": self.subscriber_count,
+            "max_subscribers": self.max_subscribers,
+            "published": self.published,
+            "delivered": self.delivered,
+            "resyncs": self.resyncs,
+        }
+
+
+def diff_cart(old: Dict[str, Any], new: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    What changed between two cart summaries: changed top-level fields, lines
+    added or changed (whole line), and ids of lines removed. None if nothing.
+    A line that was saved to the database shows up as removed under its
+    temporary id and upserted under its database id.
+    """
+    changes = {key: value for key, value in new.items() if key != "items" and old.get(key) != value}
+    old_items = {item["id"]: item for item in old.get("items") or []}
+    new_items = {item["id"]: item for item in new.get("items") or []}
+    upserted = [item for item_id, item in new_items.items() if old_items.get(item_id) != item]
+    removed = [item_id for item_id in old_items if item_id not in new_items]
+    if not (changes or upserted or removed):
+        return None
+    return {"cart_id": new["cart_id"], "changes": changes, "upserted": upserted, "removed": removed}
+
+
+def format_event(event: str, data: Any, event_id: Optional[int] = None) -> bytes:
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append("data: " + dumps(data).decode("utf-8"))
+    return ("\n".join(lines) + "\n\n").encode("utf-8")
+
+
+class CartEventStream:
+    """
+    One client's server-sent event stream for a cart.
+
+    Starts with a "cart" event (the whole cart) and the order submission
+    progress if there is one, then sends "cart.diff" events as the cart
+    changes and "order" events as its Clover order moves along. Bus events
+    only say that something changed; the cart itself is read back from the
+    cart store, so the stream never sends a version older than the store's.
+    """
+
+    def __init__(
+        self,
+        cart_id: int,
+        load_cart: Callable[[int], Awaitable[Optional[Dict[str, Any]]]],
+        load_order: Callable[[int], Awaitable[Optional[Dict[str, Any]]]],
+        shared_store: bool = False,
+        bus: Optional[CartEventBus] = None,
+        heartbeat: float = CART_EVENTS_HEARTBEAT_SECONDS,
+    ):
+        self.cart_id = cart_id
+        self._load_cart = load_cart
+        self._load_order = load_order
+        # Other workers' edits reach a shared store without reaching this bus
+        self._shared_store = shared_store
+        self._bus = bus or cart_events
+        self._heartbeat = heartbeat
+        self._queue: Optional[asyncio.Queue] = None
+        self._cart: Optional[Dict[str, Any]] = None
+        self._event_id = 0
+
+    def open(self) -> bool:
+        """Subscribe before the first read so no change slips in between; False if the process is full"""
+        self._queue = self._bus.subscribe(self.cart_id)
+        return self._queue is not None
+
+    def close(self) -> None:
+        if self._queue is not None:
+            self._bus.unsubscribe(self.cart_id, self._queue)
+            self._queue = None
+
+    def _format(self, event: str, data: Any) -> bytes:
+        self._event_id += 1
+        return format_event(event, data, self._event_id)
+
+    async def _snapshot(self) -> List[bytes]:
+        chunks = []
+        self._cart = await self._load_cart(self.cart_id)
+        if self._cart is not None:
+            chunks.append(self._format("cart", self._cart))
+        order = await self._load_order(self.cart_id)
+        if order is not None:
+            chunks.append(self._format("order", order))
+        return chunks
+
+    async def _cart_changes(self) -> List[bytes]:
+        cart = await self._load_cart(self.cart_id)
+        if cart is None or self._cart is None:
+            self._cart = cart
+            return [self._format("cart", cart)] if cart is not None else []
+        diff = diff_cart(self._cart, cart)
+        self._cart = cart
+        return [self._format("cart.diff", diff)] if diff else []
+
+    async def events(self, is_disconnected: Callable[[], Awaitable[bool]]):
+        """The response body; call open() first"""
+        try:
+            yield f"retry: {CART_EVENTS_RETRY_MS}\n\n".encode("utf-8")
+            for chunk in await self._snapshot():
+                yield chunk
+
+            while True:
+                try:
+                    event, data = await asyncio.wait_for(self._queue.get(), timeout=self._heartbeat)
+                except asyncio.TimeoutError:
+                    if await is_disconnected():
+                        return
+                    yield b": ping\n\n"
+                    if self._shared_store and self._cart and self._cart["status"] == "active":
+                        for chunk in await self._cart_changes():
+                            yield chunk
+                    continue
+
+                if event == "resync":
+                    for chunk in await self._snapshot():
+                        yield chunk
+                elif event == "cart":
+                    for chunk in await self._cart_changes():
+                        yield chunk
+                else:
+                    yield self._format(event, data)
+        finally:
+            self.close()
+
+
+cart_events = CartEventBus()
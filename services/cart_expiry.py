@@ -0,0 +1,139 @@
+# services/cart_expiry.py
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from helpers.cart_helper import CART_EXPIRY_SECONDS, CartHelper
+from services.active_carts import active_carts
+from services.cart_events import cart_events
+from services.catalog_sync import run_in_async_session
+
+load_dotenv()
+
+CART_EXPIRY_SWEEP_ENABLED = os.getenv("CART_EXPIRY_SWEEP_ENABLED", "true").lower() in ("1", "true", "yes", "on")
+CART_EXPIRY_SWEEP_SECONDS = float(os.getenv("CART_EXPIRY_SWEEP_SECONDS", "300"))
+# Carts per UPDATE / DELETE; each batch is its own short transaction
+CART_EXPIRY_SWEEP_BATCH = int(os.getenv("CART_EXPIRY_SWEEP_BATCH", "500"))
+# Abandoned carts are deleted this long after abandonment; 0 keeps them forever
+CART_ABANDONED_RETENTION_DAYS = float(os.getenv("CART_ABANDONED_RETENTION_DAYS", "30"))
+
+
+class CartExpirySweeper:
+    """
+    Background expiry of idle carts.
+
+    Every interval, active carts past expires_at (CART_EXPIRY_SECONDS after
+    their last change) are marked abandoned, and carts abandoned more than
+    CART_ABANDONED_RETENTION_DAYS ago are deleted with their items. Both
+    work in batches of CART_EXPIRY_SWEEP_BATCH so no transaction holds
+    locks on many rows for long.
+    """
+
+    def __init__(self, interval: float = CART_EXPIRY_SWEEP_SECONDS, batch_size: int = CART_EXPIRY_SWEEP_BATCH):
+        self.interval = interval
+        self.batch_size = batch_size
+        self._task: Optional[asyncio.Task] = None
+        self.runs = 0
+        self.carts_abandoned = 0
+        self.carts_purged = 0
+        self.last_run_at: Optional[datetime] = None
+        self.last_run_ms: Optional[float] = None
+        self.last_run_carts = 0
+
+    def start(self) -> None:
+        if CART_EXPIRY_SWEEP_ENABLED and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.sweep()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Cart expiry sweep failed: {str(e)}")
+
+    async def sweep(self) -> Dict[str, int]:
+        """One pass: abandon expired carts, then purge old abandoned ones"""
+        start = time.perf_counter()
+        now = datetime.now()
+        abandoned = await self._abandon_expired(now)
+        purged = 0
+        if CART_ABANDONED_RETENTION_DAYS > 0:
+            purged = await self._purge_abandoned(now - timedelta(days=CART_ABANDONED_RETENTION_DAYS))
+
+        self.runs += 1
+        self.carts_abandoned += abandoned
+        self.carts_purged += purged
+        self.last_run_at = now
+        self.last_run_ms = round((time.perf_counter() - start) * 1000, 2)
+        self.last_run_carts = abandoned + purged
+        if abandoned or purged:
+            print(f"Cart expiry sweep: {abandoned} abandoned, {purged} purged in {self.last_run_ms} ms")
+        return {"abandoned": abandoned, "purged": purged}
+
+    async def _abandon_expired(self, now: datetime) -> int:
+        total = 0
+        while True:
+            cart_ids = await run_in_async_session(CartHelper.find_expired_cart_ids, now, self.batch_size)
+            if not cart_ids:
+                return total
+            # A cart with edits not yet flushed is in use, whatever the database says
+            in_use = await self._unflushed(cart_ids)
+            abandoned = await run_in_async_session(
+                CartHelper.abandon_carts, [cart_id for cart_id in cart_ids if cart_id not in in_use], now
+            )
+            total += abandoned
+            for cart_id in cart_ids:
+                await active_carts.store.evict(cart_id)
+                if cart_events.has_subscribers(cart_id):
+                    cart_events.publish(cart_id, "cart")
+            if abandoned == 0 or len(cart_ids) < self.batch_size:
+                return total
+            await asyncio.sleep(0)
+
+    async def _purge_abandoned(self, before: datetime) -> int:
+        total = 0
+        while True:
+            purged = await run_in_async_session(CartHelper.purge_abandoned_carts, before, self.batch_size)
+            total += purged
+            if purged < self.batch_size:
+                return total
+            await asyncio.sleep(0)
+
+    @staticmethod
+    async def _unflushed(cart_ids: List[int]) -> set:
+        docs = await active_carts.store.get_many(cart_ids)
+        return {doc["cart_id"] for doc in docs if doc and doc["dirty"]}
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "enabled": CART_EXPIRY_SWEEP_ENABLED,
+            "interval_seconds": self.interval,
+            "batch_size": self.batch_size,
+            "expiry_seconds": CART_EXPIRY_SECONDS,
+            "retention_days": CART_ABANDONED_RETENTION_DAYS,
+            "runs": self.runs,
+            "carts_abandoned": self.carts_abandoned,
+            "carts_purged": self.carts_purged,
+            "last_run_at": self.last_run_at.isoformat() if self.last_run_at else None,
+            "last_run_ms": self.last_run_ms,
+            "last_run_carts_per_second": (
+                round(self.last_run_carts / (self.last_run_ms / 1000), 1)
+                if self.last_run_ms and self.last_run_carts else None
+            ),
+        }
+
+
+cart_expiry_sweeper = CartExpirySweeper()
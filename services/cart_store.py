@@ -0,0 +1,356 @@
+# services/cart_store.py
+import copy
+import json
+import os
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from dotenv import load_dotenv
+
+from utils.json_response import dumps
+
+try:
+    import redis.asyncio as redis_asyncio
+    from redis.exceptions import WatchError
+except ImportError:  # optional; only needed for CART_STORE_BACKEND=redis
+    redis_asyncio = None
+    WatchError = None
+
+load_dotenv()
+
+# memory: this process only (single worker); redis: shared by every worker
+CART_STORE_BACKEND = os.getenv("CART_STORE_BACKEND", "memory").lower()
+# Any Redis-protocol server will do (Redis, Valkey, KeyDB, a local stand-in)
+CART_STORE_REDIS_URL = os.getenv("CART_STORE_REDIS_URL", "redis://localhost:6379/0")
+CART_STORE_REDIS_PREFIX = os.getenv("CART_STORE_REDIS_PREFIX", "carts:")
+# Flushed carts nobody touched for this long are dropped from the store
+CART_STORE_IDLE_SECONDS = float(os.getenv("CART_STORE_IDLE_SECONDS", "3600"))
+
+Document = Dict[str, Any]
+
+
+class CartStore:
+    """
+    Where live cart documents are kept between flushes.
+
+    A document is a cart summary (CartHelper.summarize_cart) plus
+    bookkeeping: `version` (the cart's version) goes up with every change,
+    `flushed_version` is the version last written to the database and
+    `dirty` marks changes not yet written. The store keeps a dirty index and a
+    session -> cart index next to the documents, both updated in the same
+    step as the document itself. Implementations must make update()
+    atomic per cart.
+    """
+
+    backend = "abstract"
+
+    async def get(self, cart_id: int) -> Optional[Document]:
+        raise NotImplementedError
+
+    async def get_many(self, cart_ids: List[int]) -> List[Optional[Document]]:
+        raise NotImplementedError
+
+    async def session_cart_id(self, session_id: str) -> Optional[int]:
+        raise NotImplementedError
+
+    async def add(self, doc: Document) -> Document:
+        """Store doc unless the cart is already there; returns the stored document"""
+        raise NotImplementedError
+
+    async def update(self, cart_id: int, fn: Callable[[Document], Any]) -> Any:
+        """
+        Apply fn to a copy of the document and store the result atomically;
+        returns fn's result. If fn raises nothing is stored. Raises KeyError
+        if the cart is not in the store.
+        """
+        raise NotImplementedError
+
+    async def evict(self, cart_id: int, only_clean: bool = True) -> bool:
+        """Drop a cart; with only_clean, not if it has unflushed changes"""
+        raise NotImplementedError
+
+    async def dirty_ids(self, limit: int) -> List[int]:
+        raise NotImplementedError
+
+    async def try_lock(self, cart_id: int, ttl: float) -> Optional[str]:
+        """Flush lock for one cart; returns a token for unlock(), or None if it is held"""
+        raise NotImplementedError
+
+    async def unlock(self, cart_id: int, token: str) -> None:
+        raise NotImplementedError
+
+    async def expire(self) -> int:
+        """Drop idle clean carts; returns how many"""
+        return 0
+
+    async def close(self) -> None:
+        pass
+
+    async def metrics(self) -> Dict[str, Any]:
+        raise NotImplementedError
+
+
+class MemoryCartStore(CartStore):
+    """Documents in a dict of this process; fn runs without awaiting, so update() is atomic"""
+
+    backend = "memory"
+
+    def __init__(self, idle_seconds: float = CART_STORE_IDLE_SECONDS):
+        self.idle_seconds = idle_seconds
+        self._docs: Dict[int, Document] = {}
+        self._touched: Dict[int, float] = {}
+        self._sessions: Dict[str, int] = {}
+        self._dirty: Set[int] = set()
+        self._locks: Dict[int, tuple] = {}
+
+    def _write(self, doc: Document) -> None:
+        cart_id = doc["cart_id"]
+        self._docs[cart_id] = doc
+        self._touched[cart_id] = time.monotonic()
+        if doc.get("session_id"):
+            self._sessions[doc["session_id"]] = cart_id
+        if doc["dirty"]:
+            self._dirty.add(cart_id)
+        else:
+            self._dirty.discard(cart_id)
+
+    async def get(self, cart_id: int) -> Optional[Document]:
+        doc = self._docs.get(cart_id)
+        if doc is None:
+            return None
+        self._touched[cart_id] = time.monotonic()
+        return copy.deepcopy(doc)
+
+    async def get_many(self, cart_ids: List[int]) -> List[Optional[Document]]:
+        return [await self.get(cart_id) for cart_id in cart_ids]
+
+    async def session_cart_id(self, session_id: str) -> Optional[int]:
+        return self._sessions.get(session_id)
+
+    async def add(self, doc: Document) -> Document:
+        if doc["cart_id"] not in self._docs:
+            self._write(copy.deepcopy(doc))
+        return await self.get(doc["cart_id"])
+
+    async def update(self, cart_id: int, fn: Callable[[Document], Any]) -> Any:
+        if cart_id not in self._docs:
+            raise KeyError(cart_id)
+        doc = copy.deepcopy(self._docs[cart_id])
+        result = fn(doc)
+        self._write(doc)
+        return result
+
+    async def evict(self, cart_id: int, only_clean: bool = True) -> bool:
+        doc = self._docs.get(cart_id)
+        if doc is None:
+            return True
+        if only_clean and doc["dirty"]:
+            return False
+        self._drop(cart_id)
+        return True
+
+    def _drop(self, cart_id: int) -> None:
+        doc = self._docs.pop(cart_id)
+        self._touched.pop(cart_id, None)
+        self._dirty.discard(cart_id)
+        if doc.get("session_id") and self._sessions.get(doc["session_id"]) == cart_id:
+            del self._sessions[doc["session_id"]]
+
+    async def dirty_ids(self, limit: int) -> List[int]:
+        return list(self._dirty)[:limit]
+
+    async def try_lock(self, cart_id: int, ttl: float) -> Optional[str]:
+        held = self._locks.get(cart_id)
+        if held and held[1] > time.monotonic():
+            return None
+        token = uuid.uuid4().hex
+        self._locks[cart_id] = (token, time.monotonic() + ttl)
+        return token
+
+    async def unlock(self, cart_id: int, token: str) -> None:
+        held = self._locks.get(cart_id)
+        if held and held[0] == token:
+            del self._locks[cart_id]
+
+    async def expire(self) -> int:
+        cutoff = time.monotonic() - self.idle_seconds
+        idle = [
+            cart_id for cart_id, touched in self._touched.items()
+            if touched < cutoff and cart_id not in self._dirty and cart_id not in self._locks
+        ]
+        for cart_id in idle:
+            self._drop(cart_id)
+        return len(idle)
+
+    async def metrics(self) -> Dict[str, Any]:
+        return {
+            "backend": self.backend,
+            "carts": len(self._docs),
+            "dirty": len(self._dirty),
+            "sessions": len(self._sessions),
+        }
+
+
+# Deletes the lock only if it still holds our token
+_UNLOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+class RedisCartStore(CartStore):
+    """
+    Documents as JSON in Redis, so every worker sees the same carts.
+    update() is a WATCH/MULTI check-and-set retried on conflict; clean
+    documents expire after CART_STORE_IDLE_SECONDS, dirty ones never do.
+    """
+
+    backend = "redis"
+
+    def __init__(
+        self,
+        url: str = CART_STORE_REDIS_URL,
+        prefix: str = CART_STORE_REDIS_PREFIX,
+        idle_seconds: float = CART_STORE_IDLE_SECONDS,
+        client=None,
+    ):
+        if client is None:
+            if redis_asyncio is None:
+                raise RuntimeError("CART_STORE_BACKEND=redis needs the redis package")
+            client = redis_asyncio.from_url(url)
+        self._redis = client
+        self.prefix = prefix
+        self.idle_seconds = idle_seconds
+        self.conflicts = 0
+
+    def _key(self, cart_id: int) -> str:
+        return f"{self.prefix}cart:{cart_id}"
+
+    def _session_key(self, session_id: str) -> str:
+        return f"{self.prefix}session:{session_id}"
+
+    def _lock_key(self, cart_id: int) -> str:
+        return f"{self.prefix}lock:{cart_id}"
+
+    @property
+    def _dirty_key(self) -> str:
+        return f"{self.prefix}dirty"
+
+    def _queue_write(self, pipe, doc: Document) -> None:
+        cart_id = doc["cart_id"]
+        ttl = None if doc["dirty"] else max(1, int(self.idle_seconds))
+        pipe.set(self._key(cart_id), dumps(doc), ex=ttl)
+        if doc.get("session_id"):
+            pipe.set(self._session_key(doc["session_id"]), cart_id, ex=ttl)
+        if doc["dirty"]:
+            pipe.sadd(self._dirty_key, cart_id)
+        else:
+            pipe.srem(self._dirty_key, cart_id)
+
+    async def get(self, cart_id: int) -> Optional[Document]:
+        raw = await self._redis.get(self._key(cart_id))
+        return json.loads(raw) if raw is not None else None
+
+    async def get_many(self, cart_ids: List[int]) -> List[Optional[Document]]:
+        if not cart_ids:
+            return []
+        raws = await self._redis.mget([self._key(cart_id) for cart_id in cart_ids])
+        return [json.loads(raw) if raw is not None else None for raw in raws]
+
+    async def session_cart_id(self, session_id: str) -> Optional[int]:
+        raw = await self._redis.get(self._session_key(session_id))
+        return int(raw) if raw is not None else None
+
+    async def add(self, doc: Document) -> Document:
+        created = await self._redis.set(
+            self._key(doc["cart_id"]), dumps(doc), nx=True, ex=max(1, int(self.idle_seconds))
+        )
+        if created:
+            if doc.get("session_id"):
+                await self._redis.set(
+                    self._session_key(doc["session_id"]), doc["cart_id"], ex=max(1, int(self.idle_seconds))
+                )
+            return doc
+        return await self.get(doc["cart_id"]) or doc
+
+    async def update(self, cart_id: int, fn: Callable[[Document], Any]) -> Any:
+        key = self._key(cart_id)
+        async with self._redis.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    await pipe.watch(key)
+                    raw = await pipe.get(key)
+                    if raw is None:
+                        raise KeyError(cart_id)
+                    doc = json.loads(raw)
+                    result = fn(doc)
+                    pipe.multi()
+                    self._queue_write(pipe, doc)
+                    await pipe.execute()
+                    return result
+                except WatchError:
+                    # Another worker changed the cart first; run fn again on its version
+                    self.conflicts += 1
+                    continue
+
+    async def evict(self, cart_id: int, only_clean: bool = True) -> bool:
+        key = self._key(cart_id)
+        async with self._redis.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    await pipe.watch(key)
+                    raw = await pipe.get(key)
+                    if raw is None:
+                        return True
+                    doc = json.loads(raw)
+                    if only_clean and doc["dirty"]:
+                        return False
+                    pipe.multi()
+                    pipe.delete(key)
+                    pipe.srem(self._dirty_key, cart_id)
+                    await pipe.execute()
+                    break
+                except WatchError:
+                    self.conflicts += 1
+                    continue
+        if doc.get("session_id"):
+            session_key = self._session_key(doc["session_id"])
+            if await self.session_cart_id(doc["session_id"]) == cart_id:
+                await self._redis.delete(session_key)
+        return True
+
+    async def dirty_ids(self, limit: int) -> List[int]:
+        members = await self._redis.srandmember(self._dirty_key, limit)
+        return [int(member) for member in members or []]
+
+    async def try_lock(self, cart_id: int, ttl: float) -> Optional[str]:
+        token = uuid.uuid4().hex
+        acquired = await self._redis.set(self._lock_key(cart_id), token, nx=True, px=max(1, int(ttl * 1000)))
+        return token if acquired else None
+
+    async def unlock(self, cart_id: int, token: str) -> None:
+        await self._redis.eval(_UNLOCK_SCRIPT, 1, self._lock_key(cart_id), token)
+
+    async def close(self) -> None:
+        await self._redis.aclose()
+
+    async def metrics(self) -> Dict[str, Any]:
+        return {
+            "backend": self.backend,
+            "dirty": await self._redis.scard(self._dirty_key),
+            "conflicts": self.conflicts,
+        }
+
+
+def create_cart_store(backend: str = CART_STORE_BACKEND) -> CartStore:
+    if backend == "redis":
+        return RedisCartStore()
+    if backend != "memory":
+        print(f"Unknown CART_STORE_BACKEND {backend!r}; using the in-process store")
+    return MemoryCartStore()
+
+
+cart_store = create_cart_store()
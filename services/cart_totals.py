@@ -0,0 +1,77 @@
+# services/cart_totals.py
+import asyncio
+import os
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from dotenv import load_dotenv
+
+from helpers.cart_helper import CartHelper
+from services.catalog_sync import run_in_async_session
+
+load_dotenv()
+
+CART_TOTALS_VERIFY_ENABLED = os.getenv("CART_TOTALS_VERIFY_ENABLED", "true").lower() in ("1", "true", "yes", "on")
+CART_TOTALS_VERIFY_SECONDS = float(os.getenv("CART_TOTALS_VERIFY_SECONDS", "900"))
+
+
+class CartTotalsVerifier:
+    """
+    Background check of the incrementally maintained cart totals.
+
+    Every interval the totals of all active carts are recomputed in SQL
+    from their items and modifiers; carts that drifted are reported and
+    corrected.
+    """
+
+    def __init__(self, interval: float = CART_TOTALS_VERIFY_SECONDS):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self.runs = 0
+        self.drifted_carts = 0
+        self.last_run_at: Optional[datetime] = None
+
+    def start(self) -> None:
+        if CART_TOTALS_VERIFY_ENABLED and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.verify()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Cart totals verification failed: {str(e)}")
+
+    async def verify(self) -> int:
+        """One pass over every active cart; returns how many were corrected"""
+        report = await run_in_async_session(CartHelper.verify_cart_totals)
+        self.runs += 1
+        self.drifted_carts += len(report)
+        self.last_run_at = datetime.now()
+        for row in report:
+            print(
+                f"Cart {row['cart_id']} totals drifted: stored {row['stored_subtotal']}, "
+                f"recomputed {row['computed_subtotal']}; corrected"
+            )
+        return len(report)
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "enabled": CART_TOTALS_VERIFY_ENABLED,
+            "interval_seconds": self.interval,
+            "runs": self.runs,
+            "drifted_carts": self.drifted_carts,
+            "last_run_at": self.last_run_at.isoformat() if self.last_run_at else None,
+        }
+
+
+cart_totals_verifier = CartTotalsVerifier()
@@ -0,0 +1,184 @@
+# services/catalog_sync.py
+import asyncio
+import os
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional, Set
+
+import httpx
+from dotenv import load_dotenv
+
+from database.database import AsyncSessionLocal, SessionLocal
+from helpers.catalog_helper import CatalogHelper
+from helpers.merchant_helper import MerchantHelper
+from services.category_menu import category_menu_cache
+from services.clover_api import iter_clover_pages
+from services.clover_scheduler import CloverPriority
+from services.menu_snapshot import menu_snapshots
+from services.response_cache import response_cache
+
+load_dotenv()
+
+CATALOG_SYNC_ENABLED = os.getenv("CATALOG_SYNC_ENABLED", "true").lower() in ("1", "true", "yes", "on")
+CATALOG_SYNC_INTERVAL_SECONDS = float(os.getenv("CATALOG_SYNC_INTERVAL_SECONDS", "60"))
+# Deltas cannot see deletions, so a full pass reconciles them periodically
+CATALOG_FULL_SYNC_INTERVAL_SECONDS = float(os.getenv("CATALOG_FULL_SYNC_INTERVAL_SECONDS", "21600"))
+
+# entity -> (Clover collection, extra query params, mirror upsert)
+CATALOG_ENTITIES: Dict[str, tuple] = {
+    "categories": ("categories", {}, CatalogHelper.upsert_categories),
+    "items": ("items", {"expand": "variants,categories"}, CatalogHelper.upsert_items),
+    "modifier_groups": ("modifier_groups", {"expand": "modifiers"}, CatalogHelper.upsert_modifier_groups),
+    "item_stocks": ("item_stocks", {}, CatalogHelper.upsert_item_stocks),
+}
+
+
+def run_in_session(fn: Callable, *args) -> Any:
+    """Run fn(db, *args) with a short-lived session; used from worker threads"""
+    db = SessionLocal()
+    try:
+        return fn(db, *args)
+    finally:
+        db.close()
+
+
+async def run_in_async_session(fn: Callable, *args) -> Any:
+    """Await fn(db, *args) with a short-lived AsyncSession"""
+    async with AsyncSessionLocal() as db:
+        return await fn(db, *args)
+
+
+def _element_id(entity: str, data: Dict[str, Any]) -> Optional[str]:
+    if entity == "item_stocks":
+        return (data.get("item") or {}).get("id") or data.get("id")
+    return data.get("id")
+
+
+class CatalogSyncService:
+    """Pulls Clover catalog changes into the local mirror tables"""
+
+    @staticmethod
+    async def sync_entity(merchant_id: str, access_token: str, entity: str, full: bool = False) -> int:
+        """
+        Sync one catalog entity for a merchant.
+
+        A delta pass asks Clover only for rows whose modifiedTime is at or
+        after the stored watermark. A full pass walks the whole collection
+        and then deletes mirror rows that Clover no longer returns.
+
+        Returns:
+            Number of rows received from Clover
+        """
+        endpoint, base_params, upsert = CATALOG_ENTITIES[entity]
+        state = await asyncio.to_thread(run_in_session, CatalogHelper.get_sync_state, merchant_id, entity)
+
+        if not full:
+            full = (
+                state is None
+                or state.last_full_sync_at is None
+                or state.last_modified_time is None
+                or datetime.now() - state.last_full_sync_at > timedelta(seconds=CATALOG_FULL_SYNC_INTERVAL_SECONDS)
+            )
+
+        params = dict(base_params)
+        if not full:
+            params["filter"] = f"modifiedTime>={state.last_modified_time}"
+
+        received = 0
+        watermark: Optional[int] = None
+        seen_ids: Set[str] = set()
+        try:
+            async for page in iter_clover_pages(
+                merchant_id, access_token, endpoint, params, priority=CloverPriority.BACKGROUND
+            ):
+                received += len(page)
+                if full:
+                    seen_ids.update(i for i in (_element_id(entity, e) for e in page) if i)
+                page_max = await asyncio.to_thread(run_in_session, upsert, merchant_id, page)
+                if page_max and (watermark is None or page_max > watermark):
+                    watermark = page_max
+
+            deleted = 0
+            if full:
+                deleted = await asyncio.to_thread(
+                    run_in_session, CatalogHelper.delete_missing, merchant_id, entity, seen_ids
+                )
+        except (httpx.HTTPError, ValueError) as e:
+            await asyncio.to_thread(
+                run_in_session, CatalogHelper.save_sync_state, merchant_id, entity, None, full, str(e)
+            )
+            raise
+
+        await asyncio.to_thread(
+            run_in_session, CatalogHelper.save_sync_state, merchant_id, entity, watermark, full
+        )
+
+        # The delta filter is inclusive, so only a moved watermark means new data
+        previous = state.last_modified_time if state else None
+        if deleted or (watermark and (previous is None or watermark > previous)):
+            response_cache.invalidate_merchant(merchant_id)
+            menu_snapshots.mark_stale(merchant_id, access_token)
+            if entity in ("items", "categories"):
+                category_menu_cache.invalidate(merchant_id)
+        return received
+
+    @staticmethod
+    async def sync_merchant(merchant_id: str, access_token: str, full: bool = False) -> Dict[str, Any]:
+        """Sync every catalog entity for one merchant; failures are reported per entity"""
+        results: Dict[str, Any] = {}
+        for entity in CATALOG_ENTITIES:
+            try:
+                results[entity] = await CatalogSyncService.sync_entity(merchant_id, access_token, entity, full)
+            except Exception as e:
+                print(f"Catalog sync failed for {merchant_id}/{entity}: {str(e)}")
+                results[entity] = f"error: {str(e)}"
+        return results
+
+
+class CatalogSyncWorker:
+    """Background loop that keeps the catalog mirror current for every merchant"""
+
+    def __init__(self, interval: float = CATALOG_SYNC_INTERVAL_SECONDS):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self._pending: Dict[str, asyncio.Task] = {}
+        self.last_run_at: Optional[datetime] = None
+
+    def start(self) -> None:
+        if CATALOG_SYNC_ENABLED and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        tasks = [t for t in [self._task, *self._pending.values()] if t]
+        self._task = None
+        self._pending = {}
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                merchants = await run_in_async_session(MerchantHelper.get_all_merchant_tokens)
+                for merchant_id, access_token in merchants:
+                    await CatalogSyncService.sync_merchant(merchant_id, access_token)
+                self.last_run_at = datetime.now()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Catalog sync pass failed: {str(e)}")
+            await asyncio.sleep(self.interval)
+
+    def trigger(self, merchant_id: str, access_token: str, full: bool = False) -> None:
+        """Sync one merchant now, in the background; repeated triggers are collapsed"""
+        task = self._pending.get(merchant_id)
+        if task and not task.done():
+            return
+
+        task = asyncio.create_task(CatalogSyncService.sync_merchant(merchant_id, access_token, full))
+        self._pending[merchant_id] = task
+        task.add_done_callback(
+            lambda t: self._pending.pop(merchant_id, None) if self._pending.get(merchant_id) is t else None
+        )
+
+
+catalog_sync_worker = CatalogSyncWorker()
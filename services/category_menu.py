@@ -0,0 +1,178 @@
+# services/category_menu.py
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from dotenv import load_dotenv
+
+from services.singleflight import SingleFlight
+
+load_dotenv()
+
+# A cached tree is rebuilt from scratch after this many seconds, however
+# many incremental updates it has taken in between
+CATEGORY_MENU_MAX_AGE_SECONDS = float(os.getenv("CATEGORY_MENU_MAX_AGE_SECONDS", "900"))
+
+UNCATEGORIZED = "uncategorized"
+
+
+def _elements(value: Any) -> List[Dict[str, Any]]:
+    """Clover nests expanded collections as {"elements": [...]}"""
+    if isinstance(value, dict):
+        return value.get("elements", []) or []
+    if isinstance(value, list):
+        return value
+    return []
+
+
+def clover_item_variations(item: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Menu variations for a raw Clover item: one per variant, or the item itself"""
+    name = item.get("name") or ""
+    variants = _elements(item.get("variants"))
+    if variants:
+        return [
+            {"id": v.get("id"), "name": f"{name} ({v.get('name')})", "price": (v.get("price") or 0) / 100.0}
+            for v in variants
+        ]
+    return [{"id": item.get("id"), "name": name, "price": (item.get("price") or 0) / 100.0}]
+
+
+def clover_item_category_ids(item: Dict[str, Any]) -> Tuple[str, ...]:
+    return tuple(c["id"] for c in _elements(item.get("categories")) if c.get("id"))
+
+
+class CategoryTree:
+    """
+    One merchant's category menu, indexed so that a single item can be
+    replaced or removed without regrouping the rest.
+
+    Each category keeps an item_id -> variations map, so an updated item
+    keeps its position and the rendered menu is just the concatenation.
+    The rendered list is memoised until the next change; treat it as
+    read-only.
+    """
+
+    def __init__(self, categories: Iterable[Tuple[str, str]]):
+        self.names: Dict[str, str] = dict(categories)
+        self._by_category: Dict[str, Dict[str, List[Dict[str, Any]]]] = {cid: {} for cid in self.names}
+        self._by_category[UNCATEGORIZED] = {}
+        self._item_categories: Dict[str, Tuple[str, ...]] = {}
+        self._menu: Optional[List[Dict[str, Any]]] = None
+
+    @classmethod
+    def from_clover(cls, categories: Sequence[Dict[str, Any]], items: Sequence[Dict[str, Any]]) -> "CategoryTree":
+        """Build from raw Clover categories and items (expanded with variants and categories)"""
+        tree = cls((c["id"], c.get("name")) for c in categories if c.get("id"))
+        for item in items:
+            tree.put_clover_item(item)
+        return tree
+
+    def put_clover_item(self, item: Dict[str, Any]) -> None:
+        if item.get("deleted"):
+            self.remove_item(item.get("id"))
+            return
+        self.put_item(item.get("id"), clover_item_category_ids(item), clover_item_variations(item))
+
+    def put_item(self, item_id: str, category_ids: Sequence[str], variations: List[Dict[str, Any]]) -> None:
+        """Add or replace one item; categories unknown to the tree are ignored"""
+        targets = tuple(cid for cid in category_ids if cid in self.names)
+        if not category_ids:
+            targets = (UNCATEGORIZED,)
+
+        for cid in self._item_categories.get(item_id, ()):
+            if cid not in targets:
+                self._by_category[cid].pop(item_id, None)
+        for cid in targets:
+            self._by_category[cid][item_id] = variations
+        self._item_categories[item_id] = targets
+        self._menu = None
+
+    def remove_item(self, item_id: Optional[str]) -> None:
+        for cid in self._item_categories.pop(item_id, ()):
+            self._by_category[cid].pop(item_id, None)
+        self._menu = None
+
+    def menu(self) -> List[Dict[str, Any]]:
+        """Categories with their variations; a trailing "Uncategorized" entry when needed"""
+        if self._menu is None:
+            menu = [
+                {"id": cid, "name": name, "variations": [v for vs in self._by_category[cid].values() for v in vs]}
+                for cid, name in self.names.items()
+            ]
+            uncategorized = [v for vs in self._by_category[UNCATEGORIZED].values() for v in vs]
+            if uncategorized:
+                menu.append({"id": UNCATEGORIZED, "name": "Uncategorized", "variations": uncategorized})
+            self._menu = menu
+        return self._menu
+
+
+class CategoryMenuCache:
+    """
+    Per-merchant CategoryTree cache.
+
+    Concurrent builds for a merchant share one call. Item webhooks patch
+    the cached tree in place through apply_item; category changes and
+    catalog syncs drop it with invalidate(). Either also stops a build
+    that was already running from being stored, since it may have read
+    the old data.
+    """
+
+    def __init__(self, max_age: float = CATEGORY_MENU_MAX_AGE_SECONDS):
+        self.max_age = max_age
+        self._trees: Dict[str, Tuple[CategoryTree, float]] = {}
+        self._generations: Dict[str, int] = {}
+        self._builds = SingleFlight()
+        self.hits = 0
+        self.builds = 0
+        self.item_updates = 0
+        self.invalidations = 0
+
+    async def get(self, merchant_id: str, builder: Callable[[], Awaitable[CategoryTree]]) -> CategoryTree:
+        entry = self._trees.get(merchant_id)
+        if entry and entry[1] > time.monotonic():
+            self.hits += 1
+            return entry[0]
+        return await self._builds.do(merchant_id, lambda: self._build(merchant_id, builder))
+
+    async def _build(self, merchant_id: str, builder: Callable[[], Awaitable[CategoryTree]]) -> CategoryTree:
+        generation = self._generations.get(merchant_id, 0)
+        tree = await builder()
+        self.builds += 1
+        if self._generations.get(merchant_id, 0) == generation:
+            self._trees[merchant_id] = (tree, time.monotonic() + self.max_age)
+        return tree
+
+    def apply_item(self, merchant_id: str, item_id: str, item: Optional[Dict[str, Any]]) -> bool:
+        """
+        Patch one item into the cached tree; `item` is the raw Clover item,
+        or None when it was deleted. Returns False when nothing was cached.
+        """
+        self._generations[merchant_id] = self._generations.get(merchant_id, 0) + 1
+        entry = self._trees.get(merchant_id)
+        if not entry:
+            return False
+        if item is None:
+            entry[0].remove_item(item_id)
+        else:
+            entry[0].put_clover_item(item)
+        self.item_updates += 1
+        return True
+
+    def invalidate(self, merchant_id: str) -> None:
+        self._generations[merchant_id] = self._generations.get(merchant_id, 0) + 1
+        self._trees.pop(merchant_id, None)
+        self.invalidations += 1
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "merchants": len(self._trees),
+            "max_age_seconds": self.max_age,
+            "hits": self.hits,
+            "builds": self.builds,
+            "item_updates": self.item_updates,
+            "invalidations": self.invalidations,
+            "coalesced_builds": self._builds.metrics(),
+        }
+
+
+category_menu_cache = CategoryMenuCache()
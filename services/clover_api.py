@@ -1,66 +1,195 @@
-import httpx
-import os
+import asyncio
+from typing import Any, AsyncIterator, Dict, List, Optional
+
 from fastapi import HTTPException
+import httpx
+
+from services.clover_client import clover_client
+from services.clover_scheduler import CloverPriority
 
-# Use the environment variable for the base URL, with a fallback
-BASE_URL = os.getenv("CLOVER_BASE_URL", "https://apisandbox.dev.clover.com")
+# Largest page Clover accepts for collection endpoints
+CLOVER_MAX_PAGE_SIZE = 1000
+# How many pages of one collection are requested at the same time
+CLOVER_PAGE_CONCURRENCY = 4
 
 
 class CloverAPI:
     def __init__(self, merchant_id: str, access_token: str):
         self.merchant_id = merchant_id
         self.access_token = access_token
-        self.headers = {"Authorization": f"Bearer {access_token}"}
+
+    async def _get(self, endpoint: str, params: dict | None = None):
+        r = await clover_client.get(
+            f"/v3/merchants/{self.merchant_id}/{endpoint}",
+            access_token=self.access_token,
+            params=params,
+            priority=CloverPriority.CATALOG_READ,
+        )
+        r.raise_for_status()
+        return r.json()
 
     async def get_items(self, limit: int = 100, offset: int = 0, expand: str | None = None):
-        url = f"{BASE_URL}/v3/merchants/{self.merchant_id}/items"
         params = {"limit": limit, "offset": offset}
         if expand:
             params["expand"] = expand
-        async with httpx.AsyncClient() as client:
-            r = await client.get(url, headers=self.headers, params=params)
-            r.raise_for_status()
-            return r.json()
+        return await self._get("items", params)
 
     async def get_categories(self, limit: int = 100, offset: int = 0):
-        url = f"{BASE_URL}/v3/merchants/{self.merchant_id}/categories"
-        params = {"limit": limit, "offset": offset}
-        async with httpx.AsyncClient() as client:
-            r = await client.get(url, headers=self.headers, params=params)
-            r.raise_for_status()
-            return r.json()
+        return await self._get("categories", {"limit": limit, "offset": offset})
 
     async def get_modifier_groups(self, limit: int = 100, offset: int = 0):
-        url = f"{BASE_URL}/v3/merchants/{self.merchant_id}/modifier_groups"
-        params = {"limit": limit, "offset": offset}
-        async with httpx.AsyncClient() as client:
-            r = await client.get(url, headers=self.headers, params=params)
-            r.raise_for_status()
-            return r.json()
+        return await self._get("modifier_groups", {"limit": limit, "offset": offset})
+
+async def iter_clover_pages(
+    merchant_id: str,
+    access_token: str,
+    endpoint: str,
+    params: Optional[Dict[str, Any]] = None,
+    page_size: int = CLOVER_MAX_PAGE_SIZE,
+    concurrency: int = CLOVER_PAGE_CONCURRENCY,
+    priority: int = CloverPriority.CATALOG_READ,
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    """
+    Walk a Clover collection endpoint page by page.
+
+    The first page is requested alone; if it is full, the rest are
+    requested in windows of `concurrency` offsets at a time and yielded in
+    offset order. Clover does not report a total, so the walk
+    stops at the first page that comes back shorter than `page_size`.
+
+    Args:
+        merchant_id: Clover merchant ID
+        access_token: Merchant access token
+        endpoint: Collection path under the merchant, e.g. "items"
+        params: Extra query parameters (expand, filter, ...)
+        page_size: Elements per page, capped at Clover's maximum
+        concurrency: Maximum pages in flight at once
+        priority: Scheduler priority for the page requests
+
+    Yields:
+        The "elements" list of each page
+
+    Raises:
+        httpx.HTTPStatusError: When Clover answers a page with 4XX/5XX
+    """
+    page_size = max(1, min(page_size, CLOVER_MAX_PAGE_SIZE))
+    concurrency = max(1, concurrency)
+    path = f"/v3/merchants/{merchant_id}/{endpoint}"
+
+    async def fetch_page(offset: int) -> List[Dict[str, Any]]:
+        page_params = dict(params or {})
+        page_params.update({"limit": page_size, "offset": offset})
+        response = await clover_client.get(
+            path, access_token=access_token, params=page_params, priority=priority
+        )
+        response.raise_for_status()
+        return response.json().get("elements", [])
+
+    # Most collections fit in one page, so the first is fetched on its own
+    # and the windows only start once it comes back full
+    page = await fetch_page(0)
+    if page:
+        yield page
+    if len(page) < page_size:
+        return
+
+    offset = page_size
+    while True:
+        offsets = [offset + i * page_size for i in range(concurrency)]
+        pages = await asyncio.gather(*(fetch_page(o) for o in offsets))
+
+        for page in pages:
+            if page:
+                yield page
+            if len(page) < page_size:
+                return
+
+        offset = offsets[-1] + page_size
+
 
-async def make_clover_api_request(merchant_id: str, access_token: str, endpoint: str):
+async def iter_clover_elements(
+    merchant_id: str,
+    access_token: str,
+    endpoint: str,
+    params: Optional[Dict[str, Any]] = None,
+    **page_options,
+) -> AsyncIterator[Dict[str, Any]]:
+    """Yield every element of a Clover collection, one at a time."""
+    async for page in iter_clover_pages(merchant_id, access_token, endpoint, params, **page_options):
+        for element in page:
+            yield element
+
+
+async def fetch_all_clover_elements(
+    merchant_id: str,
+    access_token: str,
+    endpoint: str,
+    params: Optional[Dict[str, Any]] = None,
+    **page_options,
+) -> List[Dict[str, Any]]:
+    """Collect every page of a Clover collection into a single list."""
+    elements: List[Dict[str, Any]] = []
+    async for page in iter_clover_pages(merchant_id, access_token, endpoint, params, **page_options):
+        elements.extend(page)
+    return elements
+
+async def make_clover_api_request(
+    merchant_id: str,
+    access_token: str,
+    endpoint: str,
+    params: dict | None = None,
+):
     """
     A reusable function for making authenticated GET requests to the Clover API.
     This function now allows HTTPStatusError to be handled by the calling route.
     """
-    url = f"{BASE_URL}/v3/merchants/{merchant_id}/{endpoint}"
-    headers = {"Authorization": f"Bearer {access_token}"}
-
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(url, headers=headers)
-            response.raise_for_status()  # Raises HTTPStatusError for 4XX/5XX responses
-            return response.json()
-        except httpx.RequestError as e:
-            # Handle network-related errors
-            raise HTTPException(status_code=500, detail=f"A network error occurred: {e}")
+    try:
+        response = await clover_client.get(
+            f"/v3/merchants/{merchant_id}/{endpoint}",
+            access_token=access_token,
+            params=params,
+            priority=CloverPriority.CATALOG_READ,
+        )
+        response.raise_for_status()  # Raises HTTPStatusError for 4XX/5XX responses
+        return response.json()
+    except httpx.RequestError as e:
+        # Handle network-related errors
+        raise HTTPException(status_code=500, detail=f"A network error occurred: {e}")
+
+async def _fetch_collection(merchant_id: str, access_token: str, endpoint: str, params: dict | None = None):
+    """All pages of a collection, in the same {"elements": [...]} shape Clover returns."""
+    try:
+        elements = await fetch_all_clover_elements(merchant_id, access_token, endpoint, params)
+        return {"elements": elements}
+    except httpx.RequestError as e:
+        raise HTTPException(status_code=500, detail=f"A network error occurred: {e}")
 
 async def get_clover_categories(merchant_id: str, access_token: str):
     """Fetches all categories for a given merchant from the Clover API."""
-    return await make_clover_api_request(merchant_id, access_token, "categories")
+    return await _fetch_collection(merchant_id, access_token, "categories")
 
 async def get_clover_items(merchant_id: str, access_token: str):
     """
     Fetches all items for a merchant, expanding to include variants and categories.
     """
-    return await make_clover_api_request(merchant_id, access_token, "items?expand=variants,categories")
\ No newline at end of file
+    return await _fetch_collection(
+        merchant_id, access_token, "items", params={"expand": "variants,categories"}
+    )
+
+async def get_clover_merchant_details(merchant_id: str, access_token: str):
+    """Fetches the merchant record itself (name, owner, links)."""
+    response = await clover_client.get(f"/v3/merchants/{merchant_id}", access_token=access_token)
+    if response.status_code >= 400:
+        raise HTTPException(status_code=response.status_code, detail=f"Clover API error: {response.text}")
+    return response.json()
+
+async def get_clover_item_details(merchant_id: str, item_id: str, access_token: str):
+    """Fetches a single item with its variants expanded."""
+    response = await clover_client.get(
+        f"/v3/merchants/{merchant_id}/items/{item_id}",
+        access_token=access_token,
+        params={"expand": "variants"},
+    )
+    if response.status_code >= 400:
+        raise HTTPException(status_code=response.status_code, detail=f"Clover API error: {response.text}")
+    return response.json()
@@ -0,0 +1,346 @@
+# services/clover_client.py
+import json
+import os
+import re
+from typing import Any, Awaitable, Callable, Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+from dotenv import load_dotenv
+
+from services.clover_scheduler import CloverPriority, clover_scheduler, parse_retry_after
+from services.singleflight import SingleFlight
+
+load_dotenv()
+
+_MERCHANT_PATH = re.compile(r"/v3/merchants/([^/?]+)")
+
+# Status codes Clover uses to signal that the merchant's quota is exhausted
+THROTTLE_STATUS_CODES = (429, 503)
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def _env_bool(name: str, default: bool = False) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _origin(url: str) -> str:
+    """Return scheme://host[:port] for a URL so pools are keyed per upstream"""
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+class CloverPoolSettings:
+    """Connection pool and timeout settings for one Clover base URL"""
+
+    def __init__(
+        self,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 15.0,
+        write_timeout: float = 15.0,
+        pool_timeout: float = 5.0,
+        http2: bool = False,
+    ):
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.write_timeout = write_timeout
+        self.pool_timeout = pool_timeout
+        self.http2 = http2
+
+    @classmethod
+    def from_env(cls) -> "CloverPoolSettings":
+        """Default settings, overridable through CLOVER_HTTP_* environment variables"""
+        return cls(
+            max_connections=_env_int("CLOVER_HTTP_MAX_CONNECTIONS", 100),
+            max_keepalive_connections=_env_int("CLOVER_HTTP_MAX_KEEPALIVE", 20),
+            keepalive_expiry=_env_float("CLOVER_HTTP_KEEPALIVE_EXPIRY", 30.0),
+            connect_timeout=_env_float("CLOVER_HTTP_CONNECT_TIMEOUT", 5.0),
+            read_timeout=_env_float("CLOVER_HTTP_READ_TIMEOUT", 15.0),
+            write_timeout=_env_float("CLOVER_HTTP_WRITE_TIMEOUT", 15.0),
+            pool_timeout=_env_float("CLOVER_HTTP_POOL_TIMEOUT", 5.0),
+            http2=_env_bool("CLOVER_HTTP2"),
+        )
+
+    def merged(self, overrides: Dict[str, Any]) -> "CloverPoolSettings":
+        """Copy of these settings with the given keys replaced"""
+        values = dict(self.__dict__)
+        values.update({k: v for k, v in overrides.items() if k in values})
+        return CloverPoolSettings(**values)
+
+    def limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+
+    def timeout(self) -> httpx.Timeout:
+        return httpx.Timeout(
+            connect=self.connect_timeout,
+            read=self.read_timeout,
+            write=self.write_timeout,
+            pool=self.pool_timeout,
+        )
+
+
+class CloverClient:
+    """
+    Shared, keep-alive httpx client for every outbound Clover call.
+
+    One AsyncClient is kept per upstream origin (the REST API and the OAuth
+    token host usually differ), so connections and TLS sessions are reused
+    across requests instead of being set up and torn down each time.
+    The client is opened and closed by the FastAPI lifespan in main.py.
+
+    Every merchant-scoped call passes through the CloverScheduler, which
+    applies the per-merchant quota and priority ordering and backs off when
+    Clover answers 429/503.
+
+    Identical concurrent GETs (same merchant, path, params and token) are
+    coalesced: one upstream request is made and its response is shared by
+    every caller that was waiting on it.
+
+    When a merchant call is answered 401 and an unauthorized_handler is
+    set (the TokenRefreshManager), the handler is asked for a fresh token
+    and the request is retried once with it.
+
+    Per-origin overrides are read from CLOVER_HTTP_OVERRIDES, a JSON object
+    keyed by base URL, e.g.
+    {"https://api.clover.com": {"max_connections": 200, "read_timeout": 30}}
+    """
+
+    def __init__(self):
+        self.base_url: str = ""
+        self.default_settings: Optional[CloverPoolSettings] = None
+        self.overrides: Dict[str, Dict[str, Any]] = {}
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self.scheduler = clover_scheduler
+        self.throttle_retries = _env_int("CLOVER_THROTTLE_RETRIES", 2)
+        self.singleflight = SingleFlight()
+        # (merchant_id, rejected token) -> replacement token or None
+        self.unauthorized_handler: Optional[Callable[[str, str], Awaitable[Optional[str]]]] = None
+        self.unauthorized_retries = 0
+
+    async def start(self) -> None:
+        """Load settings from the environment and open the default pool"""
+        self.base_url = os.getenv("CLOVER_BASE_URL", "https://apisandbox.dev.clover.com").rstrip("/")
+        self.default_settings = CloverPoolSettings.from_env()
+
+        raw_overrides = os.getenv("CLOVER_HTTP_OVERRIDES")
+        if raw_overrides:
+            try:
+                self.overrides = {
+                    _origin(url): values for url, values in json.loads(raw_overrides).items()
+                }
+            except (ValueError, AttributeError) as e:
+                print(f"Ignoring invalid CLOVER_HTTP_OVERRIDES: {e}")
+                self.overrides = {}
+
+        self.client_for(self.base_url)
+
+    async def close(self) -> None:
+        """Close every pooled connection"""
+        clients, self._clients = self._clients, {}
+        for client in clients.values():
+            await client.aclose()
+
+    @property
+    def started(self) -> bool:
+        return self.default_settings is not None
+
+    def _settings_for(self, origin: str) -> CloverPoolSettings:
+        settings = self.default_settings or CloverPoolSettings.from_env()
+        if origin in self.overrides:
+            settings = settings.merged(self.overrides[origin])
+        return settings
+
+    def client_for(self, url: str) -> httpx.AsyncClient:
+        """Return the pooled AsyncClient for the origin of the given URL"""
+        origin = _origin(url)
+        client = self._clients.get(origin)
+        if client is None or client.is_closed:
+            settings = self._settings_for(origin)
+            http2 = settings.http2
+            if http2:
+                try:
+                    import h2  # noqa: F401  (optional dependency of httpx[http2])
+                except ImportError:
+                    print("CLOVER_HTTP2 is set but the 'h2' package is not installed; using HTTP/1.1")
+                    http2 = False
+
+            client = httpx.AsyncClient(
+                base_url=origin,
+                limits=settings.limits(),
+                timeout=settings.timeout(),
+                http2=http2,
+            )
+            self._clients[origin] = client
+        return client
+
+    def url_for(self, path: str) -> str:
+        """Resolve an API path such as /v3/merchants/{mId}/items against the base URL"""
+        if path.startswith("http://") or path.startswith("https://"):
+            return path
+        if not self.base_url:
+            self.base_url = os.getenv("CLOVER_BASE_URL", "https://apisandbox.dev.clover.com").rstrip("/")
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    async def request(
+        self,
+        method: str,
+        path: str,
+        access_token: Optional[str] = None,
+        params: Optional[Dict[str, Any]] = None,
+        json: Optional[Any] = None,
+        data: Optional[Dict[str, Any]] = None,
+        headers: Optional[Dict[str, str]] = None,
+        priority: int = CloverPriority.DEFAULT,
+        merchant_id: Optional[str] = None,
+        coalesce: bool = True,
+        retry_unauthorized: bool = True,
+    ) -> httpx.Response:
+        """
+        Send a request to Clover over the shared pool.
+
+        Args:
+            method: HTTP method
+            path: API path relative to CLOVER_BASE_URL, or an absolute URL
+            access_token: Merchant access token, sent as a Bearer header
+            params: Query parameters
+            json: JSON body
+            data: Form body
+            headers: Extra headers
+            priority: CloverPriority used when the merchant's quota is contended
+            merchant_id: Quota key; taken from the /v3/merchants/{mId} path when omitted
+            coalesce: Share the response of an identical GET already in flight
+            retry_unauthorized: On 401, refresh the merchant token and retry once
+
+        Returns:
+            The raw httpx.Response; callers keep their own status handling.
+            A coalesced response object is shared, so treat it as read-only.
+        """
+        url = self.url_for(path)
+        if merchant_id is None:
+            match = _MERCHANT_PATH.search(url)
+            merchant_id = match.group(1) if match else None
+
+        if coalesce and method.upper() == "GET" and json is None and data is None:
+            key = (
+                merchant_id,
+                url,
+                tuple(sorted((k, str(v)) for k, v in (params or {}).items())),
+                access_token,
+                tuple(sorted((headers or {}).items())),
+            )
+            response = await self.singleflight.do(
+                key,
+                lambda: self._send(method, url, access_token, params, None, None, headers, priority, merchant_id),
+            )
+        else:
+            response = await self._send(method, url, access_token, params, json, data, headers, priority, merchant_id)
+
+        # A 401 was not processed, so any method may be retried with a new token
+        if (
+            response.status_code == 401
+            and retry_unauthorized
+            and access_token
+            and merchant_id
+            and self.unauthorized_handler
+        ):
+            new_token = await self.unauthorized_handler(merchant_id, access_token)
+            if new_token and new_token != access_token:
+                self.unauthorized_retries += 1
+                return await self.request(
+                    method, url, access_token=new_token, params=params, json=json, data=data,
+                    headers=headers, priority=priority, merchant_id=merchant_id,
+                    coalesce=coalesce, retry_unauthorized=False,
+                )
+        return response
+
+    async def _send(
+        self,
+        method: str,
+        url: str,
+        access_token: Optional[str],
+        params: Optional[Dict[str, Any]],
+        json: Optional[Any],
+        data: Optional[Dict[str, Any]],
+        headers: Optional[Dict[str, str]],
+        priority: int,
+        merchant_id: Optional[str],
+    ) -> httpx.Response:
+        """Issue one upstream request through the merchant's scheduler lane"""
+        request_headers = {}
+        if data is None:
+            request_headers["Content-Type"] = "application/json"
+        if access_token:
+            request_headers["Authorization"] = f"Bearer {access_token}"
+        if headers:
+            request_headers.update(headers)
+
+        client = self.client_for(url)
+
+        if merchant_id is None:
+            # OAuth and other non-merchant endpoints are not quota-scheduled
+            return await client.request(
+                method, url, params=params, json=json, data=data, headers=request_headers
+            )
+
+        attempt = 0
+        while True:
+            async with self.scheduler.slot(merchant_id, priority):
+                response = await client.request(
+                    method, url, params=params, json=json, data=data, headers=request_headers
+                )
+
+            # A 429 was never processed, so any method may retry it; a 503 only for reads
+            retryable = response.status_code == 429 or (
+                response.status_code == 503 and method.upper() == "GET"
+            )
+            if response.status_code not in THROTTLE_STATUS_CODES:
+                self.scheduler.record_success(merchant_id)
+                return response
+
+            # The merchant lane stays closed for the backoff, so the retry
+            # simply queues again behind it
+            self.scheduler.record_throttle(
+                merchant_id, parse_retry_after(response.headers.get("Retry-After"))
+            )
+            if not retryable or attempt >= self.throttle_retries:
+                return response
+
+            attempt += 1
+            await response.aclose()
+
+    async def get(self, path: str, access_token: Optional[str] = None, **kwargs) -> httpx.Response:
+        return await self.request("GET", path, access_token=access_token, **kwargs)
+
+    async def post(self, path: str, access_token: Optional[str] = None, **kwargs) -> httpx.Response:
+        return await self.request("POST", path, access_token=access_token, **kwargs)
+
+
+# Process-wide instance, started and closed by the app lifespan
+clover_client = CloverClient()
+
+
+def get_clover_client() -> CloverClient:
+    """FastAPI dependency / accessor for the shared Clover client"""
+    return clover_client
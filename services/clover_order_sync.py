@@ -0,0 +1,190 @@
+# services/clover_order_sync.py
+import asyncio
+import hashlib
+import os
+from typing import Any, Collection, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from services.clover_client import clover_client
+from services.clover_scheduler import CloverPriority
+
+load_dotenv()
+
+# How many line item / modifier POSTs one cart sync keeps in flight
+CLOVER_ORDER_SYNC_CONCURRENCY = int(os.getenv("CLOVER_ORDER_SYNC_CONCURRENCY", "5"))
+# Set to false for Clover environments without the bulk_line_items endpoint
+CLOVER_BULK_LINE_ITEMS = os.getenv("CLOVER_BULK_LINE_ITEMS", "true").lower() in ("1", "true", "yes", "on")
+
+
+def _line_item_payload(cart_item) -> Dict[str, Any]:
+    return {
+        "item": {
+            "id": cart_item.clover_item_id
+        },
+        "unitQty": cart_item.quantity,
+        "note": cart_item.notes or ""
+    }
+
+
+def _modification_payload(modifier) -> Dict[str, Any]:
+    return {
+        "modifier": {
+            "id": modifier.clover_modifier_id
+        },
+        "amount": int(modifier.price * 100)  # Convert to cents
+    }
+
+
+def idempotency_headers(key: Optional[str], *parts: Any) -> Optional[Dict[str, str]]:
+    """
+    Idempotency-Key header for one Clover write, derived from a submission
+    key and the thing being written so a retry sends the same value
+    """
+    if not key:
+        return None
+    suffix = ":".join(str(p) for p in parts)
+    if len(suffix) > 64:
+        suffix = hashlib.sha256(suffix.encode()).hexdigest()[:32]
+    return {"Idempotency-Key": f"{key}:{suffix}" if suffix else key}
+
+
+async def _gather_bounded(coros: List, concurrency: int) -> List[Any]:
+    """Run coroutines with at most `concurrency` in flight, results in input order"""
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run(coro):
+        async with semaphore:
+            return await coro
+
+    return await asyncio.gather(*(run(c) for c in coros))
+
+
+async def push_line_items(
+    merchant_id: str,
+    order_id: str,
+    access_token: str,
+    cart_items: List[Any],
+    concurrency: int = CLOVER_ORDER_SYNC_CONCURRENCY,
+    idempotency_key: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Create Clover line items for cart items.
+
+    Uses POST .../orders/{orderId}/bulk_line_items so the whole cart is one
+    round trip. If Clover rejects the bulk call as unsupported, falls back
+    to one POST per item, `concurrency` at a time.
+
+    Returns:
+        One result per cart item, in order:
+        {"cart_item_id", "clover_line_item_id", "error"}
+    """
+    if not cart_items:
+        return []
+
+    base = f"/v3/merchants/{merchant_id}/orders/{order_id}"
+
+    if CLOVER_BULK_LINE_ITEMS:
+        response = await clover_client.post(
+            f"{base}/bulk_line_items",
+            access_token=access_token,
+            json={"items": [_line_item_payload(ci) for ci in cart_items]},
+            headers=idempotency_headers(idempotency_key, "line_items", *(ci.id for ci in cart_items)),
+            priority=CloverPriority.ORDER_WRITE,
+        )
+        if response.status_code < 400:
+            created = response.json()
+            if isinstance(created, dict):
+                created = created.get("elements", [])
+            if len(created) == len(cart_items):
+                return [
+                    {"cart_item_id": ci.id, "clover_line_item_id": li.get("id"), "error": None}
+                    for ci, li in zip(cart_items, created)
+                ]
+            # Clover created something we cannot map back to cart items
+            return [
+                {"cart_item_id": ci.id, "clover_line_item_id": None,
+                 "error": f"Bulk line item response had {len(created)} items for {len(cart_items)} cart items"}
+                for ci in cart_items
+            ]
+        if response.status_code not in (404, 405, 501):
+            return [
+                {"cart_item_id": ci.id, "clover_line_item_id": None,
+                 "error": f"Failed to add line items: {response.text}"}
+                for ci in cart_items
+            ]
+
+    async def push_one(cart_item) -> Dict[str, Any]:
+        response = await clover_client.post(
+            f"{base}/line_items",
+            access_token=access_token,
+            json=_line_item_payload(cart_item),
+            headers=idempotency_headers(idempotency_key, "line_item", cart_item.id),
+            priority=CloverPriority.ORDER_WRITE,
+        )
+        if response.status_code >= 400:
+            return {"cart_item_id": cart_item.id, "clover_line_item_id": None,
+                    "error": f"Failed to add line item: {response.text}"}
+        return {"cart_item_id": cart_item.id, "clover_line_item_id": response.json().get("id"), "error": None}
+
+    return await _gather_bounded([push_one(ci) for ci in cart_items], concurrency)
+
+
+async def push_modifiers(
+    merchant_id: str,
+    order_id: str,
+    access_token: str,
+    cart_items: List[Any],
+    concurrency: int = CLOVER_ORDER_SYNC_CONCURRENCY,
+    idempotency_key: Optional[str] = None,
+    done_modifier_ids: Collection[int] = (),
+) -> List[Dict[str, Any]]:
+    """
+    Add every cart item modifier to its Clover line item, `concurrency`
+    POSTs at a time. Items without a Clover line item and modifiers in
+    `done_modifier_ids` are skipped.
+
+    Returns:
+        One result per modifier, in cart order:
+        {"cart_item_id", "modifier_id", "clover_modification_id", "name", "price", "error"}
+    """
+    pairs = [
+        (cart_item, modifier)
+        for cart_item in cart_items
+        if getattr(cart_item, "clover_line_item_id", None)
+        for modifier in cart_item.modifiers
+        if modifier.id not in done_modifier_ids
+    ]
+
+    async def push_one(cart_item, modifier) -> Dict[str, Any]:
+        url = (
+            f"/v3/merchants/{merchant_id}/orders/"
+            f"{order_id}/line_items/{cart_item.clover_line_item_id}/modifications"
+        )
+        response = await clover_client.post(
+            url,
+            access_token=access_token,
+            json=_modification_payload(modifier),
+            headers=idempotency_headers(idempotency_key, "modification", modifier.id),
+            priority=CloverPriority.ORDER_WRITE,
+        )
+        result: Dict[str, Any] = {
+            "cart_item_id": cart_item.id,
+            "modifier_id": modifier.id,
+            "clover_modification_id": None,
+            "name": modifier.name,
+            "price": modifier.price,
+            "error": None,
+        }
+        if response.status_code >= 400:
+            result["error"] = f"Failed to add modifier: {response.text}"
+        else:
+            result["clover_modification_id"] = response.json().get("id")
+        return result
+
+    return await _gather_bounded([push_one(ci, m) for ci, m in pairs], concurrency)
+
+
+def failed_results(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [r for r in results if r.get("error")]
+
@@ -0,0 +1,263 @@
+# services/clover_scheduler.py
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from enum import IntEnum
+from typing import Any, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+class CloverPriority(IntEnum):
+    """Lower value is served first when a merchant's quota is contended"""
+    ORDER_WRITE = 0     # order / line item / modifier writes at checkout
+    DEFAULT = 1         # anything that did not ask for a priority
+    CATALOG_READ = 2    # menu, category, modifier and stock browsing
+    BACKGROUND = 3      # sync workers, pollers, refresh jobs
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After as seconds; accepts both delta-seconds and HTTP-date forms"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+class _WaitStats:
+    """Queue wait-time statistics for one priority class"""
+
+    def __init__(self, window: int = 1024):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.recent = deque(maxlen=window)
+
+    def record(self, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.recent.append(seconds)
+
+    def snapshot(self) -> Dict[str, Any]:
+        ordered = sorted(self.recent)
+
+        def pct(p: float) -> float:
+            if not ordered:
+                return 0.0
+            return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+        return {
+            "count": self.count,
+            "avg_ms": round(1000 * self.total / self.count, 2) if self.count else 0.0,
+            "p50_ms": round(1000 * pct(0.50), 2),
+            "p95_ms": round(1000 * pct(0.95), 2),
+            "max_ms": round(1000 * self.max, 2),
+        }
+
+
+class _MerchantLane:
+    """Token bucket, in-flight cap and priority queue for one merchant"""
+
+    def __init__(self, rate: float, burst: float):
+        self.base_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.in_flight = 0
+        self.waiters: List[Tuple[int, int, asyncio.Future, float]] = []
+        self.blocked_until = 0.0
+        self.throttle_streak = 0
+        self.throttled_total = 0
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+    def refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+
+class CloverScheduler:
+    """
+    Admission control in front of every Clover call.
+
+    Each merchant gets a token bucket (Clover quotas are per merchant token),
+    a cap on concurrent requests and a priority queue, so checkout writes are
+    admitted ahead of catalog reads when the quota is contended. A 429/503
+    pauses the merchant for Retry-After (or an exponential backoff) and halves
+    its rate; successful calls restore the rate gradually.
+    """
+
+    def __init__(
+        self,
+        rate: float = 16.0,
+        burst: float = 16.0,
+        max_in_flight: int = 5,
+        min_rate: float = 1.0,
+        max_backoff: float = 30.0,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.max_in_flight = max_in_flight
+        self.min_rate = min_rate
+        self.max_backoff = max_backoff
+        self._lanes: Dict[str, _MerchantLane] = {}
+        self._seq = itertools.count()
+        self._wait_stats = {p: _WaitStats() for p in CloverPriority}
+
+    @classmethod
+    def from_env(cls) -> "CloverScheduler":
+        return cls(
+            rate=float(os.getenv("CLOVER_RATE_PER_SECOND", "16")),
+            burst=float(os.getenv("CLOVER_RATE_BURST", "16")),
+            max_in_flight=int(os.getenv("CLOVER_MAX_IN_FLIGHT", "5")),
+            min_rate=float(os.getenv("CLOVER_MIN_RATE_PER_SECOND", "1")),
+            max_backoff=float(os.getenv("CLOVER_MAX_BACKOFF_SECONDS", "30")),
+        )
+
+    def _lane(self, merchant_id: str) -> _MerchantLane:
+        lane = self._lanes.get(merchant_id)
+        if lane is None:
+            lane = _MerchantLane(self.rate, self.burst)
+            self._lanes[merchant_id] = lane
+        return lane
+
+    def _schedule(self, lane: _MerchantLane, delay: float) -> None:
+        if lane.timer is not None:
+            return
+        loop = asyncio.get_running_loop()
+
+        def fire():
+            lane.timer = None
+            self._dispatch(lane)
+
+        lane.timer = loop.call_later(max(delay, 0.001), fire)
+
+    def _dispatch(self, lane: _MerchantLane) -> None:
+        """Admit as many queued callers as the bucket and in-flight cap allow"""
+        while lane.waiters:
+            now = time.monotonic()
+            if now < lane.blocked_until:
+                self._schedule(lane, lane.blocked_until - now)
+                return
+            if lane.in_flight >= self.max_in_flight:
+                return  # release() dispatches again
+            lane.refill(now)
+            if lane.tokens < 1:
+                self._schedule(lane, (1 - lane.tokens) / lane.rate)
+                return
+
+            priority, _, future, enqueued_at = heapq.heappop(lane.waiters)
+            if future.done():
+                continue  # caller gave up while queued
+
+            lane.tokens -= 1
+            lane.in_flight += 1
+            self._wait_stats[CloverPriority(priority)].record(now - enqueued_at)
+            future.set_result(None)
+
+    async def acquire(self, merchant_id: str, priority: int = CloverPriority.DEFAULT) -> None:
+        """Wait until the merchant's quota admits one more request"""
+        lane = self._lane(merchant_id)
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(lane.waiters, (int(priority), next(self._seq), future, time.monotonic()))
+        self._dispatch(lane)
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release(merchant_id)
+            raise
+
+    def release(self, merchant_id: str) -> None:
+        lane = self._lane(merchant_id)
+        lane.in_flight = max(0, lane.in_flight - 1)
+        self._dispatch(lane)
+
+    @asynccontextmanager
+    async def slot(self, merchant_id: str, priority: int = CloverPriority.DEFAULT):
+        await self.acquire(merchant_id, priority)
+        try:
+            yield
+        finally:
+            self.release(merchant_id)
+
+    def record_throttle(self, merchant_id: str, retry_after: Optional[float] = None) -> float:
+        """
+        Back off after a 429/503 from Clover.
+
+        Returns:
+            The pause applied to the merchant, in seconds
+        """
+        lane = self._lane(merchant_id)
+        lane.throttle_streak += 1
+        lane.throttled_total += 1
+        lane.rate = max(self.min_rate, lane.rate / 2)
+        lane.tokens = 0.0
+
+        if retry_after is None:
+            retry_after = min(self.max_backoff, 0.5 * (2 ** (lane.throttle_streak - 1)))
+        lane.blocked_until = max(lane.blocked_until, time.monotonic() + retry_after)
+        return retry_after
+
+    def record_success(self, merchant_id: str) -> None:
+        lane = self._lane(merchant_id)
+        lane.throttle_streak = 0
+        if lane.rate < lane.base_rate:
+            lane.rate = min(lane.base_rate, lane.rate + lane.base_rate * 0.1)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Queue depths per merchant and priority, plus wait-time statistics"""
+        now = time.monotonic()
+        merchants = {}
+        total_depth = 0
+        for merchant_id, lane in self._lanes.items():
+            depth = {p.name.lower(): 0 for p in CloverPriority}
+            for priority, _, future, _ in lane.waiters:
+                if not future.done():
+                    depth[CloverPriority(priority).name.lower()] += 1
+            queued = sum(depth.values())
+            total_depth += queued
+            merchants[merchant_id] = {
+                "queued": queued,
+                "queue_depth": depth,
+                "in_flight": lane.in_flight,
+                "tokens": round(lane.tokens, 2),
+                "rate_per_second": round(lane.rate, 2),
+                "blocked_for_seconds": round(max(0.0, lane.blocked_until - now), 2),
+                "throttled_total": lane.throttled_total,
+            }
+
+        return {
+            "config": {
+                "rate_per_second": self.rate,
+                "burst": self.burst,
+                "max_in_flight": self.max_in_flight,
+            },
+            "total_queued": total_depth,
+            "wait_time": {p.name.lower(): stats.snapshot() for p, stats in self._wait_stats.items()},
+            "merchants": merchants,
+        }
+
+
+# Process-wide scheduler used by services.clover_client
+clover_scheduler = CloverScheduler.from_env()
@@ -0,0 +1,202 @@
+# services/clover_webhooks.py
+import asyncio
+import hmac
+import json
+import os
+from typing import Any, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from helpers.cart_helper import CartHelper
+from helpers.catalog_helper import CatalogHelper
+from helpers.merchant_helper import MerchantHelper
+from helpers.webhook_helper import WebhookHelper
+from services.cart_events import cart_events
+from services.category_menu import category_menu_cache
+from services.catalog_sync import CATALOG_ENTITIES, catalog_sync_worker, run_in_async_session, run_in_session
+from services.clover_client import clover_client
+from services.clover_scheduler import CloverPriority
+from services.menu_snapshot import menu_snapshots
+from services.response_cache import response_cache
+from services.stock_snapshot import stock_snapshots
+
+load_dotenv()
+
+# Shown in the Clover developer dashboard; Clover sends it as X-Clover-Auth
+CLOVER_WEBHOOK_AUTH_CODE = os.getenv("CLOVER_WEBHOOK_AUTH_CODE")
+
+# Clover object type -> cached endpoint families the object can appear in
+# (None means everything cached for the merchant)
+CACHE_FAMILIES: Dict[str, Optional[tuple]] = {
+    "I": ("items", "categories", "item_stocks"),
+    "IC": ("categories", "items"),
+    "IG": ("modifier_groups",),
+    "IM": ("modifier_groups",),
+    "M": None,
+}
+
+# Clover object type -> mirror entities refreshed from the single object
+MIRROR_ENTITIES: Dict[str, tuple] = {
+    "I": ("items", "item_stocks"),
+    "IC": ("categories",),
+    "IG": ("modifier_groups",),
+}
+
+
+def verify_clover_auth(header_value: Optional[str]) -> bool:
+    """Constant-time check of the X-Clover-Auth header"""
+    if not CLOVER_WEBHOOK_AUTH_CODE or not header_value:
+        return False
+    return hmac.compare_digest(header_value.encode(), CLOVER_WEBHOOK_AUTH_CODE.encode())
+
+
+def parse_clover_webhook(payload: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Flatten a Clover webhook body into one dict per change.
+
+    Clover groups changes by merchant:
+        {"appId": "...", "merchants": {"MID": [{"objectId": "I:ID", "type": "UPDATE", "ts": 1700000000000}]}}
+
+    Entries that do not have that shape are skipped.
+    """
+    events = []
+    merchants = payload.get("merchants")
+    if not isinstance(merchants, dict):
+        return events
+    for merchant_id, changes in merchants.items():
+        if not isinstance(changes, list):
+            continue
+        for change in changes:
+            object_id = change.get("objectId") if isinstance(change, dict) else None
+            if not isinstance(object_id, str) or not object_id:
+                continue
+            events.append({
+                "merchant_id": merchant_id,
+                "object_type": object_id.split(":", 1)[0],
+                "object_id": object_id,
+                "event_type": (change.get("type") or "UPDATE").upper(),
+                "ts": change.get("ts"),
+                "payload": json.dumps(change),
+            })
+    return events
+
+
+class CloverWebhookService:
+    """Applies logged Clover change events to the catalog mirror, orders and response cache"""
+
+    @staticmethod
+    async def apply_event(event_id: int) -> Optional[str]:
+        """
+        Apply one logged event; safe to run again for the same event.
+
+        Returns:
+            The error message, or None when the event was applied
+        """
+        event = await asyncio.to_thread(run_in_session, WebhookHelper.get_event, event_id)
+        if not event:
+            return "event not found"
+
+        merchant_id = event.clover_merchant_id
+        object_type = event.object_type
+        clover_id = event.object_id.split(":", 1)[-1]
+        deleted = event.event_type == "DELETE"
+
+        error = None
+        access_token = None
+        try:
+            access_token = await run_in_async_session(MerchantHelper.get_merchant_token, merchant_id)
+
+            if access_token and object_type in MIRROR_ENTITIES:
+                for entity in MIRROR_ENTITIES[object_type]:
+                    data = await CloverWebhookService._refresh_mirror_row(
+                        merchant_id, access_token, entity, clover_id, deleted
+                    )
+                    if entity == "items":
+                        # One item changed: patch the cached category tree instead of rebuilding it
+                        category_menu_cache.apply_item(merchant_id, clover_id, data)
+                    elif entity == "item_stocks":
+                        stock_snapshots.apply(merchant_id, data)
+            elif access_token and object_type == "IM":
+                # Modifier events do not name their group; a delta sync picks them up
+                catalog_sync_worker.trigger(merchant_id, access_token)
+            elif access_token and object_type == "O":
+                await CloverWebhookService._refresh_order(merchant_id, access_token, clover_id, deleted)
+        except Exception as e:
+            error = str(e)
+            print(f"Clover webhook event {event_id} ({event.object_id}) failed: {error}")
+        finally:
+            # Invalidate after the mirror write so a concurrent read cannot re-cache the old row
+            if object_type in ("IC", "M") or (error and object_type == "I"):
+                category_menu_cache.invalidate(merchant_id)
+            if object_type in CACHE_FAMILIES:
+                response_cache.invalidate_merchant(merchant_id, CACHE_FAMILIES[object_type])
+                menu_snapshots.mark_stale(merchant_id, access_token)
+
+        await asyncio.to_thread(run_in_session, WebhookHelper.mark_result, event_id, error)
+        return error
+
+    @staticmethod
+    async def process_events(event_ids: List[int]) -> Dict[int, Optional[str]]:
+        """Apply events in order; one failure does not stop the rest"""
+        results = {}
+        for event_id in event_ids:
+            results[event_id] = await CloverWebhookService.apply_event(event_id)
+        return results
+
+    @staticmethod
+    async def _refresh_mirror_row(
+        merchant_id: str,
+        access_token: str,
+        entity: str,
+        clover_id: str,
+        deleted: bool
+    ) -> Optional[Dict[str, Any]]:
+        """Re-read one object into the mirror; returns the Clover object, or None when it is gone"""
+        endpoint, params, upsert = CATALOG_ENTITIES[entity]
+
+        data = None
+        if not deleted:
+            r = await clover_client.get(
+                f"/v3/merchants/{merchant_id}/{endpoint}/{clover_id}",
+                access_token=access_token,
+                params=params or None,
+                priority=CloverPriority.BACKGROUND,
+            )
+            if r.status_code != 404:
+                r.raise_for_status()
+                data = r.json()
+
+        if data is None:
+            await asyncio.to_thread(run_in_session, CatalogHelper.delete_by_ids, merchant_id, entity, [clover_id])
+        else:
+            await asyncio.to_thread(run_in_session, upsert, merchant_id, [data])
+        return data
+
+    @staticmethod
+    async def _refresh_order(merchant_id: str, access_token: str, clover_order_id: str, deleted: bool) -> None:
+        clover_order = None
+        if not deleted:
+            r = await clover_client.get(
+                f"/v3/merchants/{merchant_id}/orders/{clover_order_id}",
+                access_token=access_token,
+                priority=CloverPriority.BACKGROUND,
+            )
+            if r.status_code != 404:
+                r.raise_for_status()
+                clover_order = r.json()
+
+        await asyncio.to_thread(
+            run_in_session, WebhookHelper.apply_clover_order, merchant_id, clover_order_id, clover_order
+        )
+
+        # Clients streaming the cart see the change instead of polling Clover for it
+        if cart_events.has_subscribers():
+            cart_ids = await run_in_async_session(CartHelper.get_cart_ids_for_clover_order, merchant_id, clover_order_id)
+            for cart_id in cart_ids:
+                cart_events.publish(cart_id, "order", {
+                    "cart_id": cart_id,
+                    "clover_order_id": clover_order_id,
+                    "deleted": clover_order is None,
+                    "state": (clover_order or {}).get("state"),
+                    "payment_state": (clover_order or {}).get("paymentState"),
+                })
@@ -1,4 +1,7 @@
-from sqlalchemy.orm import Session
+import asyncio
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 from typing import Optional, Dict, Any
 from datetime import datetime
 from models.conversation import ConversationEntry, QuestionMaster, AnswerMaster
@@ -17,8 +20,8 @@ class ConversationService:
         ai_analyzer = OpenAIAnalyzer()
 
     @staticmethod
-    def create_conversation_entry(
-        db: Session,
+    async def create_conversation_entry(
+        db: AsyncSession,
         entry_data: ConversationEntryCreate
     ) -> ConversationEntryResponse:
         """Create a new conversation entry with AI analysis"""
@@ -34,7 +37,7 @@ class ConversationService:
         print("=== answer_key type ===", type(entry_data.answer_key))
 
         # Validate question exists
-        if not validate_question_key(db, entry_data.question_key):
+        if not await validate_question_key(db, entry_data.question_key):
             raise ValueError(f"Invalid question key: {entry_data.question_key}")
 
         # entry_dict = entry_data.dict()
@@ -56,7 +59,7 @@ class ConversationService:
 
         # Validate answer if provided (either manually or by AI)
         if entry_data.answer_key:
-            if not validate_answer_key(db, entry_data.answer_key, entry_data.question_key):
+            if not await validate_answer_key(db, entry_data.answer_key, entry_data.question_key):
                 # print(f"Invalid answer_key: {entry_data.answer_key}, setting to None")
                 entry_data.answer_key = None
 
@@ -96,20 +99,20 @@ class ConversationService:
             print(f"db_entry.response_text: {db_entry.response_text}")
 
             db.add(db_entry)
-            db.commit()
-            db.refresh(db_entry)
+            await db.commit()
+            await db.refresh(db_entry)
             print("Entry created successfully with ID:", db_entry.id)
 
             return ConversationEntryResponse.from_orm(db_entry)
 
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             print(f"Database error: {str(e)}")
             raise ValueError(f"Failed to create conversation entry: {str(e)}")
 
     @staticmethod
-    def analyze_text_only(
-        db: Session,
+    async def analyze_text_only(
+        db: AsyncSession,
         question_key: str,
         user_text: str
     ) -> Optional[str]:
@@ -122,25 +125,26 @@ class ConversationService:
         ai_analyzer = OpenAIAnalyzer()
 
         # Validate question exists
-        if not validate_question_key(db, question_key):
+        if not await validate_question_key(db, question_key):
             raise ValueError(f"Invalid question key: {question_key}")
 
         # Get available answers
-        available_answers = get_active_answers_for_question(db, question_key)
+        available_answers = await get_active_answers_for_question(db, question_key)
 
         if not available_answers:
             return None
 
-        # Use OpenAI to analyze
-        return ai_analyzer.analyze_user_response(
+        # Use OpenAI to analyze; the client is blocking, keep it off the event loop
+        return await asyncio.to_thread(
+            ai_analyzer.analyze_user_response,
             user_text=user_text,
             question_key=question_key,
             available_answers=available_answers
         )
 
     @staticmethod
-    def process_select_answer(
-        db: Session,
+    async def process_select_answer(
+        db: AsyncSession,
         session_id: Optional[str],
         user_id: Optional[int],
         question_key: str,
@@ -157,7 +161,7 @@ class ConversationService:
 
             try:
                 ai_analyzer = GeminiAnalyzer()
-                available_answers = get_active_answers_for_question(db, question_key)
+                available_answers = await get_active_answers_for_question(db, question_key)
 
                 if available_answers:
                     # available_answers is already in the correct format (list of dicts)
@@ -166,7 +170,8 @@ class ConversationService:
                     print(f"Available answers: {answer_list}")
 
                     # Use Gemini AI to find the best matching answer
-                    ai_matched_answer = ai_analyzer.analyze_user_response(
+                    ai_matched_answer = await asyncio.to_thread(
+                        ai_analyzer.analyze_user_response,
                         user_text=response_text,
                         question_key=question_key,
                         available_answers=answer_list
@@ -204,23 +209,23 @@ class ConversationService:
         )
 
         # Get user language from session
-        user_language = ConversationService.get_user_language(db, session_id)
+        user_language = await ConversationService.get_user_language(db, session_id)
 
         # Handle special cases before creating conversation entry
         if answer_key == "SORRY_DONT_UNDERSTAND":
             return ConversationService._handle_sorry_response(entry_data)
         elif answer_key == "SUGGESTION_REQUEST":
-            return ConversationService._handle_suggestion_request(db, entry_data, response_text)
+            return await ConversationService._handle_suggestion_request(db, entry_data, response_text)
 
         # For normal responses, add language info to the response
-        conversation_entry = ConversationService.create_conversation_entry(db, entry_data)
+        conversation_entry = await ConversationService.create_conversation_entry(db, entry_data)
 
         # Add language info to the response (this will be handled by the route)
         return conversation_entry
 
     @staticmethod
-    def process_voice_answer(
-        db: Session,
+    async def process_voice_answer(
+        db: AsyncSession,
         session_id: Optional[str],
         user_id: Optional[int],
         question_key: str,
@@ -237,7 +242,7 @@ class ConversationService:
         matched_answer_key = None
         try:
             ai_analyzer = GeminiAnalyzer()
-            available_answers = get_active_answers_for_question(db, question_key)
+            available_answers = await get_active_answers_for_question(db, question_key)
 
             if available_answers:
                 # available_answers is already in the correct format (list of dicts)
@@ -246,7 +251,8 @@ class ConversationService:
                 print(f"Available answers: {answer_list}")
 
                 # Use Gemini AI to find the best matching answer
-                matched_answer_key = ai_analyzer.analyze_user_response(
+                matched_answer_key = await asyncio.to_thread(
+                    ai_analyzer.analyze_user_response,
                     user_text=voice_text,
                     question_key=question_key,
                     available_answers=answer_list
@@ -274,14 +280,14 @@ class ConversationService:
         )
 
         # Get user language from session for all cases
-        user_language = ConversationService.get_user_language(db, session_id)
+        user_language = await ConversationService.get_user_language(db, session_id)
 
         # Handle special cases before creating conversation entry
         if matched_answer_key == "SORRY_DONT_UNDERSTAND":
             conversation_entry = ConversationService._handle_sorry_response(entry_data)
         elif matched_answer_key == "SUGGESTION_REQUEST":
             # Get food suggestions
-            suggestion_response = ConversationService.get_food_suggestions(
+            suggestion_response = await ConversationService.get_food_suggestions(
                 db=db,
                 user_text=voice_text,
                 user_language=user_language
@@ -296,9 +302,9 @@ class ConversationService:
             print(f"=== Entry Data Before DB Creation ===")
             print(f"entry_data.responseText: {entry_data.responseText}")
 
-            conversation_entry = ConversationService.create_conversation_entry(db, entry_data)
+            conversation_entry = await ConversationService.create_conversation_entry(db, entry_data)
         else:
-            conversation_entry = ConversationService.create_conversation_entry(db, entry_data)
+            conversation_entry = await ConversationService.create_conversation_entry(db, entry_data)
 
         # Return entry with match status and language info
         return {
@@ -310,45 +316,57 @@ class ConversationService:
         }
 
     @staticmethod
-    def get_next_question(
-        db: Session,
+    async def get_next_question(
+        db: AsyncSession,
         session_id: str,
         current_question_key: Optional[str] = None
     ) -> Optional[QuestionMaster]:
-        """Get the next question in the wizard flow"""
+        """Get the next question in the wizard flow, with its answers loaded"""
 
         if current_question_key:
             # Get current question order
-            current_question = db.query(QuestionMaster).filter(
-                QuestionMaster.question_key == current_question_key
-            ).first()
+            result = await db.execute(
+                select(QuestionMaster).where(QuestionMaster.question_key == current_question_key)
+            )
+            current_question = result.scalars().first()
 
             if current_question:
                 # Get next question by order
-                next_question = db.query(QuestionMaster).filter(
-                    QuestionMaster.question_order > current_question.question_order,
-                    QuestionMaster.is_active == True
-                ).order_by(QuestionMaster.question_order).first()
-
-                return next_question
+                result = await db.execute(
+                    select(QuestionMaster)
+                    .options(selectinload(QuestionMaster.answers))
+                    .where(
+                        QuestionMaster.question_order > current_question.question_order,
+                        QuestionMaster.is_active == True
+                    )
+                    .order_by(QuestionMaster.question_order)
+                )
+                return result.scalars().first()
         else:
             # Get first question
-            return db.query(QuestionMaster).filter(
-                QuestionMaster.is_active == True
-            ).order_by(QuestionMaster.question_order).first()
+            result = await db.execute(
+                select(QuestionMaster)
+                .options(selectinload(QuestionMaster.answers))
+                .where(QuestionMaster.is_active == True)
+                .order_by(QuestionMaster.question_order)
+            )
+            return result.scalars().first()
 
         return None
 
     @staticmethod
-    def get_conversation_history(
-        db: Session,
+    async def get_conversation_history(
+        db: AsyncSession,
         session_id: str
     ) -> list:
         """Get conversation history for a session"""
 
-        entries = db.query(ConversationEntry).filter(
-            ConversationEntry.session_id == session_id
-        ).order_by(ConversationEntry.created_at).all()
+        result = await db.execute(
+            select(ConversationEntry)
+            .where(ConversationEntry.session_id == session_id)
+            .order_by(ConversationEntry.created_at)
+        )
+        entries = result.scalars().all()
 
         return [ConversationEntryResponse.from_orm(entry) for entry in entries]
 
@@ -370,15 +388,16 @@ class ConversationService:
         )
 
     @staticmethod
-    def _handle_suggestion_request(db: Session, entry_data: ConversationEntryCreate, user_text: str) -> ConversationEntryResponse:
+    async def _handle_suggestion_request(db: AsyncSession, entry_data: ConversationEntryCreate, user_text: str) -> ConversationEntryResponse:
         """Handle food suggestion requests"""
         try:
             # Extract dietary preference from user text
             dietary_preference = ConversationService._extract_dietary_preference(user_text)
 
             # Get food suggestions
-            suggestion_service = FoodSuggestionService(db)
-            suggestions = suggestion_service.get_suggestions_by_dietary_preference(dietary_preference, limit=5)
+            suggestion_service, suggestions = await db.run_sync(
+                ConversationService._suggest, dietary_preference
+            )
 
             # Format the response
             suggestion_response = suggestion_service.format_suggestions_response(suggestions, dietary_preference)
@@ -416,11 +435,12 @@ class ConversationService:
             return 'veg'
 
     @staticmethod
-    def get_user_language(db: Session, session_id: str) -> str:
+    async def get_user_language(db: AsyncSession, session_id: str) -> str:
         """Get user language from sessions table"""
         try:
             from models.conversation import Session
-            session = db.query(Session).filter(Session.id == session_id).first()
+            result = await db.execute(select(Session).where(Session.id == session_id))
+            session = result.scalars().first()
             if session and session.language:
                 return session.language
             return "en"  # Default to English
@@ -429,15 +449,16 @@ class ConversationService:
             return "en"  # Default to English
 
     @staticmethod
-    def get_food_suggestions(db: Session, user_text: str, user_language: str = "en") -> str:
+    async def get_food_suggestions(db: AsyncSession, user_text: str, user_language: str = "en") -> str:
         """Get food suggestions with language support"""
         try:
             # Extract dietary preference from user text
             dietary_preference = ConversationService._extract_dietary_preference(user_text)
 
             # Get food suggestions
-            suggestion_service = FoodSuggestionService(db)
-            suggestions = suggestion_service.get_suggestions_by_dietary_preference(dietary_preference, limit=5)
+            suggestion_service, suggestions = await db.run_sync(
+                ConversationService._suggest, dietary_preference
+            )
 
             # Format the response with language support
             suggestion_response = suggestion_service.format_suggestions_response_with_language(
@@ -449,3 +470,9 @@ class ConversationService:
         except Exception as e:
             print(f"Error getting food suggestions: {str(e)}")
             return "Sorry, I couldn't get food suggestions at the moment. Please try again later."
+
+    @staticmethod
+    def _suggest(sync_db, dietary_preference: str):
+        """Run FoodSuggestionService on the sync Session behind an AsyncSession"""
+        suggestion_service = FoodSuggestionService(sync_db)
+        return suggestion_service, suggestion_service.get_suggestions_by_dietary_preference(dietary_preference, limit=5)
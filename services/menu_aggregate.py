@@ -0,0 +1,176 @@
+# services/menu_aggregate.py
+import asyncio
+import hashlib
+import json
+import os
+from typing import Any, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from services.clover_api import fetch_all_clover_elements
+from services.clover_client import clover_client
+from services.clover_scheduler import CloverPriority
+
+load_dotenv()
+
+# Upstream requests one menu build keeps in flight, across all collections
+MENU_FETCH_CONCURRENCY = int(os.getenv("MENU_FETCH_CONCURRENCY", "8"))
+
+MENU_SCHEMA_VERSION = 1
+
+# collection -> query params; expansions pull nested objects in with their parent
+MENU_COLLECTIONS: Dict[str, Dict[str, str]] = {
+    "items": {"expand": "variants,categories,modifierGroups"},
+    "categories": {},
+    "modifier_groups": {"expand": "modifiers"},
+    "item_stocks": {},
+}
+
+
+def _elements(value: Any) -> List[Dict[str, Any]]:
+    """Clover nests expanded collections as {"elements": [...]}"""
+    if isinstance(value, dict):
+        return value.get("elements", []) or []
+    if isinstance(value, list):
+        return value
+    return []
+
+
+def _ids(value: Any) -> List[str]:
+    return [e["id"] for e in _elements(value) if e.get("id")]
+
+
+def menu_version(menu: Dict[str, Any]) -> str:
+    """Content hash of a menu document, ignoring its own version field"""
+    content = {k: v for k, v in menu.items() if k != "version"}
+    body = json.dumps(content, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    return hashlib.sha256(body).hexdigest()[:16]
+
+
+async def fetch_menu_collections(
+    merchant_id: str,
+    access_token: str,
+    concurrency: int = MENU_FETCH_CONCURRENCY,
+) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Every collection a menu is built from, fetched concurrently.
+
+    Modifier groups come with their modifiers expanded; a group Clover
+    returns without them is completed with one request per group. All of
+    it shares a budget of `concurrency` requests in flight.
+    """
+    concurrency = max(1, concurrency)
+    page_concurrency = max(1, concurrency // len(MENU_COLLECTIONS))
+
+    names = list(MENU_COLLECTIONS)
+    results = await asyncio.gather(*(
+        fetch_all_clover_elements(
+            merchant_id, access_token, name, MENU_COLLECTIONS[name] or None,
+            concurrency=page_concurrency,
+        )
+        for name in names
+    ))
+    collections = dict(zip(names, results))
+
+    missing = [g for g in collections["modifier_groups"] if g.get("id") and "modifiers" not in g]
+    if missing:
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def fill(group: Dict[str, Any]) -> None:
+            async with semaphore:
+                r = await clover_client.get(
+                    f"/v3/merchants/{merchant_id}/modifier_groups/{group['id']}/modifiers",
+                    access_token=access_token,
+                    priority=CloverPriority.CATALOG_READ,
+                )
+            r.raise_for_status()
+            group["modifiers"] = r.json()
+
+        await asyncio.gather(*(fill(g) for g in missing))
+
+    return collections
+
+
+def join_menu(merchant_id: str, collections: Dict[str, List[Dict[str, Any]]]) -> Dict[str, Any]:
+    """
+    Join raw Clover collections into one menu document. Prices are in
+    cents, as Clover sends them. Each collection is walked once.
+    """
+    stocks = {}
+    for s in collections.get("item_stocks", []):
+        item_id = (s.get("item") or {}).get("id") or s.get("id")
+        if item_id:
+            stocks[item_id] = {"quantity": s.get("quantity"), "stock_count": s.get("stockCount")}
+
+    categories = [
+        {"id": c["id"], "name": c.get("name"), "sort_order": c.get("sortOrder"), "item_ids": []}
+        for c in collections.get("categories", [])
+        if c.get("id") and not c.get("deleted")
+    ]
+    categories_by_id = {c["id"]: c for c in categories}
+
+    items = []
+    for item in collections.get("items", []):
+        item_id = item.get("id")
+        if not item_id or item.get("deleted"):
+            continue
+        category_ids = [cid for cid in _ids(item.get("categories")) if cid in categories_by_id]
+        for cid in category_ids:
+            categories_by_id[cid]["item_ids"].append(item_id)
+        items.append({
+            "id": item_id,
+            "name": item.get("name"),
+            "price": item.get("price") or 0,
+            "price_type": item.get("priceType"),
+            "hidden": bool(item.get("hidden", False)),
+            "available": bool(item.get("available", True)),
+            "category_ids": category_ids,
+            "modifier_group_ids": _ids(item.get("modifierGroups")),
+            "variations": [
+                {"id": v.get("id"), "name": v.get("name"), "price": v.get("price") or 0}
+                for v in _elements(item.get("variants"))
+            ],
+            "stock": stocks.get(item_id),
+        })
+
+    modifier_groups = [
+        {
+            "id": g["id"],
+            "name": g.get("name"),
+            "min_required": g.get("minRequired"),
+            "max_allowed": g.get("maxAllowed"),
+            "modifiers": [
+                {
+                    "id": m.get("id"),
+                    "name": m.get("name"),
+                    "price": m.get("price") or 0,
+                    "available": bool(m.get("available", True)),
+                }
+                for m in _elements(g.get("modifiers"))
+            ],
+        }
+        for g in collections.get("modifier_groups", [])
+        if g.get("id") and not g.get("deleted")
+    ]
+
+    menu = {
+        "schema_version": MENU_SCHEMA_VERSION,
+        "merchant_id": merchant_id,
+        "categories": categories,
+        "items": items,
+        "modifier_groups": modifier_groups,
+    }
+    menu["version"] = menu_version(menu)
+    return menu
+
+
+async def build_full_menu(
+    merchant_id: str,
+    access_token: str,
+    concurrency: Optional[int] = None,
+) -> Dict[str, Any]:
+    """Fetch everything a menu needs from Clover and join it into one versioned document"""
+    collections = await fetch_menu_collections(
+        merchant_id, access_token, concurrency or MENU_FETCH_CONCURRENCY
+    )
+    return join_menu(merchant_id, collections)
@@ -0,0 +1,383 @@
+# services/menu_snapshot.py
+import asyncio
+import json
+import mmap
+import os
+import re
+import shutil
+import tempfile
+import time
+from typing import Any, Dict, Optional, Set
+
+from dotenv import load_dotenv
+from fastapi import Request, Response
+
+from services.menu_aggregate import build_full_menu
+from services.response_cache import etag_matches
+from services.singleflight import SingleFlight
+from utils.compression import brotli, choose_encoding, compress_bytes
+from utils.json_response import dumps
+
+try:
+    import fcntl
+except ImportError:  # not on Windows; builds are then only coalesced within a process
+    fcntl = None
+
+load_dotenv()
+
+# Shared by every worker on the host; each one maps the same files
+MENU_SNAPSHOT_DIR = os.getenv("MENU_SNAPSHOT_DIR", os.path.join(tempfile.gettempdir(), "menu_snapshots"))
+# A snapshot older than this is still served while a fresh one is built in the background
+MENU_SNAPSHOT_MAX_AGE_SECONDS = float(os.getenv("MENU_SNAPSHOT_MAX_AGE_SECONDS", "30"))
+# Versions kept per merchant so recently handed out versioned URLs keep resolving
+MENU_SNAPSHOT_KEEP_VERSIONS = int(os.getenv("MENU_SNAPSHOT_KEEP_VERSIONS", "5"))
+# Each version is compressed once, so this can afford more than the middleware's levels
+MENU_SNAPSHOT_GZIP_LEVEL = int(os.getenv("MENU_SNAPSHOT_GZIP_LEVEL", "9"))
+MENU_SNAPSHOT_BROTLI_QUALITY = int(os.getenv("MENU_SNAPSHOT_BROTLI_QUALITY", "9"))
+
+MENU_SNAPSHOT_IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+SNAPSHOT_ID_PATTERN = "^[A-Za-z0-9_-]{1,64}$"
+_SNAPSHOT_ID = re.compile(SNAPSHOT_ID_PATTERN)
+
+# encoding -> file suffix; "identity" is always written
+_SUFFIXES = {"identity": ".json", "gzip": ".json.gz", "br": ".json.br"}
+_POINTER = "current.json"
+_STALE_MARKER = "stale"
+_REFRESH_MARKER = "refresh"
+_LOCK = ".build.lock"
+
+
+class MenuBlob:
+    """One encoding of a snapshot, memory-mapped read-only from disk"""
+
+    __slots__ = ("encoding", "etag", "view")
+
+    def __init__(self, path: str, encoding: str, version: str):
+        with open(path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.encoding = encoding
+        self.etag = f'"{version}"' if encoding == "identity" else f'"{version}-{encoding}"'
+        # Responses send slices of the mapping; the pages live in the shared page cache
+        self.view = memoryview(mapped)
+
+
+class MenuSnapshot:
+    __slots__ = ("merchant_id", "version", "built_at", "started_ns", "blobs")
+
+    def __init__(self, merchant_id: str, version: str, built_at: float, started_ns: int, blobs: Dict[str, MenuBlob]):
+        self.merchant_id = merchant_id
+        self.version = version
+        self.built_at = built_at
+        self.started_ns = started_ns
+        self.blobs = blobs
+
+    def blob(self, encoding: Optional[str]) -> MenuBlob:
+        return self.blobs.get(encoding or "identity") or self.blobs["identity"]
+
+
+class MenuSnapshotStore:
+    """
+    Full menus rendered once into content-addressed blobs on local disk.
+
+    A build joins the menu (services.menu_aggregate), encodes it and writes
+    identity, gzip and brotli files named after the menu's content hash,
+    then points the merchant's current.json at that version. Workers map
+    the files and answer requests with the mapped bytes, so serving a menu
+    costs no serialization or compression.
+
+    Invalidation only touches a marker file: a snapshot whose build started
+    before the marker's mtime is not served, in any worker. Catalog changes
+    use mark_stale instead, whose marker only makes the snapshot old: old
+    snapshots are served while one worker rebuilds them in the background;
+    an flock on the merchant's directory keeps workers from building the
+    same menu at once.
+    """
+
+    def __init__(self, root: str = MENU_SNAPSHOT_DIR, max_age: float = MENU_SNAPSHOT_MAX_AGE_SECONDS):
+        self.root = root
+        self.max_age = max_age
+        # merchant -> ((inode, mtime) of current.json, snapshot it named)
+        self._current: Dict[str, tuple] = {}
+        self._builds = SingleFlight()
+        self._refreshing: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self.hits = 0
+        self.misses = 0
+        self.stale_served = 0
+        self.builds = 0
+        self.unchanged_builds = 0
+        self.refresh_failures = 0
+
+    def _dir(self, merchant_id: str) -> str:
+        if not _SNAPSHOT_ID.match(merchant_id):
+            raise ValueError(f"Invalid merchant id for a menu snapshot: {merchant_id!r}")
+        return os.path.join(self.root, merchant_id)
+
+    # ---- reads ------------------------------------------------------------
+
+    async def current(self, merchant_id: str, access_token: str) -> MenuSnapshot:
+        """
+        The merchant's menu snapshot, built first if there is none or it was
+        invalidated; one older than max_age is returned as is and refreshed
+        in the background
+        """
+        snapshot = self._load_current(merchant_id)
+        if snapshot is None:
+            self.misses += 1
+            return await self._builds.do(merchant_id, lambda: self._rebuild(merchant_id, access_token, wait=True))
+
+        self.hits += 1
+        if (
+            time.time() - snapshot.built_at > self.max_age
+            or snapshot.started_ns <= self._marker_ns(self._dir(merchant_id), _REFRESH_MARKER)
+        ):
+            self.stale_served += 1
+            self._refresh_in_background(merchant_id, access_token)
+        return snapshot
+
+    def version(self, merchant_id: str, version: str) -> Optional[MenuSnapshot]:
+        """A specific, immutable version of the merchant's menu, if it is still on disk"""
+        if not _SNAPSHOT_ID.match(version):
+            return None
+        cached = self._current.get(merchant_id)
+        if cached and cached[1].version == version:
+            return cached[1]
+        try:
+            return self._open(merchant_id, version, 0.0, 0)
+        except (OSError, ValueError):
+            return None
+
+    def _load_current(self, merchant_id: str) -> Optional[MenuSnapshot]:
+        directory = self._dir(merchant_id)
+        try:
+            st = os.stat(os.path.join(directory, _POINTER))
+        except FileNotFoundError:
+            self._current.pop(merchant_id, None)
+            return None
+
+        stamp = (st.st_ino, st.st_mtime_ns)
+        cached = self._current.get(merchant_id)
+        if cached is None or cached[0] != stamp:
+            try:
+                with open(os.path.join(directory, _POINTER), "rb") as f:
+                    record = json.load(f)
+                snapshot = self._open(merchant_id, record["version"], record["built_at"], record["started_ns"])
+            except (OSError, ValueError, KeyError):
+                return None
+            cached = (stamp, snapshot)
+            self._current[merchant_id] = cached
+
+        snapshot = cached[1]
+        if snapshot.started_ns <= self._marker_ns(directory, _STALE_MARKER):
+            return None
+        return snapshot
+
+    def _open(self, merchant_id: str, version: str, built_at: float, started_ns: int) -> MenuSnapshot:
+        directory = self._dir(merchant_id)
+        blobs = {}
+        for encoding, suffix in _SUFFIXES.items():
+            path = os.path.join(directory, version + suffix)
+            if os.path.exists(path):
+                blobs[encoding] = MenuBlob(path, encoding, version)
+        if "identity" not in blobs:
+            raise FileNotFoundError(f"Menu snapshot {merchant_id}/{version} is not on disk")
+        return MenuSnapshot(merchant_id, version, built_at, started_ns, blobs)
+
+    @staticmethod
+    def _marker_ns(directory: str, marker: str) -> int:
+        try:
+            return os.stat(os.path.join(directory, marker)).st_mtime_ns
+        except FileNotFoundError:
+            return 0
+
+    # ---- builds -----------------------------------------------------------
+
+    def _refresh_in_background(self, merchant_id: str, access_token: str) -> None:
+        if merchant_id in self._refreshing:
+            return
+        self._refreshing.add(merchant_id)
+
+        async def refresh() -> None:
+            try:
+                await self._rebuild(merchant_id, access_token, wait=False)
+            except Exception as e:
+                self.refresh_failures += 1
+                print(f"Menu snapshot refresh failed for {merchant_id}: {str(e)}")
+            finally:
+                self._refreshing.discard(merchant_id)
+
+        task = asyncio.create_task(refresh())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _rebuild(self, merchant_id: str, access_token: str, wait: bool) -> Optional[MenuSnapshot]:
+        """
+        Build under the merchant's lock. With wait=False the build is skipped
+        if another worker holds the lock; with wait=True a snapshot that
+        worker published while we waited is used instead of building again.
+        """
+        directory = self._dir(merchant_id)
+        os.makedirs(directory, exist_ok=True)
+        lock = await asyncio.to_thread(self._lock, directory, wait)
+        if lock is None:
+            return None
+        try:
+            if wait:
+                snapshot = self._load_current(merchant_id)
+                if snapshot is not None:
+                    return snapshot
+            started_ns = time.time_ns()
+            menu = await build_full_menu(merchant_id, access_token)
+            return await asyncio.to_thread(self._write, merchant_id, menu, started_ns)
+        finally:
+            lock.close()
+
+    @staticmethod
+    def _lock(directory: str, wait: bool):
+        f = open(os.path.join(directory, _LOCK), "a+b")
+        if fcntl is None:
+            return f
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX if wait else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            f.close()
+            return None
+        return f
+
+    def _write(self, merchant_id: str, menu: Dict[str, Any], started_ns: int) -> MenuSnapshot:
+        directory = self._dir(merchant_id)
+        version = menu["version"]
+        identity_path = os.path.join(directory, version + _SUFFIXES["identity"])
+
+        if os.path.exists(identity_path):
+            # Same content as a version already on disk; only the pointer moves
+            self.unchanged_builds += 1
+            os.utime(identity_path)
+        else:
+            body = dumps(menu)
+            blobs = {"gzip": compress_bytes(body, "gzip", MENU_SNAPSHOT_GZIP_LEVEL)[0]}
+            if brotli is not None:
+                blobs["br"] = compress_bytes(body, "br", MENU_SNAPSHOT_BROTLI_QUALITY)[0]
+            for encoding, data in blobs.items():
+                _write_atomic(os.path.join(directory, version + _SUFFIXES[encoding]), data)
+            # identity last: its presence marks the version complete
+            _write_atomic(identity_path, body)
+            self.builds += 1
+
+        built_at = time.time()
+        record = {"version": version, "built_at": built_at, "started_ns": started_ns}
+        _write_atomic(os.path.join(directory, _POINTER), json.dumps(record).encode("utf-8"))
+        self._prune(directory)
+        return self._open(merchant_id, version, built_at, started_ns)
+
+    @staticmethod
+    def _prune(directory: str) -> None:
+        versions = []
+        for name in os.listdir(directory):
+            if name.endswith(_SUFFIXES["identity"]) and name != _POINTER:
+                path = os.path.join(directory, name)
+                versions.append((os.stat(path).st_mtime, name[: -len(_SUFFIXES["identity"])]))
+        versions.sort(reverse=True)
+        for _, version in versions[max(1, MENU_SNAPSHOT_KEEP_VERSIONS):]:
+            # Workers that still map these files keep their pages until they drop them
+            for suffix in _SUFFIXES.values():
+                try:
+                    os.remove(os.path.join(directory, version + suffix))
+                except FileNotFoundError:
+                    pass
+
+    # ---- invalidation -----------------------------------------------------
+
+    def invalidate(self, merchant_id: str) -> None:
+        """Stop serving the merchant's current snapshot, in every worker; the next request rebuilds it"""
+        self._current.pop(merchant_id, None)
+        self._mark(merchant_id, _STALE_MARKER)
+
+    def mark_stale(self, merchant_id: str, access_token: Optional[str] = None) -> None:
+        """
+        Keep serving the merchant's current snapshot, in every worker, but
+        rebuild it in the background: right away when access_token is given,
+        otherwise on the next request for it
+        """
+        if self._mark(merchant_id, _REFRESH_MARKER) and access_token:
+            self._refresh_in_background(merchant_id, access_token)
+
+    def _mark(self, merchant_id: str, marker: str) -> bool:
+        """Touch one of the merchant's marker files; False if it has no snapshots"""
+        try:
+            directory = self._dir(merchant_id)
+        except ValueError:
+            return False
+        if not os.path.isdir(directory):
+            return False
+        path = os.path.join(directory, marker)
+        now = time.time_ns()
+        with open(path, "ab"):
+            pass
+        os.utime(path, ns=(now, now))
+        return True
+
+    def purge(self, merchant_id: str) -> None:
+        """Remove every stored version, e.g. when the merchant is deleted"""
+        try:
+            directory = self._dir(merchant_id)
+        except ValueError:
+            return
+        self._current.pop(merchant_id, None)
+        shutil.rmtree(directory, ignore_errors=True)
+
+    # ---- responses --------------------------------------------------------
+
+    def respond(
+        self,
+        request: Request,
+        snapshot: MenuSnapshot,
+        cache_control: str = "private, no-cache",
+        headers: Optional[Dict[str, str]] = None,
+    ) -> Response:
+        """The stored encoding the client prefers, sent as is; 304 on a matching If-None-Match"""
+        blob = snapshot.blob(choose_encoding(request.headers.get("accept-encoding", "")))
+        response_headers = {"ETag": blob.etag, "Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+        response_headers.update(headers or {})
+        if etag_matches(request.headers.get("if-none-match"), blob.etag):
+            return Response(status_code=304, headers=response_headers)
+        if blob.encoding != "identity":
+            response_headers["Content-Encoding"] = blob.encoding
+        return Response(content=blob.view, media_type="application/json", headers=response_headers)
+
+    def metrics(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "directory": self.root,
+            "merchants": len(self._current),
+            "mapped_bytes": sum(
+                len(blob.view) for _, snapshot in self._current.values() for blob in snapshot.blobs.values()
+            ),
+            "max_age_seconds": self.max_age,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "stale_served": self.stale_served,
+            "builds": self.builds,
+            "unchanged_builds": self.unchanged_builds,
+            "refresh_failures": self.refresh_failures,
+        }
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    """Readers see the old file or the complete new one, never a partial write"""
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+menu_snapshots = MenuSnapshotStore()
@@ -0,0 +1,244 @@
+# services/order_submission.py
+import json
+import uuid
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.database import AsyncSessionLocal
+from helpers.cart_helper import CartHelper
+from helpers.merchant_helper import MerchantHelper
+from models.cart import Cart, OrderSubmission
+from services.active_carts import active_carts
+from services.cart_events import cart_events
+from services.catalog_sync import run_in_async_session
+from services.clover_client import clover_client
+from services.clover_order_sync import failed_results, idempotency_headers, push_line_items, push_modifiers
+from services.clover_scheduler import CloverPriority
+from services.singleflight import SingleFlight
+
+
+def load_ids(value: Optional[str]) -> Dict[str, str]:
+    """An OrderSubmission id map (line_item_ids, modification_ids) as a dict"""
+    return json.loads(value) if value else {}
+
+
+class OrderSubmissionPipeline:
+    """
+    Pushes a cart to Clover as an order in one pass: create the order, add
+    the line items, add the modifiers.
+
+    The cart (with items and modifiers) and the merchant token are loaded
+    once. Every finished step, and every line item and modification Clover
+    acknowledged, is stored on the cart's OrderSubmission row, so a retry
+    after a failure only sends what is still missing. Each Clover write
+    carries an Idempotency-Key derived from the submission, so a write that
+    reached Clover before the failure is not applied twice. Concurrent
+    submissions of the same cart share one run.
+    """
+
+    _in_flight = SingleFlight()
+
+    @staticmethod
+    async def submit(cart_id: int, idempotency_key: Optional[str] = None) -> Dict[str, Any]:
+        return await OrderSubmissionPipeline._in_flight.do(
+            cart_id, lambda: OrderSubmissionPipeline._run(cart_id, idempotency_key)
+        )
+
+    @staticmethod
+    async def _run(cart_id: int, idempotency_key: Optional[str]) -> Dict[str, Any]:
+        # Unsaved cart edits must be part of the order; status changes below
+        # are made in the database, so the cart also leaves the store
+        await active_carts.flush(cart_id, evict=True)
+
+        # Own session: the run may outlive the request that started it
+        async with AsyncSessionLocal() as db:
+            cart = await CartHelper.get_cart_with_items(db, cart_id)
+            if not cart:
+                raise HTTPException(status_code=404, detail="Cart not found")
+
+            submission = await CartHelper.get_order_submission(db, cart_id)
+            if submission and submission.step == "completed":
+                return OrderSubmissionPipeline._result(cart, submission)
+            if not submission:
+                submission = await OrderSubmissionPipeline.start(db, cart, idempotency_key)
+
+            access_token = await MerchantHelper.get_merchant_token(db, cart.clover_merchant_id)
+            if not access_token:
+                raise HTTPException(status_code=404, detail="Merchant token not found")
+
+            submission.attempts = (submission.attempts or 0) + 1
+            await db.commit()
+            OrderSubmissionPipeline._publish(submission)
+
+            try:
+                await OrderSubmissionPipeline._create_order(db, cart, submission, access_token)
+                OrderSubmissionPipeline._publish(submission)
+                await OrderSubmissionPipeline._add_line_items(db, cart, submission, access_token)
+                OrderSubmissionPipeline._publish(submission)
+                await OrderSubmissionPipeline._add_modifiers(db, cart, submission, access_token)
+            except HTTPException as e:
+                submission.last_error = str(e.detail)[:2000]
+                await db.commit()
+                OrderSubmissionPipeline._publish(submission)
+                raise
+
+            submission.step = "completed"
+            submission.completed_at = datetime.now()
+            submission.last_error = None
+            cart.status = "completed"
+            await db.commit()
+            OrderSubmissionPipeline._publish(submission)
+            cart_events.publish(cart.id, "cart")
+            return OrderSubmissionPipeline._result(cart, submission)
+
+    @staticmethod
+    def _publish(submission: OrderSubmission) -> None:
+        """Progress for clients streaming the cart's events"""
+        cart_events.publish(submission.cart_id, "order", OrderSubmissionPipeline.progress(submission))
+
+    @staticmethod
+    async def load_progress(cart_id: int) -> Optional[Dict[str, Any]]:
+        """progress() of the cart's submission, from its own session; None if it was never submitted"""
+        submission = await run_in_async_session(CartHelper.get_order_submission, cart_id)
+        return OrderSubmissionPipeline.progress(submission) if submission else None
+
+    @staticmethod
+    async def start(db: AsyncSession, cart: Cart, idempotency_key: Optional[str] = None) -> OrderSubmission:
+        """A new submission for an active, non-empty cart, committed"""
+        if cart.status != "active":
+            raise HTTPException(status_code=400, detail="Can only submit active carts")
+        if not cart.items:
+            raise HTTPException(status_code=400, detail="Cart is empty")
+
+        if idempotency_key:
+            result = await db.execute(
+                select(OrderSubmission).where(OrderSubmission.idempotency_key == idempotency_key)
+            )
+            taken = result.scalars().first()
+            if taken:
+                raise HTTPException(status_code=409, detail="Idempotency key already used for another cart")
+
+        submission = OrderSubmission(
+            cart_id=cart.id,
+            clover_merchant_id=cart.clover_merchant_id,
+            idempotency_key=idempotency_key or uuid.uuid4().hex,
+            step="pending",
+            attempts=0
+        )
+        db.add(submission)
+        await db.commit()
+        return submission
+
+    @staticmethod
+    async def _create_order(db: AsyncSession, cart: Cart, submission: OrderSubmission, access_token: str) -> None:
+        if submission.clover_order_id:
+            return
+
+        clover_order_data = {
+            "orderType": {
+                "id": "FIRST_PARTY_DELIVERY"
+            },
+            "state": "OPEN",
+            "note": f"Order created from cart {cart.id}"
+        }
+        response = await clover_client.post(
+            f"/v3/merchants/{cart.clover_merchant_id}/orders",
+            access_token=access_token,
+            json=clover_order_data,
+            headers=idempotency_headers(submission.idempotency_key, "order"),
+            priority=CloverPriority.ORDER_WRITE,
+        )
+        if response.status_code >= 400:
+            raise HTTPException(status_code=response.status_code, detail=f"Clover API error: {response.text}")
+
+        submission.clover_order_id = response.json().get("id")
+        submission.step = "order_created"
+        await db.commit()
+
+    @staticmethod
+    async def _add_line_items(db: AsyncSession, cart: Cart, submission: OrderSubmission, access_token: str) -> None:
+        line_item_ids = load_ids(submission.line_item_ids)
+        pending_items = [ci for ci in cart.items if str(ci.id) not in line_item_ids]
+
+        results = await push_line_items(
+            cart.clover_merchant_id,
+            submission.clover_order_id,
+            access_token,
+            pending_items,
+            idempotency_key=submission.idempotency_key,
+        )
+        for result in results:
+            if result["clover_line_item_id"]:
+                line_item_ids[str(result["cart_item_id"])] = result["clover_line_item_id"]
+
+        # Keep partial progress even when some items failed
+        submission.line_item_ids = json.dumps(line_item_ids)
+        await db.commit()
+
+        failed = failed_results(results)
+        if failed:
+            raise HTTPException(status_code=502, detail=failed[0]["error"])
+
+        submission.step = "line_items_synced"
+        await db.commit()
+
+    @staticmethod
+    async def _add_modifiers(db: AsyncSession, cart: Cart, submission: OrderSubmission, access_token: str) -> None:
+        line_item_ids = load_ids(submission.line_item_ids)
+        modification_ids = load_ids(submission.modification_ids)
+        for cart_item in cart.items:
+            cart_item.clover_line_item_id = line_item_ids.get(str(cart_item.id))
+
+        results = await push_modifiers(
+            cart.clover_merchant_id,
+            submission.clover_order_id,
+            access_token,
+            cart.items,
+            idempotency_key=submission.idempotency_key,
+            done_modifier_ids={int(modifier_id) for modifier_id in modification_ids},
+        )
+        for result in results:
+            if result["clover_modification_id"]:
+                modification_ids[str(result["modifier_id"])] = result["clover_modification_id"]
+
+        submission.modification_ids = json.dumps(modification_ids)
+        await db.commit()
+
+        failed = failed_results(results)
+        if failed:
+            raise HTTPException(status_code=502, detail=failed[0]["error"])
+
+        submission.step = "modifiers_synced"
+        await db.commit()
+
+    @staticmethod
+    def _result(cart: Cart, submission: OrderSubmission) -> Dict[str, Any]:
+        return {
+            "success": True,
+            "message": "Order completed successfully",
+            "cart_id": cart.id,
+            "clover_order_id": submission.clover_order_id,
+            "status": "completed",
+            "idempotency_key": submission.idempotency_key,
+            "attempts": submission.attempts,
+            "line_items": len(load_ids(submission.line_item_ids)),
+            "modifications": len(load_ids(submission.modification_ids))
+        }
+
+    @staticmethod
+    def progress(submission: OrderSubmission) -> Dict[str, Any]:
+        return {
+            "cart_id": submission.cart_id,
+            "step": submission.step,
+            "clover_order_id": submission.clover_order_id,
+            "idempotency_key": submission.idempotency_key,
+            "attempts": submission.attempts,
+            "line_items": load_ids(submission.line_item_ids),
+            "modifications": load_ids(submission.modification_ids),
+            "last_error": submission.last_error,
+            "completed_at": submission.completed_at
+        }
@@ -0,0 +1,211 @@
+# services/response_cache.py
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, Optional, Set, Tuple
+
+from dotenv import load_dotenv
+from fastapi import Request, Response
+
+from services.singleflight import SingleFlight
+from utils.json_response import dumps
+
+load_dotenv()
+
+# Seconds a cached payload stays fresh, per endpoint family
+RESPONSE_CACHE_TTLS: Dict[str, float] = {
+    "items": float(os.getenv("RESPONSE_CACHE_TTL_ITEMS", "30")),
+    "categories": float(os.getenv("RESPONSE_CACHE_TTL_CATEGORIES", "60")),
+    "modifier_groups": float(os.getenv("RESPONSE_CACHE_TTL_MODIFIER_GROUPS", "60")),
+    "item_stocks": float(os.getenv("RESPONSE_CACHE_TTL_ITEM_STOCKS", "5")),
+}
+RESPONSE_CACHE_DEFAULT_TTL = float(os.getenv("RESPONSE_CACHE_DEFAULT_TTL", "30"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "2048"))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+
+def make_etag(body: bytes) -> str:
+    """Strong ETag derived from the exact response bytes"""
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match uses weak comparison, so W/ prefixes are ignored"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+class _CacheEntry:
+    __slots__ = ("body", "etag", "expires_at", "merchant_id", "size")
+
+    def __init__(self, body: bytes, etag: str, expires_at: float, merchant_id: Optional[str]):
+        self.body = body
+        self.etag = etag
+        self.expires_at = expires_at
+        self.merchant_id = merchant_id
+        self.size = len(body) + len(etag)
+
+
+class ResponseCache:
+    """
+    Bounded in-process cache of serialized JSON responses.
+
+    Entries expire after their TTL and the least recently used ones are
+    evicted once either the entry count or the byte budget is exceeded.
+    Entries are indexed by merchant so everything cached for one merchant
+    can be dropped at once when its catalog changes.
+    """
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES, max_bytes: int = RESPONSE_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Hashable, _CacheEntry]" = OrderedDict()
+        self._by_merchant: Dict[str, Set[Hashable]] = {}
+        # Bumped on invalidation (the epoch on clear) so a fill that started
+        # before it is not stored
+        self._generations: Dict[str, int] = {}
+        self._epoch = 0
+        self._fills = SingleFlight()
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.not_modified = 0
+
+    # ---- storage ----------------------------------------------------------
+
+    def get(self, key: Hashable) -> Optional[_CacheEntry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def set(self, key: Hashable, body: bytes, ttl: float, merchant_id: Optional[str] = None) -> _CacheEntry:
+        if key in self._entries:
+            self._remove(key)
+
+        entry = _CacheEntry(body, make_etag(body), time.monotonic() + ttl, merchant_id)
+        if entry.size > self.max_bytes:
+            return entry  # too big to keep, still usable for this response
+
+        self._entries[key] = entry
+        self.size_bytes += entry.size
+        if merchant_id:
+            self._by_merchant.setdefault(merchant_id, set()).add(key)
+
+        while self._entries and (len(self._entries) > self.max_entries or self.size_bytes > self.max_bytes):
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+        return entry
+
+    def _remove(self, key: Hashable) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self.size_bytes -= entry.size
+        if entry.merchant_id:
+            keys = self._by_merchant.get(entry.merchant_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_merchant[entry.merchant_id]
+
+    def invalidate_merchant(self, merchant_id: str, endpoints: Optional[Iterable[str]] = None) -> int:
+        """
+        Drop cached responses for a merchant, either all of them or only
+        those of the given endpoint families; returns how many were dropped
+        """
+        self._generations[merchant_id] = self._generations.get(merchant_id, 0) + 1
+        keys = list(self._by_merchant.get(merchant_id, ()))
+        if endpoints is not None:
+            wanted = set(endpoints)
+            keys = [key for key in keys if key[0] in wanted]
+        for key in keys:
+            self._remove(key)
+        return len(keys)
+
+    def _generation(self, merchant_id: Optional[str]) -> Tuple[int, int]:
+        return self._epoch, (self._generations.get(merchant_id, 0) if merchant_id else 0)
+
+    def clear(self) -> None:
+        self._epoch += 1
+        self._entries.clear()
+        self._by_merchant.clear()
+        self.size_bytes = 0
+
+    # ---- responses --------------------------------------------------------
+
+    async def respond(
+        self,
+        request: Request,
+        endpoint: str,
+        merchant_id: Optional[str],
+        producer: Callable[[], Awaitable[Any]],
+        ttl: Optional[float] = None,
+    ) -> Response:
+        """
+        Serve a JSON payload through the cache.
+
+        The key is the endpoint, the merchant and the request's query string.
+        On a miss `producer` builds the payload (concurrent misses for the same
+        key share one call); exceptions, e.g. HTTPException, are not cached.
+        A request whose If-None-Match matches the ETag gets an empty 304.
+        """
+        key = (endpoint, merchant_id, request.url.path, tuple(sorted(request.query_params.multi_items())))
+        if ttl is None:
+            ttl = RESPONSE_CACHE_TTLS.get(endpoint, RESPONSE_CACHE_DEFAULT_TTL)
+
+        entry = self.get(key)
+        if entry is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+            async def fill() -> _CacheEntry:
+                generation = self._generation(merchant_id)
+                payload = await producer()
+                body = dumps(payload)
+                if self._generation(merchant_id) != generation:
+                    return _CacheEntry(body, make_etag(body), 0.0, merchant_id)
+                return self.set(key, body, ttl, merchant_id)
+
+            entry = await self._fills.do(key, fill)
+
+        headers = {"ETag": entry.etag, "Cache-Control": "private, no-cache"}
+        if etag_matches(request.headers.get("if-none-match"), entry.etag):
+            self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+        return Response(content=entry.body, media_type="application/json", headers=headers)
+
+    def metrics(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "merchants": len(self._by_merchant),
+            "size_bytes": self.size_bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "not_modified": self.not_modified,
+        }
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,198 @@
+# services/stock_snapshot.py
+import asyncio
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from helpers.merchant_helper import MerchantHelper
+from services.catalog_sync import run_in_async_session
+from services.clover_api import fetch_all_clover_elements
+from services.menu_snapshot import menu_snapshots
+from services.response_cache import response_cache
+from services.singleflight import SingleFlight
+
+load_dotenv()
+
+STOCK_SNAPSHOT_ENABLED = os.getenv("STOCK_SNAPSHOT_ENABLED", "true").lower() in ("1", "true", "yes", "on")
+STOCK_SNAPSHOT_POLL_SECONDS = float(os.getenv("STOCK_SNAPSHOT_POLL_SECONDS", "15"))
+# Deltas cannot see deletions, so snapshots are reloaded in full this often
+STOCK_SNAPSHOT_FULL_RELOAD_SECONDS = float(os.getenv("STOCK_SNAPSHOT_FULL_RELOAD_SECONDS", "3600"))
+
+
+def stock_item_id(element: Dict[str, Any]) -> Optional[str]:
+    return (element.get("item") or {}).get("id") or element.get("id")
+
+
+class _StockSnapshot:
+    __slots__ = ("by_item", "watermark", "loaded_at", "_elements")
+
+    def __init__(self):
+        self.by_item: Dict[str, Dict[str, Any]] = {}
+        self.watermark: Optional[int] = None
+        self.loaded_at = time.monotonic()
+        self._elements: Optional[List[Dict[str, Any]]] = None
+
+    def merge(self, elements: List[Dict[str, Any]]) -> int:
+        """Apply Clover item_stock elements; returns how many rows changed"""
+        changed = 0
+        for element in elements:
+            item_id = stock_item_id(element)
+            if not item_id:
+                continue
+            modified = element.get("modifiedTime")
+            current = self.by_item.get(item_id)
+            # An older response (slow poll vs. webhook) must not win
+            if current and modified and current.get("modifiedTime") and modified < current["modifiedTime"]:
+                continue
+            if current != element:
+                self.by_item[item_id] = element
+                changed += 1
+            if modified and (self.watermark is None or modified > self.watermark):
+                self.watermark = modified
+        if changed:
+            self._elements = None
+        return changed
+
+    def elements(self) -> List[Dict[str, Any]]:
+        if self._elements is None:
+            self._elements = list(self.by_item.values())
+        return self._elements
+
+
+class StockSnapshotCache:
+    """
+    In-memory item stock per merchant, keyed by Clover item ID.
+
+    A merchant's snapshot is loaded in full the first time it is asked
+    for; a background poller then keeps it current with modifiedTime
+    deltas and reloads it in full now and then to drop deleted rows.
+    Item webhooks merge the single stock row they fetch. Lookups are
+    dict reads, so callers such as the cart can check availability
+    without going upstream.
+    """
+
+    def __init__(self, interval: float = STOCK_SNAPSHOT_POLL_SECONDS):
+        self.interval = interval
+        self._snapshots: Dict[str, _StockSnapshot] = {}
+        self._loads = SingleFlight()
+        self._task: Optional[asyncio.Task] = None
+        self.full_loads = 0
+        self.polls = 0
+        self.changes = 0
+
+    # ---- reads ------------------------------------------------------------
+
+    def get(self, merchant_id: str, item_id: str) -> Optional[Dict[str, Any]]:
+        snapshot = self._snapshots.get(merchant_id)
+        return snapshot.by_item.get(item_id) if snapshot else None
+
+    def available(self, merchant_id: str, item_id: str, quantity: int = 1) -> Optional[bool]:
+        """
+        Whether `quantity` of the item can be sold, per the snapshot.
+        None when the merchant has no snapshot yet; items without a stock
+        row are not tracked by Clover and count as available.
+        """
+        snapshot = self._snapshots.get(merchant_id)
+        if snapshot is None:
+            return None
+        stock = snapshot.by_item.get(item_id)
+        if stock is None or stock.get("quantity") is None:
+            return True
+        return stock["quantity"] >= quantity
+
+    async def ensure(self, merchant_id: str, access_token: str) -> _StockSnapshot:
+        """The merchant's snapshot, loading it from Clover the first time"""
+        snapshot = self._snapshots.get(merchant_id)
+        if snapshot is not None:
+            return snapshot
+        return await self._loads.do(merchant_id, lambda: self.load(merchant_id, access_token))
+
+    # ---- refresh ----------------------------------------------------------
+
+    async def load(self, merchant_id: str, access_token: str) -> _StockSnapshot:
+        elements = await fetch_all_clover_elements(merchant_id, access_token, "item_stocks")
+        snapshot = _StockSnapshot()
+        snapshot.merge(elements)
+        previous = self._snapshots.get(merchant_id)
+        self._snapshots[merchant_id] = snapshot
+        self.full_loads += 1
+        if previous is not None and previous.by_item != snapshot.by_item:
+            self._changed(merchant_id, 1, access_token)
+        return snapshot
+
+    async def poll(self, merchant_id: str, access_token: str) -> int:
+        """Pull rows modified since the snapshot's watermark; returns how many changed"""
+        snapshot = self._snapshots.get(merchant_id)
+        if snapshot is None:
+            await self.ensure(merchant_id, access_token)
+            return 0
+
+        params = {"filter": f"modifiedTime>={snapshot.watermark}"} if snapshot.watermark else None
+        elements = await fetch_all_clover_elements(merchant_id, access_token, "item_stocks", params)
+        self.polls += 1
+        changed = snapshot.merge(elements)
+        if changed:
+            self._changed(merchant_id, changed, access_token)
+        return changed
+
+    def apply(self, merchant_id: str, element: Optional[Dict[str, Any]]) -> None:
+        """Merge one stock row fetched elsewhere (webhooks); ignored until a snapshot exists"""
+        snapshot = self._snapshots.get(merchant_id)
+        if snapshot is not None and element:
+            changed = snapshot.merge([element])
+            if changed:
+                self._changed(merchant_id, changed)
+
+    def invalidate(self, merchant_id: str) -> None:
+        self._snapshots.pop(merchant_id, None)
+
+    def _changed(self, merchant_id: str, count: int, access_token: Optional[str] = None) -> None:
+        self.changes += count
+        response_cache.invalidate_merchant(merchant_id, ("item_stocks",))
+        menu_snapshots.mark_stale(merchant_id, access_token)
+
+    # ---- background poller ------------------------------------------------
+
+    def start(self) -> None:
+        if STOCK_SNAPSHOT_ENABLED and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            for merchant_id in list(self._snapshots):
+                try:
+                    access_token = await run_in_async_session(MerchantHelper.get_merchant_token, merchant_id)
+                    if not access_token:
+                        self.invalidate(merchant_id)
+                        continue
+                    snapshot = self._snapshots.get(merchant_id)
+                    if snapshot and time.monotonic() - snapshot.loaded_at > STOCK_SNAPSHOT_FULL_RELOAD_SECONDS:
+                        await self.load(merchant_id, access_token)
+                    else:
+                        await self.poll(merchant_id, access_token)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    print(f"Stock poll failed for {merchant_id}: {str(e)}")
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "merchants": len(self._snapshots),
+            "items": sum(len(s.by_item) for s in self._snapshots.values()),
+            "poll_interval_seconds": self.interval,
+            "full_loads": self.full_loads,
+            "polls": self.polls,
+            "changes": self.changes,
+        }
+
+
+stock_snapshots = StockSnapshotCache()
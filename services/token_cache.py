@@ -0,0 +1,79 @@
+# services/token_cache.py
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from services.singleflight import SingleFlight
+
+load_dotenv()
+
+# Seconds a resolved token is reused before it is read from the database again
+MERCHANT_TOKEN_CACHE_TTL = float(os.getenv("MERCHANT_TOKEN_CACHE_TTL", "300"))
+
+
+class MerchantTokenCache:
+    """
+    In-memory TTL cache of Clover access tokens keyed by Clover merchant ID.
+
+    Misses for the same merchant share one database lookup. Writers call
+    invalidate() after committing; a lookup that was already running when
+    the invalidation happened does not put its (possibly old) token back.
+    Missing tokens are not cached, so a newly added merchant resolves at once.
+    """
+
+    def __init__(self, ttl: float = MERCHANT_TOKEN_CACHE_TTL):
+        self.ttl = ttl
+        self._entries: Dict[str, Tuple[str, float]] = {}
+        self._generations: Dict[str, int] = {}
+        self._epoch = 0
+        self._loads = SingleFlight()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    async def get(self, clover_merchant_id: str, loader: Callable[[], Awaitable[Optional[str]]]) -> Optional[str]:
+        """Cached token for the merchant, loading it with `loader` on a miss"""
+        entry = self._entries.get(clover_merchant_id)
+        if entry and entry[1] > time.monotonic():
+            self.hits += 1
+            return entry[0]
+
+        self.misses += 1
+        return await self._loads.do(clover_merchant_id, lambda: self._load(clover_merchant_id, loader))
+
+    async def _load(self, clover_merchant_id: str, loader: Callable[[], Awaitable[Optional[str]]]) -> Optional[str]:
+        generation = self._generation(clover_merchant_id)
+        token = await loader()
+        if token and self._generation(clover_merchant_id) == generation:
+            self._entries[clover_merchant_id] = (token, time.monotonic() + self.ttl)
+        return token
+
+    def _generation(self, clover_merchant_id: str) -> Tuple[int, int]:
+        return self._epoch, self._generations.get(clover_merchant_id, 0)
+
+    def invalidate(self, clover_merchant_id: Optional[str] = None) -> None:
+        """Forget one merchant's token, or every token when no ID is given"""
+        self.invalidations += 1
+        if clover_merchant_id is None:
+            self._entries.clear()
+            self._epoch += 1
+            return
+        self._entries.pop(clover_merchant_id, None)
+        self._generations[clover_merchant_id] = self._generations.get(clover_merchant_id, 0) + 1
+
+    def metrics(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else None,
+            "invalidations": self.invalidations,
+            "coalesced_loads": self._loads.metrics(),
+        }
+
+
+merchant_token_cache = MerchantTokenCache()
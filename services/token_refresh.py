@@ -0,0 +1,198 @@
+# services/token_refresh.py
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+import httpx
+from dotenv import load_dotenv
+
+from helpers.merchant_helper import MerchantHelper
+from services.catalog_sync import run_in_async_session
+from services.clover_client import clover_client
+from services.singleflight import SingleFlight
+
+load_dotenv()
+
+CLOVER_CLIENT_ID = os.getenv("CLOVER_CLIENT_ID")
+CLOVER_CLIENT_SECRET = os.getenv("CLOVER_CLIENT_SECRET")
+CLOVER_TOKEN_URL = os.getenv("CLOVER_TOKEN_URL")
+
+TOKEN_REFRESH_ENABLED = os.getenv("TOKEN_REFRESH_ENABLED", "true").lower() in ("1", "true", "yes", "on")
+TOKEN_REFRESH_INTERVAL_SECONDS = float(os.getenv("TOKEN_REFRESH_INTERVAL_SECONDS", "60"))
+# Tokens expiring within this window are refreshed ahead of time
+TOKEN_REFRESH_MARGIN_SECONDS = float(os.getenv("TOKEN_REFRESH_MARGIN_SECONDS", "600"))
+# Refreshes sent to the token endpoint at the same time
+TOKEN_REFRESH_BATCH_SIZE = int(os.getenv("TOKEN_REFRESH_BATCH_SIZE", "10"))
+# After a failed refresh, the merchant is not retried for this long
+TOKEN_REFRESH_FAILURE_BACKOFF_SECONDS = float(os.getenv("TOKEN_REFRESH_FAILURE_BACKOFF_SECONDS", "60"))
+
+
+async def request_token_refresh(refresh_token: str) -> httpx.Response:
+    """Exchange a refresh token at the Clover token endpoint"""
+    return await clover_client.post(
+        CLOVER_TOKEN_URL,
+        data={
+            "client_id": CLOVER_CLIENT_ID,
+            "client_secret": CLOVER_CLIENT_SECRET,
+            "refresh_token": refresh_token,
+            "grant_type": "refresh_token",
+        },
+        headers={"Content-Type": "application/x-www-form-urlencoded"},
+    )
+
+
+def _expiry(data: Dict[str, Any], timestamp_key: str, seconds_key: str) -> Optional[datetime]:
+    """UTC expiry from a unix timestamp field, or from a lifetime in seconds"""
+    if data.get(timestamp_key):
+        return datetime.fromtimestamp(int(data[timestamp_key]), timezone.utc).replace(tzinfo=None)
+    if data.get(seconds_key):
+        return datetime.utcnow() + timedelta(seconds=int(data[seconds_key]))
+    return None
+
+
+def parse_token_response(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Normalise a token endpoint response. Clover's v2 endpoints return
+    access_token_expiration / refresh_token_expiration as unix timestamps;
+    plain OAuth servers return expires_in / refresh_token_expires_in.
+    """
+    return {
+        "access_token": data.get("access_token"),
+        "refresh_token": data.get("refresh_token"),
+        "expires_at": _expiry(data, "access_token_expiration", "expires_in"),
+        "refresh_expires_at": _expiry(data, "refresh_token_expiration", "refresh_token_expires_in"),
+    }
+
+
+class TokenRefreshManager:
+    """
+    Keeps merchant access tokens fresh.
+
+    A background loop refreshes every token that expires within
+    TOKEN_REFRESH_MARGIN_SECONDS, TOKEN_REFRESH_BATCH_SIZE merchants at a
+    time. The manager is also the CloverClient's 401 handler: a rejected
+    token is refreshed once and the request retried with the new one.
+
+    Refreshes for one merchant share a single call to the token endpoint.
+    A 401 carrying a token that has already been replaced gets the current
+    token without another refresh, and a merchant whose refresh failed is
+    left alone for TOKEN_REFRESH_FAILURE_BACKOFF_SECONDS.
+    """
+
+    def __init__(self, interval: float = TOKEN_REFRESH_INTERVAL_SECONDS):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self._refreshes = SingleFlight()
+        self._failed_until: Dict[str, float] = {}
+        self.last_run_at: Optional[datetime] = None
+        self.refreshed = 0
+        self.failed = 0
+        self.unauthorized = 0
+
+    def start(self) -> None:
+        clover_client.unauthorized_handler = self.handle_unauthorized
+        if TOKEN_REFRESH_ENABLED and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if clover_client.unauthorized_handler == self.handle_unauthorized:
+            clover_client.unauthorized_handler = None
+        task, self._task = self._task, None
+        if task:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.refresh_expiring()
+                self.last_run_at = datetime.now()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Token refresh pass failed: {str(e)}")
+            await asyncio.sleep(self.interval)
+
+    async def refresh_expiring(self, margin: float = TOKEN_REFRESH_MARGIN_SECONDS) -> List[str]:
+        """Refresh every token expiring within `margin` seconds; returns the merchants refreshed"""
+        due = await run_in_async_session(
+            MerchantHelper.get_merchants_with_tokens_expiring,
+            datetime.utcnow() + timedelta(seconds=margin)
+        )
+        refreshed: List[str] = []
+        batch_size = max(1, TOKEN_REFRESH_BATCH_SIZE)
+        for start in range(0, len(due), batch_size):
+            batch = due[start:start + batch_size]
+            tokens = await asyncio.gather(*(self.refresh(merchant_id) for merchant_id in batch))
+            refreshed.extend(merchant_id for merchant_id, token in zip(batch, tokens) if token)
+        return refreshed
+
+    async def refresh(self, clover_merchant_id: str, stale_token: Optional[str] = None) -> Optional[str]:
+        """
+        Refresh a merchant's access token. With `stale_token`, a token that
+        was already replaced is answered with the current one instead.
+
+        Returns:
+            The new (or current) access token, or None when it cannot be refreshed
+        """
+        return await self._refreshes.do(
+            clover_merchant_id, lambda: run_in_async_session(self._refresh, clover_merchant_id, stale_token)
+        )
+
+    async def _refresh(self, db, clover_merchant_id: str, stale_token: Optional[str]) -> Optional[str]:
+        if stale_token:
+            current = await MerchantHelper.get_merchant_token(db, clover_merchant_id)
+            if current and current != stale_token:
+                return current
+
+        if self._failed_until.get(clover_merchant_id, 0) > time.monotonic():
+            return None
+
+        record = await MerchantHelper.get_token_record(db, clover_merchant_id)
+        if not record or not record.refresh_token:
+            return None
+
+        try:
+            response = await request_token_refresh(record.refresh_token)
+            if response.status_code >= 400:
+                raise ValueError(f"token endpoint answered {response.status_code}: {response.text}")
+            values = parse_token_response(response.json())
+            if not values["access_token"]:
+                raise ValueError("token endpoint returned no access_token")
+        except (httpx.HTTPError, ValueError) as e:
+            self.failed += 1
+            self._failed_until[clover_merchant_id] = time.monotonic() + TOKEN_REFRESH_FAILURE_BACKOFF_SECONDS
+            print(f"Token refresh failed for {clover_merchant_id}: {str(e)}")
+            return None
+
+        await MerchantHelper.store_or_update_token(
+            db, record.merchant_id, values["access_token"],
+            refresh_token=values["refresh_token"] or record.refresh_token,
+            expires_at=values["expires_at"],
+            refresh_expires_at=values["refresh_expires_at"] or record.refresh_expires_at
+        )
+        self._failed_until.pop(clover_merchant_id, None)
+        self.refreshed += 1
+        return values["access_token"]
+
+    async def handle_unauthorized(self, clover_merchant_id: str, stale_token: str) -> Optional[str]:
+        """CloverClient hook: a token for this merchant was rejected with 401"""
+        self.unauthorized += 1
+        return await self.refresh(clover_merchant_id, stale_token)
+
+    def metrics(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "enabled": TOKEN_REFRESH_ENABLED,
+            "last_run_at": self.last_run_at,
+            "refreshed": self.refreshed,
+            "failed": self.failed,
+            "unauthorized_responses": self.unauthorized,
+            "merchants_backing_off": sorted(m for m, until in self._failed_until.items() if until > now),
+            "refresh_calls": self._refreshes.metrics(),
+        }
+
+
+token_refresh_manager = TokenRefreshManager()
@@ -0,0 +1,185 @@
+# utils/compression.py
+import asyncio
+import os
+import zlib
+from typing import Optional, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # optional; without it only gzip is offered
+    brotli = None
+
+# Responses smaller than this are sent as they are
+RESPONSE_COMPRESSION_MIN_BYTES = int(os.getenv("RESPONSE_COMPRESSION_MIN_BYTES", "1024"))
+RESPONSE_GZIP_LEVEL = int(os.getenv("RESPONSE_GZIP_LEVEL", "6"))
+# 0-11; 4-5 is roughly gzip's speed at a better ratio
+RESPONSE_BROTLI_QUALITY = int(os.getenv("RESPONSE_BROTLI_QUALITY", "4"))
+# Bodies at least this large are compressed off the event loop
+RESPONSE_COMPRESSION_THREAD_MIN_BYTES = int(os.getenv("RESPONSE_COMPRESSION_THREAD_MIN_BYTES", str(128 * 1024)))
+
+# Already compressed, or streamed to the client as it happens
+EXCLUDED_CONTENT_TYPES = ("image/", "video/", "audio/", "font/", "application/zip", "application/gzip", "text/event-stream")
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Best of br/gzip the client accepts (by q-value, br on ties), or None"""
+    offered = {"gzip": 0.0, "br": 0.0}
+    named = set()
+    wildcard = None
+    for part in accept_encoding.split(","):
+        token, _, params = part.strip().partition(";")
+        token = token.strip().lower()
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if token == "x-gzip":
+            token = "gzip"
+        if token == "*":
+            wildcard = q
+        elif token in offered:
+            offered[token] = max(offered[token], q) if token in named else q
+            named.add(token)
+    if wildcard is not None:
+        for token in offered:
+            if token not in named:
+                offered[token] = wildcard
+
+    if brotli is None:
+        offered.pop("br")
+    candidates = [(q, token == "br", token) for token, q in offered.items() if q > 0]
+    return max(candidates)[2] if candidates else None
+
+
+class _Compressor:
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int):
+        self.encoding = encoding
+        if encoding == "br":
+            self._br = brotli.Compressor(quality=brotli_quality)
+        else:
+            self._gz = zlib.compressobj(gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        if self.encoding == "br":
+            out = self._br.process(data)
+            return out + (self._br.finish() if final else self._br.flush())
+        out = self._gz.compress(data)
+        return out + self._gz.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+class CompressionMiddleware:
+    """
+    Negotiated brotli/gzip response compression.
+
+    Picks br or gzip from Accept-Encoding, leaves responses under
+    minimum_size, already-encoded responses, partial content and excluded
+    content types (SSE, images, archives) alone, and compresses streaming
+    responses chunk by chunk. Large bodies are compressed in a worker
+    thread so the event loop keeps serving.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = RESPONSE_COMPRESSION_MIN_BYTES,
+        gzip_level: int = RESPONSE_GZIP_LEVEL,
+        brotli_quality: int = RESPONSE_BROTLI_QUALITY,
+        thread_minimum_size: int = RESPONSE_COMPRESSION_THREAD_MIN_BYTES,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.thread_minimum_size = thread_minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        await self.app(scope, receive, _CompressingSend(self, encoding, send))
+
+
+class _CompressingSend:
+    def __init__(self, middleware: CompressionMiddleware, encoding: str, send: Send):
+        self.middleware = middleware
+        self.encoding = encoding
+        self.send = send
+        self.start: Optional[Message] = None
+        self.passthrough = False
+        self.compressor: Optional[_Compressor] = None
+
+    async def __call__(self, message: Message) -> None:
+        message_type = message["type"]
+
+        if message_type == "http.response.start":
+            self.start = message
+            headers = Headers(raw=message["headers"])
+            content_type = headers.get("content-type", "").lower()
+            self.passthrough = (
+                "content-encoding" in headers
+                or message["status"] in (204, 206, 304)
+                or content_type.startswith(EXCLUDED_CONTENT_TYPES)
+            )
+            if self.passthrough:
+                await self.send(message)
+            return
+
+        if message_type != "http.response.body":
+            await self.send(message)
+            return
+
+        if self.passthrough:
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.compressor is None:
+            headers = MutableHeaders(raw=self.start["headers"])
+            headers.add_vary_header("Accept-Encoding")
+            if not more_body and len(body) < self.middleware.minimum_size:
+                await self.send(self.start)
+                await self.send(message)
+                self.passthrough = True
+                return
+
+            self.compressor = _Compressor(self.encoding, self.middleware.gzip_level, self.middleware.brotli_quality)
+            headers["Content-Encoding"] = self.encoding
+            if "content-length" in headers:
+                del headers["Content-Length"]
+            body = await self._compress(body, final=not more_body)
+            if not more_body:
+                headers["Content-Length"] = str(len(body))
+            await self.send(self.start)
+            self.start = None
+        else:
+            body = await self._compress(body, final=not more_body)
+
+        await self.send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+    async def _compress(self, body: bytes, final: bool) -> bytes:
+        if len(body) >= self.middleware.thread_minimum_size:
+            return await asyncio.to_thread(self.compressor.compress, body, final)
+        return self.compressor.compress(body, final)
+
+
+def compress_bytes(body: bytes, encoding: str, level: Optional[int] = None) -> Tuple[bytes, str]:
+    """One-shot compression with the middleware's settings; returns (body, encoding)"""
+    if encoding == "br" and brotli is not None:
+        return brotli.compress(body, quality=RESPONSE_BROTLI_QUALITY if level is None else level), "br"
+    compressor = _Compressor("gzip", RESPONSE_GZIP_LEVEL if level is None else level, RESPONSE_BROTLI_QUALITY)
+    return compressor.compress(body, final=True), "gzip"
@@ -0,0 +1,35 @@
+# utils/json_response.py
+import json
+from typing import Any
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # optional; falls back to the stdlib encoder
+    orjson = None
+
+
+def _default(obj: Any) -> Any:
+    """Types orjson does not know natively (Pydantic models, Decimal, ORM rows, ...)"""
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode="json")
+    return jsonable_encoder(obj)
+
+
+def dumps(content: Any) -> bytes:
+    """Compact UTF-8 JSON bytes; orjson when installed, else json + jsonable_encoder"""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(
+        jsonable_encoder(content), ensure_ascii=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """App-wide default response class; renders with dumps()"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)